@@ -1,18 +1,24 @@
 # --- Redesigned Finance Manager App using CustomTkinter ---
 
 import customtkinter as ctk
-from tkinter import messagebox, Toplevel, PhotoImage # Added Toplevel and PhotoImage
-import csv # Added import for csv module
+from tkinter import messagebox, filedialog, Toplevel, PhotoImage # Added Toplevel and PhotoImage
 # Import specific functions and classes from logic
 from logic import (
     create_client, validate, StandardAccount, ChildAccount,
-    generate_report, plot_charts, predict_future_expense_data, predict_next_month_expense, export_user_data, # Changed import here
-    load_all_clients, save_all_clients, find_client_by_username # Import new/modified functions
+    generate_report, chart_paths, export_user_data, # Changed import here
+    load_all_clients, save_all_clients, dirty_clients, InvalidMergeError, find_client_by_username, # Import new/modified functions
+    TransactionPager, ledger_signature, AnalyticsPrefetcher,
+    ensure_ledger, to_paisa, format_amount # Amounts are integer paisa; convert only when reading input / displaying
 )
 # Removed "import logic" as specific functions are imported
 from PIL import Image, ImageTk # For displaying graphs
 import pandas as pd
 import os # To check if files exist
+from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
+from uiwatchdog import StallWatchdog, callback_name
+from importer import import_statement
+from forecasting import MODELS as FORECAST_MODELS, DEFAULT_MODEL as DEFAULT_FORECAST_MODEL
 # import numpy as np # numpy is used in logic, no need to import here unless used in GUI
 
 # --- Theme Colors (Refined) ---
@@ -32,6 +38,10 @@ PROGRESS_BAR = ACCENT_BLUE # Green or Blue for progress? Let's stick to Blue as
 ctk.set_appearance_mode("Dark")
 
 # --- Main Application Setup ---
+# Times every Tk callback and reports event-loop stalls (must be set up before any widget registers callbacks)
+ui_watchdog = StallWatchdog()
+ui_watchdog.instrument_tk()
+
 app = ctk.CTk()
 app.geometry("1200x750") # Slightly larger window
 app.title("X-Analytics - Personal Finance Manager")
@@ -40,37 +50,31 @@ app.configure(fg_color=PRIMARY_DARK)
 # --- Global Variables ---
 clients = [] # This list will now hold all client objects loaded from the file
 current_user = None # Will hold the logged-in Client object
+analytics = AnalyticsPrefetcher() # Background ledger/chart/forecast prefetch for the logged-in user
+importer_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="import") # Statement imports, off the Tk thread
 # Global variable to hold the prediction image reference to prevent garbage collection
 prediction_img_label = None
 
 
 # --- Utility Functions ---
 def format_currency(amount):
-    """Formats a number as PKR currency."""
+    """Formats an amount in paisa as PKR currency. This is the only place amounts become rupees."""
     try:
         # Ensure amount is a number before formatting
-        if amount is None or not isinstance(amount, (int, float)):
+        if amount is None:
             return "PKR 0.00"
-        return "PKR {:,.2f}".format(float(amount))
+        return "PKR " + format_amount(amount, grouping=True)
     except (ValueError, TypeError):
         return "PKR 0.00"
 
 def ensure_transaction_file():
-    """Creates transactions.csv with headers if it doesn't exist."""
-    # csv module is now imported at the top
-    if not os.path.exists("transactions.csv"):
-        try:
-            with open("transactions.csv", "w", newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(["username", "timestamp", "amount", "type", "category"])
-            print("Created transactions.csv with headers.") # Debug print
-        except Exception as e:
-            print(f"Error creating transactions.csv: {e}") # Debug print
+    """Creates the ledger if it doesn't exist (importing an old transactions.csv) and archives finished months."""
+    ensure_ledger()
 
 
 # --- Initial Load Users (Only call once at startup) ---
 def load_initial_users():
-    """Loads user data from users.txt at application startup."""
+    """Loads user data (users.db, or users.txt on first run) at application startup."""
     global clients
     clients = load_all_clients() # Use the new function from logic.py
     # print(f"Loaded {len(clients)} users initially.") # Debug print
@@ -93,12 +97,14 @@ def switch_view(name):
 
     # Save current user state before switching views (if logged in and not switching to Login/Register)
     # This provides an extra layer of saving, besides saving after each operation
+    # Saving is skipped when no client has unsaved changes
     if current_user and name not in ["Login", "Register"]:
-         save_all_clients(clients) # Save state before leaving an authenticated view
-         print("Saving state on view switch.") # Debug print
+         save_clients() # Save state before leaving an authenticated view
 
 
-    # Hide all frames
+    # Hide all frames; hidden views queue their updates instead of running them
+    for view in views.values():
+        view.hide()
     for frame in content_frames.values():
         frame.pack_forget()
         # Also hide the sub-frames for login/register if they are currently placed
@@ -118,13 +124,9 @@ def switch_view(name):
              show_register() # Call helper to show register sub-frame
 
 
-        # Call update function for the specific view if it exists and it's not the auth frame
-        if name not in ["Login", "Register"]:
-            update_func_name = f"update_{name.lower().replace(' ', '_')}_view"
-            if hasattr(app, update_func_name):
-                getattr(app, update_func_name)() # Call the update function
-            else:
-                 print(f"Warning: Update function '{update_func_name}' not found for view '{name}'.")
+        # Run the view's pending updates (only bindings whose values changed while it was hidden)
+        if name in views:
+            views[name].show()
 
 
     else:
@@ -216,7 +218,10 @@ def handle_login():
         # Process recurring tasks for the logged-in user immediately after login
         current_user.process_recurring()
         # Save the state after processing recurring transactions
-        save_all_clients(clients)
+        save_clients()
+        refresh_user_model() # Rebinds every view to this user; hidden views update when first shown
+        # Warm the ledger cache, charts and forecast in the background so Graphs / AI Overview open quickly
+        analytics.start(current_user.uname)
 
 
         # Ensure transaction file exists (redundant if logic saves correctly, but safe)
@@ -281,7 +286,7 @@ def handle_register():
         return
 
     try:
-        initial_amount = float(initial_amount_str)
+        initial_amount = to_paisa(initial_amount_str)
     except ValueError:
         messagebox.showerror("Registration Error", "Please enter a valid number for Initial Amount.")
         return
@@ -329,793 +334,1127 @@ ctk.CTkButton(login_sub_frame, text="No Account? Register Here", command=show_re
 ctk.CTkButton(register_sub_frame, text="Already have an account? Login Here", command=show_login, fg_color="transparent", text_color=TEXT_LIGHT, hover_color=TERTIARY_DARK, font=("Arial", 12)).pack(pady=(0,20))
 
 
-# --- ==================== VIEWS (Create frames but pack in switch_view) ==================== ---
-# Frames for authenticated views are created here, their content is updated by the update_..._view functions
+# --- ==================== VIEWS (Built once, packed in switch_view) ==================== ---
+# Each view's widgets are created a single time. Widgets are bound to observable user values and are only
+# reconfigured when a value they show actually changes; bindings on hidden views wait until the view is shown.
+
+class Observable:
+    """A value that notifies its subscribers when it changes."""
+
+    def __init__(self, value=None):
+        self._value = value
+        self._subscribers = []
+
+    def get(self):
+        return self._value
+
+    def set(self, value):
+        if value != self._value:
+            self._value = value
+            for callback in list(self._subscribers):
+                callback(value)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+
+class UserModel:
+    """Observable copy of the logged-in user's displayed values."""
+
+    def __init__(self):
+        self.username = Observable("")
+        # Amounts are integer paisa
+        self.balance = Observable(0)
+        self.budget = Observable(0)
+        self.total_spent = Observable(0)
+        self.loans = Observable(0)
+        self.ledger = Observable(None) # Changes whenever transactions.csv changes
+        self.recent_spend = Observable(None) # rolling_spend(): spend over the last 7/30/90 days and daily average
+        self.anomalies = Observable(()) # expense_anomalies(): recent unusually large expenses
+        self._pending = {} # Observable (or other key) -> prefetch Future being polled for it
+
+    def refresh(self, client):
+        """Copies the client's current values in; only values that changed notify their widgets."""
+        if client is None:
+            self.username.set("")
+            self._pending.clear()
+            self.recent_spend.set(None) # So the next user never sees these before their own arrive
+            self.anomalies.set(())
+            return
+        self.username.set(client.uname)
+        # int() also turns NumPy scalars from a ClientTable into plain ints
+        self.balance.set(int(client.display_balance()))
+        self.budget.set(int(client.display_budget()))
+        self.total_spent.set(int(client.total_spent))
+        self.loans.set(int(client.loans))
+        self.ledger.set(ledger_signature())
+        # Computed on the prefetch worker (the first call reads the ledger) and set once ready
+        self.publish_when_ready(self.recent_spend, analytics.submit("rolling", client.uname))
+        self.publish_when_ready(self.anomalies, analytics.submit("anomalies", client.uname))
+
+    def publish_when_ready(self, observable, future, poll_ms=50):
+        """Sets observable to the future's result once it is done, polling from the Tk thread."""
+        self.when_ready(observable, future, lambda done: self._publish(observable, done), poll_ms)
+
+    def when_ready(self, key, future, callback, poll_ms=50):
+        """
+        Calls callback(future) from the Tk thread once the future is done (at once if it already is). A newer
+        request with the same key replaces the one being polled; logging out drops them all.
+        """
+        self._pending[key] = future
+        self._poll(key, future, callback, poll_ms)
+
+    def _poll(self, key, future, callback, poll_ms):
+        if self._pending.get(key) is not future:
+            return # Superseded, or the user logged out
+        if not future.done():
+            app.after(poll_ms, self._poll, key, future, callback, poll_ms)
+            return
+        del self._pending[key]
+        if not future.cancelled():
+            callback(future)
 
-# --- Dashboard View ---
-dashboard_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
-content_frames["Dashboard"] = dashboard_frame
+    @staticmethod
+    def _publish(observable, future):
+        try:
+            observable.set(future.result())
+        except Exception as e:
+            print(f"Error loading dashboard analytics: {e}") # Debug print
 
-def update_dashboard_view():
-    """Updates the dashboard with current user data."""
-    if not current_user:
-        print("update_dashboard_view called with no current user.") # Should not happen if switch_view is correct
-        return
 
-    # Clear previous content
-    for widget in dashboard_frame.winfo_children():
-        widget.destroy()
+user_model = UserModel()
+
+
+def refresh_user_model():
+    """Pushes the current user's state to the bound widgets. Call after every operation."""
+    user_model.refresh(current_user)
+
 
-    # Welcome Message
-    ctk.CTkLabel(dashboard_frame, text=f"Welcome, {current_user.uname.title()}!", font=("Arial", 28, "bold"), text_color=TEXT_ACCENT).pack(pady=(10, 5), anchor="w")
-    ctk.CTkLabel(dashboard_frame, text="Here's your financial overview:", font=("Arial", 16), text_color=TEXT_LIGHT).pack(pady=(0, 20), anchor="w")
+def save_clients():
+    """
+    Saves the changed accounts. Returns False, after showing the error, if changes were rejected because another
+    process changed the same account in a way they cannot be merged with (the views then show the stored state),
+    or if users.db could not be written (the changes stay in memory and are saved again with the next change).
+    """
+    try:
+        save_all_clients(clients)
+    except InvalidMergeError as e:
+        messagebox.showerror("Save Conflict", f"❌ Your last changes were discarded because the account was changed elsewhere: {e}")
+        if current_user:
+            refresh_user_model()
+        return False
+    # save_all_clients also returns False when nothing changed, so failure shows as accounts still unsaved
+    if dirty_clients(clients):
+        messagebox.showerror("Save Error", "❌ Your changes could not be saved. They are kept and saved again with your next change.")
+        return False
+    return True
+
+
+class View:
+    """
+    A content frame whose widgets are built once.
+    bind() registers an update function for some observables; while the view is hidden, updates are
+    deferred and run once when the view is next shown.
+    """
+
+    def __init__(self, frame):
+        self.frame = frame
+        self.visible = False
+        self._pending = {} # update function -> True, ordered, so each runs at most once per show
+
+    def bind(self, update, *observables):
+        for observable in observables:
+            observable.subscribe(lambda _value, u=update: self._notify(u))
+        self._pending[update] = True # Run on first show
+
+    def _notify(self, update):
+        if self.visible:
+            self._run(update)
+        else:
+            self._pending[update] = True
 
-    # --- Top Row: Balance & Budget ---
-    top_frame = ctk.CTkFrame(dashboard_frame, fg_color="transparent")
-    top_frame.pack(fill="x", pady=10)
+    def _run(self, update):
+        with ui_watchdog.span(callback_name(update)): # Lets stalls be attributed to the view update
+            update()
 
-    balance_frame = ctk.CTkFrame(top_frame, fg_color=SECONDARY_DARK, corner_radius=10)
-    balance_frame.pack(side="left", padx=(0, 10), expand=True, fill="x")
-    ctk.CTkLabel(balance_frame, text="Current Balance", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10, 2), padx=20, anchor="w")
-    # Use display_balance which returns the raw number, format in GUI
-    ctk.CTkLabel(balance_frame, text=format_currency(current_user.display_balance()), font=("Arial", 24, "bold"), text_color=ACCENT_GREEN).pack(pady=(0, 10), padx=20, anchor="w")
+    def show(self):
+        self.visible = True
+        pending, self._pending = self._pending, {}
+        for update in pending:
+            self._run(update)
 
-    budget_frame = ctk.CTkFrame(top_frame, fg_color=SECONDARY_DARK, corner_radius=10)
-    budget_frame.pack(side="left", padx=(10, 0), expand=True, fill="x")
-    ctk.CTkLabel(budget_frame, text="Budget Status", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10, 2), padx=20, anchor="w")
+    def hide(self):
+        self.visible = False
 
-    budget_val = current_user.display_budget() # Get current budget value
-    # Ensure total_spent is a number before calculation
-    total_spent_val = current_user.total_spent if isinstance(current_user.total_spent, (int, float)) else 0
 
-    remaining_str = "N/A"
-    progress = 0.0 # Represents the portion of budget *spent*
+views = {} # View name -> View, used by switch_view
+
+
+def budget_status(budget_val, total_spent_val):
+    """Returns (remaining text, fraction of budget spent) for the budget displays."""
     if budget_val > 0:
-        remaining = budget_val - total_spent_val
-        remaining_str = format_currency(remaining)
-         # Progress is total_spent divided by budget, capped between 0 and 1
+        remaining_str = format_currency(budget_val - total_spent_val)
+        # Progress is total_spent divided by budget, capped between 0 and 1
         progress = max(0.0, min(1.0, (total_spent_val / budget_val)))
     else:
         remaining_str = "No Budget Set"
         progress = 0.0 # No budget means 0% progress towards it
+    return remaining_str, progress
 
-    ctk.CTkLabel(budget_frame, text=f"Remaining: {remaining_str}", font=("Arial", 18, "bold"), text_color=ACCENT_BLUE).pack(pady=(0, 5), padx=20, anchor="w")
 
-    # Progress bar and percentage display for budget
-    budget_prog_bar = ctk.CTkProgressBar(budget_frame, orientation="horizontal", progress_color=PROGRESS_BAR, fg_color=ENTRY_FIELD)
-    budget_prog_bar.set(progress) # Set bar value based on spent proportion
+def show_chart_image(image_label, message_label, path, max_width, missing_text):
+    """Shows the chart at path in image_label, or missing_text in message_label if the file does not exist."""
+    if os.path.exists(path):
+        try:
+            # Open the image file using PIL
+            pil_image = Image.open(path)
+            # Calculate aspect ratio to maintain proportions, but don't enlarge
+            ratio = min(max_width / pil_image.width, 1.0) # Cap ratio at 1.0
+            new_size = (int(pil_image.width * ratio), int(pil_image.height * ratio))
+            # Resize the image using a high-quality filter
+            pil_image = pil_image.resize(new_size, Image.Resampling.BICUBIC) # Use Image.Resampling
+            tk_image = ImageTk.PhotoImage(pil_image)
+            image_label.configure(image=tk_image)
+            # Keep a reference to the image object to prevent it from being garbage collected
+            image_label.image = tk_image
+            message_label.pack_forget()
+            image_label.pack(pady=5)
+            return
+        except Exception as img_e:
+            missing_text = f"Error displaying chart: {img_e}"
+            print(missing_text) # Debug print
+    image_label.pack_forget()
+    message_label.configure(text=missing_text)
+    message_label.pack(pady=5)
+
+
+# --- Transaction History Table (virtualized) ---
+class TransactionTable(ctk.CTkFrame):
+    """
+    Scrollable transaction history that only creates widgets for the visible rows.
+    Scrolling re-binds the same row labels to another page of TransactionPager data instead of creating widgets.
+    """
+    VISIBLE_ROWS = 10
+    # (pager column, header text, width, anchor)
+    COLUMNS = (("timestamp", "Date", 150, "w"), ("type", "Type", 130, "w"),
+               ("category", "Category/Details", 200, "w"), ("amount", "Amount", 120, "e"))
+    INFLOW_TYPES = ("Income", "Loan Received", "Transfer In")
+    ALL_TYPES = "All types"
+    ALL_CATEGORIES = "All categories"
+
+    def __init__(self, master, **kwargs):
+        super().__init__(master, fg_color=SECONDARY_DARK, corner_radius=10, **kwargs)
+        self.pager = None
+        self.offset = 0
+        self._build_filter_bar()
+        self._build_header()
+        self._build_rows()
+        self.render()
+
+    def _build_filter_bar(self):
+        bar = ctk.CTkFrame(self, fg_color="transparent")
+        bar.pack(fill="x", padx=10, pady=(10, 5))
+        self.type_var = ctk.StringVar(value=self.ALL_TYPES)
+        self.type_menu = ctk.CTkOptionMenu(bar, variable=self.type_var, values=[self.ALL_TYPES],
+                                           width=150, fg_color=ENTRY_FIELD, button_color=TERTIARY_DARK,
+                                           command=lambda _value: self.apply_filters())
+        self.type_menu.pack(side="left", padx=(0, 5))
+        self.category_var = ctk.StringVar(value=self.ALL_CATEGORIES)
+        self.category_menu = ctk.CTkOptionMenu(bar, variable=self.category_var, values=[self.ALL_CATEGORIES],
+                                               width=160, fg_color=ENTRY_FIELD, button_color=TERTIARY_DARK,
+                                               command=lambda _value: self.apply_filters())
+        self.category_menu.pack(side="left", padx=5)
+        self.from_entry = ctk.CTkEntry(bar, placeholder_text="From YYYY-MM-DD", width=130, fg_color=ENTRY_FIELD, border_width=0)
+        self.from_entry.pack(side="left", padx=5)
+        self.to_entry = ctk.CTkEntry(bar, placeholder_text="To YYYY-MM-DD", width=130, fg_color=ENTRY_FIELD, border_width=0)
+        self.to_entry.pack(side="left", padx=5)
+        ctk.CTkButton(bar, text="Apply", width=70, fg_color=ACCENT_PURPLE, hover_color=ACCENT_PINK,
+                      command=self.apply_filters).pack(side="left", padx=5)
+        ctk.CTkButton(bar, text="Clear", width=70, fg_color="transparent", hover_color=TERTIARY_DARK,
+                      text_color=TEXT_LIGHT, command=self.clear_filters).pack(side="left", padx=5)
+        self.status_label = ctk.CTkLabel(bar, text="", font=("Arial", 12), text_color=TEXT_LIGHT)
+        self.status_label.pack(side="right", padx=5)
+
+    def _build_header(self):
+        header_frame = ctk.CTkFrame(self, fg_color="transparent")
+        header_frame.pack(fill="x", padx=10, pady=(5, 5))
+        self.header_buttons = {}
+        for column, title, width, anchor in self.COLUMNS:
+            button = ctk.CTkButton(header_frame, text=title, font=("Arial", 12, "bold"), width=width, anchor=anchor,
+                                   fg_color="transparent", hover_color=TERTIARY_DARK, text_color=TEXT_ACCENT,
+                                   command=lambda c=column: self.sort_by(c))
+            button.pack(side="right" if column == "amount" else "left", padx=5)
+            self.header_buttons[column] = button
+
+    def _build_rows(self):
+        body = ctk.CTkFrame(self, fg_color="transparent")
+        body.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        self.scrollbar = ctk.CTkScrollbar(body, command=self._on_scrollbar)
+        self.scrollbar.pack(side="right", fill="y")
+        rows_frame = ctk.CTkFrame(body, fg_color="transparent")
+        rows_frame.pack(side="left", fill="both", expand=True)
+        self._bind_wheel(rows_frame)
+
+        # The fixed pool of row widgets; render() only reconfigures their text
+        self.row_labels = []
+        for _ in range(self.VISIBLE_ROWS):
+            row_frame = ctk.CTkFrame(rows_frame, fg_color="transparent")
+            row_frame.pack(fill="x", pady=1)
+            self._bind_wheel(row_frame)
+            labels = []
+            for column, _title, width, anchor in self.COLUMNS:
+                label = ctk.CTkLabel(row_frame, text="", font=("Arial", 12, "bold" if column == "amount" else "normal"),
+                                     text_color=TEXT_LIGHT, width=width, anchor=anchor)
+                label.pack(side="right" if column == "amount" else "left", padx=5)
+                self._bind_wheel(label)
+                labels.append(label)
+            self.row_labels.append(labels)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self._on_wheel) # Windows / macOS
+        widget.bind("<Button-4>", self._on_wheel)   # Linux scroll up
+        widget.bind("<Button-5>", self._on_wheel)   # Linux scroll down
+
+    def _on_wheel(self, event):
+        up = getattr(event, "num", None) == 4 or getattr(event, "delta", 0) > 0
+        self.scroll_to(self.offset + (-3 if up else 3))
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.scroll_to(round(float(value) * self._total()))
+        elif action == "scroll":
+            step = int(value) * (self.VISIBLE_ROWS if unit == "pages" else 1)
+            self.scroll_to(self.offset + step)
+
+    def _total(self):
+        return len(self.pager) if self.pager is not None else 0
+
+    def set_pager(self, pager):
+        """Shows another pager (e.g. after login) or refreshed data, keeping the filter widgets in sync."""
+        if pager is not self.pager:
+            self.pager = pager
+            self.offset = 0
+            filters = pager.filters
+            self.type_var.set(filters["type"] or self.ALL_TYPES)
+            self.category_var.set(filters["category"] or self.ALL_CATEGORIES)
+            self.from_entry.delete(0, 'end')
+            self.to_entry.delete(0, 'end')
+            if filters["start"] is not None:
+                self.from_entry.insert(0, filters["start"].strftime("%Y-%m-%d"))
+            if filters["end"] is not None:
+                # The pager's end bound is exclusive; show the inclusive day the user typed
+                self.to_entry.insert(0, (filters["end"] - timedelta(days=1)).strftime("%Y-%m-%d"))
+        self.type_menu.configure(values=[self.ALL_TYPES] + pager.available_values("type"))
+        self.category_menu.configure(values=[self.ALL_CATEGORIES] + pager.available_values("category"))
+        self.render()
+
+    def scroll_to(self, offset):
+        offset = max(0, min(int(offset), self._total() - self.VISIBLE_ROWS))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def sort_by(self, column):
+        if self.pager is None:
+            return
+        self.pager.set_sort(column)
+        self.offset = 0
+        self.render()
 
-    ctk.CTkLabel(budget_frame, text=f"{progress:.1%} Used", font=("Arial", 12), text_color=TEXT_LIGHT).pack(pady=(0, 2), padx=20, anchor="w") # Show percentage
-    budget_prog_bar.pack(pady=(0, 10), padx=20, fill="x")
+    def apply_filters(self):
+        if self.pager is None:
+            return
+        try:
+            start_text, end_text = self.from_entry.get().strip(), self.to_entry.get().strip()
+            start = datetime.strptime(start_text, "%Y-%m-%d") if start_text else None
+            # The To date is inclusive, so the pager's exclusive bound is the following midnight
+            end = datetime.strptime(end_text, "%Y-%m-%d") + timedelta(days=1) if end_text else None
+        except ValueError:
+            messagebox.showerror("Filter Error", "Dates must be in YYYY-MM-DD format.")
+            return
+        t_type = self.type_var.get()
+        category = self.category_var.get()
+        self.pager.set_filters(type=None if t_type == self.ALL_TYPES else t_type,
+                               category=None if category == self.ALL_CATEGORIES else category,
+                               start=start, end=end)
+        self.offset = 0
+        self.render()
+
+    def clear_filters(self):
+        self.type_var.set(self.ALL_TYPES)
+        self.category_var.set(self.ALL_CATEGORIES)
+        self.from_entry.delete(0, 'end')
+        self.to_entry.delete(0, 'end')
+        self.apply_filters()
+
+    def render(self):
+        """Fills the row pool with the current page and updates the scrollbar and status text."""
+        total = self._total()
+        self.offset = max(0, min(self.offset, total - self.VISIBLE_ROWS))
+        page = self.pager.page(self.offset, self.VISIBLE_ROWS) if total else []
+        for i, (date_label, type_label, category_label, amount_label) in enumerate(self.row_labels):
+            if i < len(page):
+                date_str, ttype, category, amount = page[i]
+                amount_color = ACCENT_GREEN if ttype in self.INFLOW_TYPES else ACCENT_RED
+                date_label.configure(text=date_str)
+                type_label.configure(text=ttype)
+                # Truncate instead of wrapping so every row keeps the same height
+                category_label.configure(text=category if len(category) <= 28 else category[:27] + "…")
+                amount_label.configure(text=format_currency(amount), text_color=amount_color)
+            else:
+                for label in (date_label, type_label, category_label, amount_label):
+                    label.configure(text="")
 
-    ctk.CTkLabel(budget_frame, text=f"Total Budget: {format_currency(budget_val)}", font=("Arial", 12), text_color=TEXT_LIGHT).pack(pady=(0, 10), padx=20, anchor="w")
+        sort_by = self.pager.sort_by if self.pager is not None else None
+        for column, title, _width, _anchor in self.COLUMNS:
+            arrow = (" ▼" if self.pager.descending else " ▲") if column == sort_by else ""
+            self.header_buttons[column].configure(text=title + arrow)
 
+        if total:
+            self.scrollbar.set(self.offset / total, min(1.0, (self.offset + self.VISIBLE_ROWS) / total))
+            self.status_label.configure(text=f"{self.offset + 1}-{self.offset + len(page)} of {total}")
+        else:
+            self.scrollbar.set(0.0, 1.0)
+            no_rows = self.pager is None or self.pager.row_count == 0
+            self.status_label.configure(text="No transactions recorded yet." if no_rows else "No matching transactions.")
 
-    # --- Bottom Row: Transaction Overview ---
-    ctk.CTkLabel(dashboard_frame, text="Recent Activity", font=("Arial", 20, "bold"), text_color=TEXT_ACCENT).pack(pady=(25, 10), anchor="w")
 
-    transaction_frame = ctk.CTkFrame(dashboard_frame, fg_color=SECONDARY_DARK, corner_radius=10)
-    transaction_frame.pack(fill="both", expand=True, pady=10)
+# --- Dashboard View ---
+dashboard_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
+content_frames["Dashboard"] = dashboard_frame
+dashboard_view = views["Dashboard"] = View(dashboard_frame)
+transaction_pager = None # Kept across refreshes so sorting/filters persist for the logged-in user
+
+# Welcome Message
+welcome_label = ctk.CTkLabel(dashboard_frame, text="", font=("Arial", 28, "bold"), text_color=TEXT_ACCENT)
+welcome_label.pack(pady=(10, 5), anchor="w")
+ctk.CTkLabel(dashboard_frame, text="Here's your financial overview:", font=("Arial", 16), text_color=TEXT_LIGHT).pack(pady=(0, 20), anchor="w")
+
+# --- Top Row: Balance & Budget ---
+top_frame = ctk.CTkFrame(dashboard_frame, fg_color="transparent")
+top_frame.pack(fill="x", pady=10)
+
+balance_card = ctk.CTkFrame(top_frame, fg_color=SECONDARY_DARK, corner_radius=10)
+balance_card.pack(side="left", padx=(0, 10), expand=True, fill="x")
+ctk.CTkLabel(balance_card, text="Current Balance", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10, 2), padx=20, anchor="w")
+dashboard_balance_label = ctk.CTkLabel(balance_card, text="", font=("Arial", 24, "bold"), text_color=ACCENT_GREEN)
+dashboard_balance_label.pack(pady=(0, 10), padx=20, anchor="w")
+
+budget_card = ctk.CTkFrame(top_frame, fg_color=SECONDARY_DARK, corner_radius=10)
+budget_card.pack(side="left", padx=(10, 0), expand=True, fill="x")
+ctk.CTkLabel(budget_card, text="Budget Status", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10, 2), padx=20, anchor="w")
+dashboard_remaining_label = ctk.CTkLabel(budget_card, text="", font=("Arial", 18, "bold"), text_color=ACCENT_BLUE)
+dashboard_remaining_label.pack(pady=(0, 5), padx=20, anchor="w")
+dashboard_percent_label = ctk.CTkLabel(budget_card, text="", font=("Arial", 12), text_color=TEXT_LIGHT)
+dashboard_percent_label.pack(pady=(0, 2), padx=20, anchor="w")
+dashboard_prog_bar = ctk.CTkProgressBar(budget_card, orientation="horizontal", progress_color=PROGRESS_BAR, fg_color=ENTRY_FIELD)
+dashboard_prog_bar.pack(pady=(0, 10), padx=20, fill="x")
+dashboard_total_budget_label = ctk.CTkLabel(budget_card, text="", font=("Arial", 12), text_color=TEXT_LIGHT)
+dashboard_total_budget_label.pack(pady=(0, 10), padx=20, anchor="w")
+
+recent_card = ctk.CTkFrame(top_frame, fg_color=SECONDARY_DARK, corner_radius=10)
+recent_card.pack(side="left", padx=(10, 0), expand=True, fill="x")
+ctk.CTkLabel(recent_card, text="Recent Spending", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10, 2), padx=20, anchor="w")
+dashboard_recent_label = ctk.CTkLabel(recent_card, text="", font=("Arial", 12), text_color=TEXT_LIGHT, justify="left")
+dashboard_recent_label.pack(pady=(0, 10), padx=20, anchor="w")
+dashboard_unusual_label = ctk.CTkLabel(recent_card, text="", font=("Arial", 12), text_color=ACCENT_PINK, justify="left") # Packed only when there are flags
+
+# --- Bottom Row: Transaction History ---
+ctk.CTkLabel(dashboard_frame, text="Transaction History", font=("Arial", 20, "bold"), text_color=TEXT_ACCENT).pack(pady=(25, 10), anchor="w")
+transaction_error_label = ctk.CTkLabel(dashboard_frame, text="", font=("Arial", 14), text_color=ACCENT_RED) # Packed only on errors
+transaction_table = TransactionTable(dashboard_frame)
+transaction_table.pack(fill="both", expand=True, pady=10)
+
+
+def update_dashboard_welcome():
+    welcome_label.configure(text=f"Welcome, {user_model.username.get().title()}!")
+
+def update_dashboard_balance():
+    # The model holds the raw number, format in GUI
+    dashboard_balance_label.configure(text=format_currency(user_model.balance.get()))
+
+def update_dashboard_budget():
+    budget_val = user_model.budget.get()
+    remaining_str, progress = budget_status(budget_val, user_model.total_spent.get())
+    dashboard_remaining_label.configure(text=f"Remaining: {remaining_str}")
+    dashboard_percent_label.configure(text=f"{progress:.1%} Used") # Show percentage
+    dashboard_prog_bar.set(progress) # Set bar value based on spent proportion
+    dashboard_total_budget_label.configure(text=f"Total Budget: {format_currency(budget_val)}")
+
+def update_dashboard_recent_spend():
+    spend = user_model.recent_spend.get()
+    if not spend:
+        dashboard_recent_label.configure(text="Loading...")
+        return
+    dashboard_recent_label.configure(text=f"Last 7 days: {format_currency(spend[7])}\n"
+                                          f"Last 30 days: {format_currency(spend[30])}\n"
+                                          f"Last 90 days: {format_currency(spend[90])}\n"
+                                          f"Daily average (30 days): {format_currency(spend['daily_average'])}")
+
+def update_dashboard_anomalies():
+    flags = user_model.anomalies.get()
+    if not flags:
+        dashboard_unusual_label.pack_forget()
+        return
+    lines = [f"{when:%Y-%m-%d} {category}: {format_currency(amount)} ({z:.1f}σ above average)" for when, category, amount, z in flags]
+    dashboard_unusual_label.configure(text="Unusual expenses:\n" + "\n".join(lines))
+    dashboard_unusual_label.pack(pady=(0, 10), padx=20, anchor="w")
 
+def update_dashboard_transactions():
+    """Points the history table at the current user's (cached) ledger rows."""
+    global transaction_pager
+    if not current_user:
+        return
     try:
         # Ensure transaction file exists before reading
         ensure_transaction_file() # Call again here just in case it was deleted somehow
 
-        df = pd.read_csv("transactions.csv")
-        # Filter for the current user and get the last 5 transactions
-        user_df = df[df['username'] == current_user.uname.lower()].tail(5).copy() # Use lowercase and .copy()
-
-        if not user_df.empty:
-            # Create Header
-            header_frame = ctk.CTkFrame(transaction_frame, fg_color="transparent")
-            header_frame.pack(fill="x", padx=10, pady=(10, 5))
-            ctk.CTkLabel(header_frame, text="Date", font=("Arial", 12, "bold"), width=150, anchor="w").pack(side="left", padx=5)
-            ctk.CTkLabel(header_frame, text="Type", font=("Arial", 12, "bold"), width=100, anchor="w").pack(side="left", padx=5)
-            ctk.CTkLabel(header_frame, text="Category/Details", font=("Arial", 12, "bold"), width=200, anchor="w").pack(side="left", padx=5)
-            ctk.CTkLabel(header_frame, text="Amount", font=("Arial", 12, "bold"), width=120, anchor="e").pack(side="right", padx=5)
-
-            # Add transactions
-            for index, row in user_df.iterrows():
-                row_frame = ctk.CTkFrame(transaction_frame, fg_color="transparent")
-                row_frame.pack(fill="x", padx=10, pady=2)
-                # Handle potential errors in timestamp conversion
-                try:
-                    timestamp = pd.to_datetime(row['timestamp']).strftime('%Y-%m-%d %H:%M')
-                except Exception:
-                    timestamp = "Invalid Date"
-
-                ttype = row['type']
-                category = row['category']
-                # Handle potential errors in amount conversion
-                try:
-                     amount = float(row['amount'])
-                except ValueError:
-                     amount = 0.0 # Default to 0 if amount is invalid
-
-
-                # Determine amount color based on transaction type
-                inflow_types = ["Income", "Loan Received", "Transfer In"]
-                amount_color = ACCENT_GREEN if ttype in inflow_types else ACCENT_RED
-
-                ctk.CTkLabel(row_frame, text=timestamp, font=("Arial", 12), text_color=TEXT_LIGHT, width=150, anchor="w").pack(side="left", padx=5)
-                ctk.CTkLabel(row_frame, text=ttype, font=("Arial", 12), text_color=TEXT_LIGHT, width=100, anchor="w").pack(side="left", padx=5)
-                ctk.CTkLabel(row_frame, text=category, font=("Arial", 12), text_color=TEXT_LIGHT, width=200, anchor="w", justify="left", wraplength=190).pack(side="left", padx=5)
-                ctk.CTkLabel(row_frame, text=format_currency(amount), font=("Arial", 12, "bold"), text_color=amount_color, width=120, anchor="e").pack(side="right", padx=5)
+        # The pager reads from the ledger cache, so the file is only parsed again if it changed
+        if transaction_pager is None or transaction_pager.username != current_user.uname:
+            transaction_pager = TransactionPager(current_user.uname)
         else:
-             ctk.CTkLabel(transaction_frame, text="No transactions recorded yet.", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=20)
-
-    except FileNotFoundError:
-        ctk.CTkLabel(transaction_frame, text="Transaction file not found.", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
-    except pd.errors.EmptyDataError:
-         ctk.CTkLabel(transaction_frame, text="Transaction file is empty.", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=20)
+            transaction_pager.refresh()
+        transaction_table.set_pager(transaction_pager)
+        transaction_error_label.pack_forget()
     except Exception as e:
-        ctk.CTkLabel(transaction_frame, text=f"Error loading transactions: {e}", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
+        transaction_error_label.configure(text=f"Error loading transactions: {e}")
+        transaction_error_label.pack(pady=10, before=transaction_table)
         print(f"Error reading transactions.csv in dashboard: {e}") # Debug print
 
+dashboard_view.bind(update_dashboard_welcome, user_model.username)
+dashboard_view.bind(update_dashboard_balance, user_model.balance)
+dashboard_view.bind(update_dashboard_budget, user_model.budget, user_model.total_spent)
+dashboard_view.bind(update_dashboard_recent_spend, user_model.recent_spend)
+dashboard_view.bind(update_dashboard_anomalies, user_model.anomalies)
+dashboard_view.bind(update_dashboard_transactions, user_model.username, user_model.ledger)
+
+
 # --- Income View ---
 income_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Income"] = income_frame
-income_amount_entry = None # Define globally for clearing
+income_view = views["Income"] = View(income_frame)
 
-def update_income_view():
-    global income_amount_entry
-    if not current_user: return
-    for widget in income_frame.winfo_children(): widget.destroy() # Clear previous content
+ctk.CTkLabel(income_frame, text="Add Income", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+ctk.CTkLabel(income_frame, text="Enter the amount received:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
 
-    ctk.CTkLabel(income_frame, text="Add Income", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
-    ctk.CTkLabel(income_frame, text="Enter the amount received:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
+ctk.CTkLabel(income_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+income_amount_entry = ctk.CTkEntry(income_frame, placeholder_text="e.g., 5000.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+income_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(income_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    income_amount_entry = ctk.CTkEntry(income_frame, placeholder_text="e.g., 5000.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    income_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
+def handle_add_income():
+    try:
+        amount_str = income_amount_entry.get().strip()
+        if not amount_str:
+             messagebox.showerror("Error", "Please enter an amount.")
+             return
 
-    def handle_add_income():
-        try:
-            amount_str = income_amount_entry.get().strip()
-            if not amount_str:
-                 messagebox.showerror("Error", "Please enter an amount.")
-                 return
+        amount = to_paisa(amount_str)
 
-            amount = float(amount_str)
+        # amount validation is also done in logic.py, but a quick check here is fine
+        if amount <= 0:
+             messagebox.showerror("Error", "Income amount must be positive.")
+             return
 
-            # amount validation is also done in logic.py, but a quick check here is fine
-            if amount <= 0:
-                 messagebox.showerror("Error", "Income amount must be positive.")
-                 return
+        # Call the logic method to add income to the user object and log the transaction
+        msg = current_user.add_income(amount)
 
-            # Call the logic method to add income to the user object and log the transaction
-            msg = current_user.add_income(amount)
+        if "✅" in msg:
+             # Save the updated state of all clients after a successful operation
+             if not save_clients():
+                 return
+             refresh_user_model() # Bound widgets update; hidden views refresh when next shown
+             messagebox.showinfo("Income Added", msg)
+             income_amount_entry.delete(0, 'end') # Clear entry
+        else:
+             # Display error message returned from logic
+             messagebox.showerror("Error", msg)
 
-            if "✅" in msg:
-                 # Save the updated state of all clients after a successful operation
-                 save_all_clients(clients)
-                 messagebox.showinfo("Income Added", msg)
-                 income_amount_entry.delete(0, 'end') # Clear entry
-                 update_dashboard_view() # Update dashboard after adding income
-            else:
-                 # Display error message returned from logic
-                 messagebox.showerror("Error", msg)
 
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid number for the amount.")
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        print(f"Error adding income: {e}") # Debug print
 
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid number for the amount.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
-            print(f"Error adding income: {e}") # Debug print
 
+ctk.CTkButton(income_frame, text="Add Income", command=handle_add_income, width=200, height=40, fg_color=ACCENT_GREEN, hover_color=ACCENT_BLUE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+# Entries are cleared when a different user logs in
+income_view.bind(lambda: income_amount_entry.delete(0, 'end'), user_model.username)
 
-    ctk.CTkButton(income_frame, text="Add Income", command=handle_add_income, width=200, height=40, fg_color=ACCENT_GREEN, hover_color=ACCENT_BLUE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
 
 # --- Expense View ---
 expense_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Expense"] = expense_frame
-expense_amount_entry = None
-expense_category_entry = None
+expense_view = views["Expense"] = View(expense_frame)
 
-def update_expense_view():
-    global expense_amount_entry, expense_category_entry
-    if not current_user: return
-    for widget in expense_frame.winfo_children(): widget.destroy() # Clear previous content
+ctk.CTkLabel(expense_frame, text="Record Expense", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+ctk.CTkLabel(expense_frame, text="Enter the amount spent and its category:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
 
-    ctk.CTkLabel(expense_frame, text="Record Expense", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
-    ctk.CTkLabel(expense_frame, text="Enter the amount spent and its category:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
+ctk.CTkLabel(expense_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+expense_amount_entry = ctk.CTkEntry(expense_frame, placeholder_text="e.g., 350.50", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+expense_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(expense_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    expense_amount_entry = ctk.CTkEntry(expense_frame, placeholder_text="e.g., 350.50", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    expense_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
+ctk.CTkLabel(expense_frame, text="Category:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+expense_category_entry = ctk.CTkEntry(expense_frame, placeholder_text="e.g., Groceries, Bills", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+expense_category_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(expense_frame, text="Category:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    expense_category_entry = ctk.CTkEntry(expense_frame, placeholder_text="e.g., Groceries, Bills", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    expense_category_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
+def handle_add_expense():
+    try:
+        amount_str = expense_amount_entry.get().strip()
+        category = expense_category_entry.get().strip()
 
-    def handle_add_expense():
-        try:
-            amount_str = expense_amount_entry.get().strip()
-            category = expense_category_entry.get().strip()
+        if not amount_str:
+             messagebox.showerror("Error", "Please enter an amount.")
+             return
+        if not category:
+            messagebox.showerror("Error", "Please enter a category for the expense.")
+            return
 
-            if not amount_str:
-                 messagebox.showerror("Error", "Please enter an amount.")
-                 return
-            if not category:
-                messagebox.showerror("Error", "Please enter a category for the expense.")
-                return
+        amount = to_paisa(amount_str)
 
-            amount = float(amount_str)
+        # amount validation is also done in logic.py, but a quick check here is fine
+        if amount <= 0:
+             messagebox.showerror("Error", "Expense amount must be positive.")
+             return
+
+        # Call the logic method to record the expense
+        msg = current_user.withdraw(amount, category)
 
-            # amount validation is also done in logic.py, but a quick check here is fine
-            if amount <= 0:
-                 messagebox.showerror("Error", "Expense amount must be positive.")
+        if "✅" in msg or "⚠️" in msg: # Success or Budget Alert
+             # Save the updated state of all clients after a successful/warned operation
+             if not save_clients():
                  return
+             refresh_user_model()
+             messagebox.showinfo("Expense Recorded", msg) # Use showinfo even for warning message
+             expense_amount_entry.delete(0, 'end')
+             expense_category_entry.delete(0, 'end')
+        else: # Handles "❌" messages from withdraw method
+            messagebox.showerror("Error", msg)
 
-            # Call the logic method to record the expense
-            msg = current_user.withdraw(amount, category)
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid number for the amount.")
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        print(f"Error adding expense: {e}") # Debug print
 
-            if "✅" in msg or "⚠️" in msg: # Success or Budget Alert
-                 # Save the updated state of all clients after a successful/warned operation
-                 save_all_clients(clients)
-                 messagebox.showinfo("Expense Recorded", msg) # Use showinfo even for warning message
-                 expense_amount_entry.delete(0, 'end')
-                 expense_category_entry.delete(0, 'end')
-                 update_dashboard_view() # Update dashboard
-            else: # Handles "❌" messages from withdraw method
-                messagebox.showerror("Error", msg)
 
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid number for the amount.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
-            print(f"Error adding expense: {e}") # Debug print
+ctk.CTkButton(expense_frame, text="Add Expense", command=handle_add_expense, width=200, height=40, fg_color=ACCENT_RED, hover_color=ACCENT_PINK, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
 
+def clear_expense_entries():
+    expense_amount_entry.delete(0, 'end')
+    expense_category_entry.delete(0, 'end')
 
-    ctk.CTkButton(expense_frame, text="Add Expense", command=handle_add_expense, width=200, height=40, fg_color=ACCENT_RED, hover_color=ACCENT_PINK, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+expense_view.bind(clear_expense_entries, user_model.username)
 
 
 # --- Transfer View ---
 transfer_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Transfer"] = transfer_frame
-transfer_recipient_entry = None
-transfer_amount_entry = None
+transfer_view = views["Transfer"] = View(transfer_frame)
 
-def update_transfer_view():
-    global transfer_recipient_entry, transfer_amount_entry
-    if not current_user: return
-    for widget in transfer_frame.winfo_children(): widget.destroy() # Clear previous content
+ctk.CTkLabel(transfer_frame, text="Transfer Funds", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+ctk.CTkLabel(transfer_frame, text="Enter recipient username and amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
+
+ctk.CTkLabel(transfer_frame, text="Recipient Username:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+transfer_recipient_entry = ctk.CTkEntry(transfer_frame, placeholder_text="Username", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+transfer_recipient_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(transfer_frame, text="Transfer Funds", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
-    ctk.CTkLabel(transfer_frame, text="Enter recipient username and amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
+ctk.CTkLabel(transfer_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+transfer_amount_entry = ctk.CTkEntry(transfer_frame, placeholder_text="e.g., 100.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+transfer_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(transfer_frame, text="Recipient Username:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    transfer_recipient_entry = ctk.CTkEntry(transfer_frame, placeholder_text="Username", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    transfer_recipient_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    ctk.CTkLabel(transfer_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    transfer_amount_entry = ctk.CTkEntry(transfer_frame, placeholder_text="e.g., 100.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    transfer_amount_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
+def handle_transfer():
+    # Check for child account restriction first
+    if isinstance(current_user, ChildAccount):
+         messagebox.showerror("Restriction", "Child accounts cannot initiate transfers.")
+         return
 
+    try:
+        recipient_uname = transfer_recipient_entry.get().lower().strip()
+        amount_str = transfer_amount_entry.get().strip()
 
-    def handle_transfer():
-        # Check for child account restriction first
-        if isinstance(current_user, ChildAccount):
-             messagebox.showerror("Restriction", "Child accounts cannot initiate transfers.")
+        if not recipient_uname:
+            messagebox.showerror("Error", "Please enter a recipient username.")
+            return
+        if not amount_str:
+             messagebox.showerror("Error", "Please enter an amount.")
              return
 
-        try:
-            recipient_uname = transfer_recipient_entry.get().lower().strip()
-            amount_str = transfer_amount_entry.get().strip()
+        amount = to_paisa(amount_str)
 
-            if not recipient_uname:
-                messagebox.showerror("Error", "Please enter a recipient username.")
-                return
-            if not amount_str:
-                 messagebox.showerror("Error", "Please enter an amount.")
-                 return
+        # amount validation is also done in logic.py, but a quick check here is fine
+        if amount <= 0:
+            messagebox.showerror("Error", "Transfer amount must be positive.")
+            return
+        if recipient_uname == current_user.uname.lower(): # Compare lowercase usernames
+            messagebox.showerror("Error", "Cannot transfer funds to yourself.")
+            return
 
-            amount = float(amount_str)
+        # Find recipient in the current clients list (already loaded in memory)
+        receiver = find_client_by_username(clients, recipient_uname)
 
-            # amount validation is also done in logic.py, but a quick check here is fine
-            if amount <= 0:
-                messagebox.showerror("Error", "Transfer amount must be positive.")
-                return
-            if recipient_uname == current_user.uname.lower(): # Compare lowercase usernames
-                messagebox.showerror("Error", "Cannot transfer funds to yourself.")
-                return
+        if receiver:
+            # Call the logic method to perform the transfer on user objects and log transactions
+            msg = current_user.transfer(receiver, amount)
 
-            # Find recipient in the current clients list (already loaded in memory)
-            receiver = find_client_by_username(clients, recipient_uname)
-
-            if receiver:
-                # Call the logic method to perform the transfer on user objects and log transactions
-                msg = current_user.transfer(receiver, amount)
-
-                if "✅" in msg:
-                    # Save the updated state of *all* clients after a successful transfer
-                    save_all_clients(clients)
-                    messagebox.showinfo("Transfer Success", msg)
-                    transfer_recipient_entry.delete(0, 'end')
-                    transfer_amount_entry.delete(0, 'end')
-                    update_dashboard_view() # Update dashboard (balance changes)
-                else: # Handles "❌" messages from transfer method
-                    messagebox.showerror("Transfer Failed", msg)
-            else:
-                messagebox.showerror("Error", f"Recipient user '{recipient_uname}' not found.")
+            if "✅" in msg:
+                # Save the updated state of *all* clients after a successful transfer
+                if not save_clients():
+                    return
+                refresh_user_model()
+                messagebox.showinfo("Transfer Success", msg)
+                transfer_recipient_entry.delete(0, 'end')
+                transfer_amount_entry.delete(0, 'end')
+            else: # Handles "❌" messages from transfer method
+                messagebox.showerror("Transfer Failed", msg)
+        else:
+            messagebox.showerror("Error", f"Recipient user '{recipient_uname}' not found.")
 
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid number for the amount.")
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
-            print(f"Error handling transfer: {e}") # Debug print
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid number for the amount.")
+    except Exception as e:
+        messagebox.showerror("Error", f"An error occurred: {e}")
+        print(f"Error handling transfer: {e}") # Debug print
+
+
+ctk.CTkButton(transfer_frame, text="Send Money", command=handle_transfer, width=200, height=40, fg_color=ACCENT_PINK, hover_color=ACCENT_PURPLE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
 
+def clear_transfer_entries():
+    transfer_recipient_entry.delete(0, 'end')
+    transfer_amount_entry.delete(0, 'end')
 
-    ctk.CTkButton(transfer_frame, text="Send Money", command=handle_transfer, width=200, height=40, fg_color=ACCENT_PINK, hover_color=ACCENT_PURPLE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+transfer_view.bind(clear_transfer_entries, user_model.username)
 
 
 # --- Loans View ---
 loans_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Loans"] = loans_frame
-loan_request_entry = None
-loan_repay_entry = None
-loan_status_label = None
+loans_view = views["Loans"] = View(loans_frame)
 
-def update_loans_view():
-    global loan_request_entry, loan_repay_entry, loan_status_label
-    if not current_user: return
-    for widget in loans_frame.winfo_children(): widget.destroy() # Clear previous content
+ctk.CTkLabel(loans_frame, text="Loan Management", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+
+# Display Current Loan Status
+loan_status_label = ctk.CTkLabel(loans_frame, text="", font=("Arial", 16), text_color=TEXT_LIGHT)
+loan_status_label.pack(pady=(0,20), anchor="w")
 
-    ctk.CTkLabel(loans_frame, text="Loan Management", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+# --- Request Loan Section ---
+req_frame = ctk.CTkFrame(loans_frame, fg_color="transparent")
+req_frame.pack(fill="x", pady=10)
+ctk.CTkLabel(req_frame, text="Request a New Loan", font=("Arial", 16, "bold"), text_color=ACCENT_BLUE).pack(anchor="w")
 
-    # Display Current Loan Status
-    # Use current_user.loans directly as display_balance is for account balance
-    loan_status_label = ctk.CTkLabel(loans_frame, text=f"Current Outstanding Loan: {format_currency(current_user.loans)}", font=("Arial", 16), text_color=TEXT_LIGHT)
-    loan_status_label.pack(pady=(0,20), anchor="w")
+ctk.CTkLabel(req_frame, text="Amount to Request:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w", side="top") # Added label
+loan_request_entry = ctk.CTkEntry(req_frame, placeholder_text="Amount", width=250, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+loan_request_entry.pack(pady=5, side="left", padx=(0, 10)) # Adjusted padding
 
-    # --- Request Loan Section ---
-    req_frame = ctk.CTkFrame(loans_frame, fg_color="transparent")
-    req_frame.pack(fill="x", pady=10)
-    ctk.CTkLabel(req_frame, text="Request a New Loan", font=("Arial", 16, "bold"), text_color=ACCENT_BLUE).pack(anchor="w")
 
-    ctk.CTkLabel(req_frame, text="Amount to Request:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w", side="top") # Added label
-    loan_request_entry = ctk.CTkEntry(req_frame, placeholder_text="Amount", width=250, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    loan_request_entry.pack(pady=5, side="left", padx=(0, 10)) # Adjusted padding
+def handle_request_loan():
+    # Check for child account restriction
+    if isinstance(current_user, ChildAccount):
+        messagebox.showerror("Restriction", "Child accounts are not eligible for loans.")
+        return
+    try:
+        amount_str = loan_request_entry.get().strip()
+        if not amount_str:
+             messagebox.showerror("Error", "Please enter an amount.")
+             return
 
+        amount = to_paisa(amount_str)
 
-    def handle_request_loan():
-        # Check for child account restriction
-        if isinstance(current_user, ChildAccount):
-            messagebox.showerror("Restriction", "Child accounts are not eligible for loans.")
+        # amount validation also in logic.py, but a quick check here is fine
+        if amount <= 0:
+            messagebox.showerror("Error", "Loan amount must be positive.")
             return
-        try:
-            amount_str = loan_request_entry.get().strip()
-            if not amount_str:
-                 messagebox.showerror("Error", "Please enter an amount.")
-                 return
 
-            amount = float(amount_str)
+        # Call the logic method to request the loan
+        msg = current_user.request_loan(amount)
 
-            # amount validation also in logic.py, but a quick check here is fine
-            if amount <= 0:
-                messagebox.showerror("Error", "Loan amount must be positive.")
+        if "✅" in msg:
+            # Save the updated state after successful operation
+            if not save_clients():
                 return
+            refresh_user_model() # Updates the loan status label and the (hidden) dashboard
+            messagebox.showinfo("Loan Request", msg)
+            loan_request_entry.delete(0, 'end')
+        else: # Handles "❌" messages from request_loan method
+            messagebox.showerror("Loan Request Failed", msg)
 
-            # Call the logic method to request the loan
-            msg = current_user.request_loan(amount)
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid loan amount.")
+    except Exception as e:
+         messagebox.showerror("Error", f"An error occurred: {e}")
+         print(f"Error handling loan request: {e}") # Debug print
 
-            if "✅" in msg:
-                # Save the updated state after successful operation
-                save_all_clients(clients)
-                messagebox.showinfo("Loan Request", msg)
-                loan_request_entry.delete(0, 'end')
-                # Update the loan status label directly
-                loan_status_label.configure(text=f"Current Outstanding Loan: {format_currency(current_user.loans)}")
-                update_dashboard_view() # Update balance on dashboard
-            else: # Handles "❌" messages from request_loan method
-                messagebox.showerror("Loan Request Failed", msg)
 
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid loan amount.")
-        except Exception as e:
-             messagebox.showerror("Error", f"An error occurred: {e}")
-             print(f"Error handling loan request: {e}") # Debug print
+ctk.CTkButton(req_frame, text="Request Loan", command=handle_request_loan, width=150, height=35, fg_color=ACCENT_BLUE, hover_color=ACCENT_GREEN, font=("Arial", 14, "bold"), corner_radius=10).pack(side="left")
 
 
-    ctk.CTkButton(req_frame, text="Request Loan", command=handle_request_loan, width=150, height=35, fg_color=ACCENT_BLUE, hover_color=ACCENT_GREEN, font=("Arial", 14, "bold"), corner_radius=10).pack(side="left")
+# --- Repay Loan Section ---
+repay_frame = ctk.CTkFrame(loans_frame, fg_color="transparent")
+repay_frame.pack(fill="x", pady=10,padx=0) # Corrected _padx to padx
+ctk.CTkLabel(repay_frame, text="Repay Loan", font=("Arial", 16, "bold"), text_color=ACCENT_GREEN).pack(anchor="w")
 
+ctk.CTkLabel(repay_frame, text="Amount to Repay:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w", side="top") # Added label
+loan_repay_entry = ctk.CTkEntry(repay_frame, placeholder_text="Amount", width=250, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+loan_repay_entry.pack(pady=5, side="left", padx=(0, 10)) # Adjusted padding
 
-    # --- Repay Loan Section ---
-    repay_frame = ctk.CTkFrame(loans_frame, fg_color="transparent")
-    repay_frame.pack(fill="x", pady=10,padx=0) # Corrected _padx to padx
-    ctk.CTkLabel(repay_frame, text="Repay Loan", font=("Arial", 16, "bold"), text_color=ACCENT_GREEN).pack(anchor="w")
 
-    ctk.CTkLabel(repay_frame, text="Amount to Repay:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w", side="top") # Added label
-    loan_repay_entry = ctk.CTkEntry(repay_frame, placeholder_text="Amount", width=250, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    loan_repay_entry.pack(pady=5, side="left", padx=(0, 10)) # Adjusted padding
+def handle_repay_loan():
+    try:
+        amount_str = loan_repay_entry.get().strip()
+        if not amount_str:
+             messagebox.showerror("Error", "Please enter an amount.")
+             return
 
+        amount = to_paisa(amount_str)
 
-    def handle_repay_loan():
-        try:
-            amount_str = loan_repay_entry.get().strip()
-            if not amount_str:
-                 messagebox.showerror("Error", "Please enter an amount.")
-                 return
+        # amount validation also in logic.py, but a quick check here is fine
+        if amount <= 0:
+             messagebox.showerror("Error", "Repayment amount must be positive.")
+             return
+        if amount > current_user.amount:
+            messagebox.showerror("Error", "Cannot repay. Insufficient funds.")
+            return
+        if amount > current_user.loans:
+            # Allow repaying less than the outstanding loan, but not more
+            messagebox.showerror("Error", f"Cannot repay more than the outstanding loan amount ({format_currency(current_user.loans)}).")
+            return
 
-            amount = float(amount_str)
 
-            # amount validation also in logic.py, but a quick check here is fine
-            if amount <= 0:
-                 messagebox.showerror("Error", "Repayment amount must be positive.")
-                 return
-            if amount > current_user.amount:
-                messagebox.showerror("Error", "Cannot repay. Insufficient funds.")
-                return
-            if amount > current_user.loans:
-                # Allow repaying less than the outstanding loan, but not more
-                messagebox.showerror("Error", f"Cannot repay more than the outstanding loan amount ({current_user.loans:.2f}).")
-                return
+        # Call the logic method to repay the loan
+        msg = current_user.repay_loan(amount)
 
+        if "✅" in msg:
+            # Save the updated state after successful operation
+            if not save_clients():
+                return
+            refresh_user_model() # Updates the loan status label and the (hidden) dashboard
+            messagebox.showinfo("Loan Repayment", msg)
+            loan_repay_entry.delete(0, 'end')
+        else: # Handles "❌" messages from repay_loan method
+            messagebox.showerror("Repayment Failed", msg)
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid repayment amount.")
+    except Exception as e:
+         messagebox.showerror("Error", f"An error occurred: {e}")
+         print(f"Error handling loan repayment: {e}") # Debug print
 
-            # Call the logic method to repay the loan
-            msg = current_user.repay_loan(amount)
 
-            if "✅" in msg:
-                # Save the updated state after successful operation
-                save_all_clients(clients)
-                messagebox.showinfo("Loan Repayment", msg)
-                loan_repay_entry.delete(0, 'end')
-                # Update the loan status label directly
-                loan_status_label.configure(text=f"Current Outstanding Loan: {format_currency(current_user.loans)}")
-                update_dashboard_view() # Update balance on dashboard
-            else: # Handles "❌" messages from repay_loan method
-                messagebox.showerror("Repayment Failed", msg)
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid repayment amount.")
-        except Exception as e:
-             messagebox.showerror("Error", f"An error occurred: {e}")
-             print(f"Error handling loan repayment: {e}") # Debug print
+ctk.CTkButton(repay_frame, text="Repay Loan", command=handle_repay_loan, width=150, height=35, fg_color=ACCENT_GREEN, hover_color=ACCENT_BLUE, font=("Arial", 14, "bold"), corner_radius=10).pack(side="left")
 
+def clear_loan_entries():
+    loan_request_entry.delete(0, 'end')
+    loan_repay_entry.delete(0, 'end')
 
-    ctk.CTkButton(repay_frame, text="Repay Loan", command=handle_repay_loan, width=150, height=35, fg_color=ACCENT_GREEN, hover_color=ACCENT_BLUE, font=("Arial", 14, "bold"), corner_radius=10).pack(side="left")
+loans_view.bind(lambda: loan_status_label.configure(text=f"Current Outstanding Loan: {format_currency(user_model.loans.get())}"), user_model.loans)
+loans_view.bind(clear_loan_entries, user_model.username)
 
 
 # --- Budget View ---
 budget_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Budget"] = budget_frame
-budget_entry = None
-budget_status_label = None
-budget_remaining_label = None
-budget_prog_bar = None # Define globally to update easily
-
-def update_budget_view():
-    global budget_entry, budget_status_label, budget_remaining_label, budget_prog_bar
-    if not current_user: return
-    for widget in budget_frame.winfo_children(): widget.destroy() # Clear previous content
+budget_view = views["Budget"] = View(budget_frame)
 
-    ctk.CTkLabel(budget_frame, text="Manage Budget", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+ctk.CTkLabel(budget_frame, text="Manage Budget", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
 
-    # Display Current Budget Status
-    current_budget = current_user.display_budget() # Get current budget value
-    # Ensure total_spent is a number before calculation
-    total_spent_val = current_user.total_spent if isinstance(current_user.total_spent, (int, float)) else 0
+# Display Current Budget Status
+budget_status_label = ctk.CTkLabel(budget_frame, text="", font=("Arial", 16), text_color=TEXT_LIGHT)
+budget_status_label.pack(pady=(0,5), anchor="w")
+budget_remaining_label = ctk.CTkLabel(budget_frame, text="", font=("Arial", 16), text_color=ACCENT_BLUE)
+budget_remaining_label.pack(pady=(0,20), anchor="w")
 
-    budget_status_label = ctk.CTkLabel(budget_frame, text=f"Current Monthly Budget: {format_currency(current_budget)}", font=("Arial", 16), text_color=TEXT_LIGHT)
-    budget_status_label.pack(pady=(0,5), anchor="w")
+# Label to show percentage usage next to the bar
+budget_percent_label = ctk.CTkLabel(budget_frame, text="", font=("Arial", 12), text_color=TEXT_LIGHT)
+budget_percent_label.pack(pady=(0, 2), padx=20, anchor="w")
+budget_prog_bar = ctk.CTkProgressBar(budget_frame, orientation="horizontal", progress_color=PROGRESS_BAR, fg_color=ENTRY_FIELD)
+budget_prog_bar.pack(pady=(0, 10), padx=20, fill="x")
 
-    remaining_str = "N/A"
-    progress = 0.0 # Represents the portion of budget *spent*
-    if current_budget > 0:
-        remaining = current_budget - total_spent_val
-        remaining_str = format_currency(remaining)
-         # Progress is total_spent divided by budget, capped between 0 and 1
-        progress = max(0.0, min(1.0, (total_spent_val / current_budget)))
-    else:
-        remaining_str = "No Budget Set"
-        progress = 0.0 # No budget means 0% progress towards it
-
-    budget_remaining_label = ctk.CTkLabel(budget_frame, text=f"Remaining This Month: {remaining_str}", font=("Arial", 16), text_color=ACCENT_BLUE)
-    budget_remaining_label.pack(pady=(0,20), anchor="w")
-
-    # Progress bar and percentage display for budget
-    budget_prog_bar = ctk.CTkProgressBar(budget_frame, orientation="horizontal", progress_color=PROGRESS_BAR, fg_color=ENTRY_FIELD)
-    budget_prog_bar.set(progress) # Set bar value based on spent proportion
 
-    # Label to show percentage usage next to the bar
-    ctk.CTkLabel(budget_frame, text=f"{progress:.1%} Used", font=("Arial", 12), text_color=TEXT_LIGHT).pack(pady=(0, 2), padx=20, anchor="w")
-    budget_prog_bar.pack(pady=(0, 10), padx=20, fill="x")
+# Set/Update Budget Section
+ctk.CTkLabel(budget_frame, text="Set New Monthly Budget", font=("Arial", 16, "bold"), text_color=ACCENT_PINK).pack(anchor="w", pady=(10,5))
 
+ctk.CTkLabel(budget_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
+budget_entry = ctk.CTkEntry(budget_frame, placeholder_text="e.g., 20000.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
+budget_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
 
-    # Set/Update Budget Section
-    ctk.CTkLabel(budget_frame, text="Set New Monthly Budget", font=("Arial", 16, "bold"), text_color=ACCENT_PINK).pack(anchor="w", pady=(10,5))
 
-    ctk.CTkLabel(budget_frame, text="Amount:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(5, 0), padx=0, anchor="w") # Added label
-    budget_entry = ctk.CTkEntry(budget_frame, placeholder_text="e.g., 20000.00", width=300, height=35, corner_radius=10, fg_color=ENTRY_FIELD)
-    budget_entry.pack(pady=(0, 5), anchor="w") # Adjusted padding
+def handle_set_budget():
+    try:
+        new_budget_str = budget_entry.get().strip()
+        if not new_budget_str:
+             messagebox.showerror("Error", "Please enter a budget amount.")
+             return
 
+        new_budget = to_paisa(new_budget_str)
 
-    def handle_set_budget():
-        try:
-            new_budget_str = budget_entry.get().strip()
-            if not new_budget_str:
-                 messagebox.showerror("Error", "Please enter a budget amount.")
-                 return
+        # Validation also in logic, but quick check here
+        if new_budget < 0:
+            messagebox.showerror("Error", "Budget cannot be negative.")
+            return
 
-            new_budget = float(new_budget_str)
+        # Call the logic method to set the budget
+        msg = current_user.set_budget(new_budget)
 
-            # Validation also in logic, but quick check here
-            if new_budget < 0:
-                messagebox.showerror("Error", "Budget cannot be negative.")
+        if "✅" in msg:
+            # Save the updated state after successful operation
+            if not save_clients():
                 return
+            refresh_user_model() # Budget labels and progress bars here and on the dashboard follow the model
+            messagebox.showinfo("Budget Updated", msg) # Show message from logic
+            budget_entry.delete(0, 'end')
 
-            # Call the logic method to set the budget
-            msg = current_user.set_budget(new_budget)
+        else: # Handles "❌" messages from set_budget method
+            messagebox.showerror("Budget Update Failed", msg)
 
-            if "✅" in msg:
-                # Save the updated state after successful operation
-                save_all_clients(clients)
-                messagebox.showinfo("Budget Updated", msg) # Show message from logic
-                budget_entry.delete(0, 'end')
-                # Update labels and progress bar directly after setting budget and saving
-                updated_budget = current_user.display_budget()
-                updated_total_spent = current_user.total_spent if isinstance(current_user.total_spent, (int, float)) else 0
-
-                budget_status_label.configure(text=f"Current Monthly Budget: {format_currency(updated_budget)}")
-
-                updated_remaining_str = "N/A"
-                updated_progress = 0.0
-                if updated_budget > 0:
-                    updated_remaining = updated_budget - updated_total_spent
-                    updated_remaining_str = format_currency(updated_remaining)
-                    updated_progress = max(0.0, min(1.0, (updated_total_spent / updated_budget)))
-                else:
-                    updated_remaining_str = "No Budget Set"
-                    updated_progress = 0.0
-
-                budget_remaining_label.configure(text=f"Remaining This Month: {updated_remaining_str}")
-                budget_prog_bar.set(updated_progress) # Update progress bar
-                 # Update percentage label (assuming it's the next widget after the progress bar's parent frame)
-                # A more robust way might be to store the label in a global variable too
-                # For now, rely on widget packing order: label is likely the 4th child of the budget_frame if packed sequentially
-                # Find the label containing the percentage text
-                for child in budget_frame.winfo_children():
-                     if isinstance(child, ctk.CTkLabel) and "Used" in child.cget("text"):
-                         child.configure(text=f"{updated_progress:.1%} Used")
-                         break
-
-
-                update_dashboard_view() # Update dashboard as well (budget section there)
-
-            else: # Handles "❌" messages from set_budget method
-                messagebox.showerror("Budget Update Failed", msg)
 
+    except ValueError:
+        messagebox.showerror("Error", "Please enter a valid budget amount.")
+    except Exception as e:
+         messagebox.showerror("Error", f"An error occurred: {e}")
+         print(f"Error setting budget: {e}") # Debug print
 
-        except ValueError:
-            messagebox.showerror("Error", "Please enter a valid budget amount.")
-        except Exception as e:
-             messagebox.showerror("Error", f"An error occurred: {e}")
-             print(f"Error setting budget: {e}") # Debug print
 
+ctk.CTkButton(budget_frame, text="Set Budget", command=handle_set_budget, width=200, height=40, fg_color=ACCENT_PINK, hover_color=ACCENT_PURPLE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+
+def update_budget_labels():
+    current_budget = user_model.budget.get()
+    remaining_str, progress = budget_status(current_budget, user_model.total_spent.get())
+    budget_status_label.configure(text=f"Current Monthly Budget: {format_currency(current_budget)}")
+    budget_remaining_label.configure(text=f"Remaining This Month: {remaining_str}")
+    budget_percent_label.configure(text=f"{progress:.1%} Used")
+    budget_prog_bar.set(progress) # Set bar value based on spent proportion
 
-    ctk.CTkButton(budget_frame, text="Set Budget", command=handle_set_budget, width=200, height=40, fg_color=ACCENT_PINK, hover_color=ACCENT_PURPLE, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+budget_view.bind(update_budget_labels, user_model.budget, user_model.total_spent)
+budget_view.bind(lambda: budget_entry.delete(0, 'end'), user_model.username)
 
 
 # --- Graphs View ---
 graphs_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["Graphs"] = graphs_frame
+graphs_view = views["Graphs"] = View(graphs_frame)
+
+ctk.CTkLabel(graphs_frame, text="Financial Graphs", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+CHART_RANGES = {"All time": None, "Last 7 days": 7, "Last 30 days": 30, "Last 90 days": 90, "Last 12 months": 365} # Label -> days
+chart_range = Observable(None) # Days shown on the Graphs view (None = whole history)
+range_bar = ctk.CTkFrame(graphs_frame, fg_color="transparent")
+range_bar.pack(pady=(0, 10), anchor="w")
+ctk.CTkLabel(range_bar, text="Range:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(side="left", padx=(0, 10))
+ctk.CTkOptionMenu(range_bar, values=list(CHART_RANGES), width=220, fg_color=ENTRY_FIELD, button_color=TERTIARY_DARK,
+                  variable=ctk.StringVar(value="All time"),
+                  command=lambda label: chart_range.set(CHART_RANGES[label])).pack(side="left")
+graphs_error_label = ctk.CTkLabel(graphs_frame, text="", font=("Arial", 14), text_color=ACCENT_RED) # Packed only on errors
+
+# --- Monthly Trend ---
+monthly_chart_frame = ctk.CTkFrame(graphs_frame, fg_color="transparent")
+monthly_chart_frame.pack(fill="x")
+ctk.CTkLabel(monthly_chart_frame, text="Net Cash Flow", font=("Arial", 16, "bold"), text_color=TEXT_LIGHT).pack(pady=(10,5), anchor="w")
 # Keep image labels global to prevent garbage collection issues
-monthly_img_label = None
-pie_img_label = None
+monthly_img_label = ctk.CTkLabel(monthly_chart_frame, text="")
+monthly_msg_label = ctk.CTkLabel(monthly_chart_frame, text="", font=("Arial", 14), text_color=TEXT_LIGHT)
+
+# --- Expense Pie Chart ---
+pie_chart_frame = ctk.CTkFrame(graphs_frame, fg_color="transparent")
+pie_chart_frame.pack(fill="x")
+ctk.CTkLabel(pie_chart_frame, text="Expense Breakdown", font=("Arial", 16, "bold"), text_color=TEXT_LIGHT).pack(pady=(20,5), anchor="w")
+pie_img_label = ctk.CTkLabel(pie_chart_frame, text="")
+pie_msg_label = ctk.CTkLabel(pie_chart_frame, text="", font=("Arial", 14), text_color=TEXT_LIGHT)
 
-def update_graphs_view():
-    global monthly_img_label, pie_img_label
-    if not current_user: return
-    for widget in graphs_frame.winfo_children(): widget.destroy() # Clear previous content
 
-    ctk.CTkLabel(graphs_frame, text="Financial Graphs", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+def update_graphs():
+    """Regenerates the chart images. Bound to the ledger, so it only runs when the data changed."""
+    if not current_user: return
 
-    # Generate charts using logic function which saves them as files
+    # plot_charts saves the images to filenames based on username and range; the whole-history charts come
+    # from the prefetch, other ranges are drawn on the same worker. The Tk thread never waits for them.
+    uname, days = current_user.uname, chart_range.get()
+    if days is None:
+        future = analytics.submit("charts", uname)
+    else:
+        future = analytics.submit("charts", uname, days)
+    if not future.done():
+        graphs_error_label.pack_forget()
+        for label in (monthly_img_label, pie_img_label, pie_msg_label):
+            label.pack_forget()
+        monthly_msg_label.configure(text="Loading charts...")
+        monthly_msg_label.pack(pady=5)
+    user_model.when_ready("charts", future, lambda done: show_graphs(done, uname, days))
+
+
+def show_graphs(future, uname, days):
+    """Shows the charts drawn by a finished "charts" task, or why they could not be drawn."""
     try:
-        # plot_charts function saves the images to filenames based on username
-        plot_charts(current_user.uname)
-        monthly_path = f"{current_user.uname.lower()}_monthly_trend.png" # Ensure lowercase for filename consistency
-        pie_path = f"{current_user.uname.lower()}_expense_pie.png"     # Ensure lowercase for filename consistency
-
-        # --- Display Monthly Trend ---
-        ctk.CTkLabel(graphs_frame, text="Monthly Net Cash Flow", font=("Arial", 16, "bold"), text_color=TEXT_LIGHT).pack(pady=(10,5), anchor="w")
-        if os.path.exists(monthly_path):
-            try:
-                # Open the image file using PIL
-                monthly_pil_image = Image.open(monthly_path)
-                # Resize if necessary to fit in the GUI without being too large
-                max_width = 800 # Maximum width for the chart image in GUI
-                # Calculate aspect ratio to maintain proportions, but don't enlarge
-                ratio = min(max_width / monthly_pil_image.width, 1.0) # Cap ratio at 1.0
-                new_size = (int(monthly_pil_image.width * ratio), int(monthly_pil_image.height * ratio))
-                # Resize the image using a high-quality filter
-                monthly_pil_image = monthly_pil_image.resize(new_size, Image.Resampling.BICUBIC) # Use Image.Resampling
-
-                # Convert the PIL image to a CustomTkinter compatible image
-                monthly_ctk_image = ImageTk.PhotoImage(monthly_pil_image)
-
-                # Create or update the label that displays the image
-                if monthly_img_label is None or not monthly_img_label.winfo_exists(): # Check if label exists or was destroyed
-                     monthly_img_label = ctk.CTkLabel(graphs_frame, text="", image=monthly_ctk_image)
-                else:
-                    monthly_img_label.configure(image=monthly_ctk_image)
-                # Keep a reference to the CTkImage object to prevent it from being garbage collected
-                monthly_img_label.image = monthly_ctk_image
-                monthly_img_label.pack(pady=5)
-
-            except FileNotFoundError: # Should be caught by the outer try, but included for safety
-                 ctk.CTkLabel(graphs_frame, text="Monthly trend chart file not found after generation attempt.", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=5)
-            except Exception as img_e:
-                ctk.CTkLabel(graphs_frame, text=f"Error displaying monthly chart: {img_e}", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=5)
-                print(f"Error displaying monthly chart: {img_e}") # Debug print
-        else:
-             # Display a message if the chart file does not exist (e.g., not enough data)
-             ctk.CTkLabel(graphs_frame, text="Monthly trend chart not available (not enough data or generation error).", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=5)
-
-
-        # --- Display Expense Pie Chart ---
-        ctk.CTkLabel(graphs_frame, text="Expense Breakdown", font=("Arial", 16, "bold"), text_color=TEXT_LIGHT).pack(pady=(20,5), anchor="w")
-        if os.path.exists(pie_path):
-            try:
-                # Open the image file using PIL
-                pie_pil_image = Image.open(pie_path)
-                # Resize if necessary
-                max_width_pie = 500 # Maximum width for the pie chart image
-                ratio_pie = min(max_width_pie / pie_pil_image.width, 1.0) # Cap ratio at 1.0
-                new_size_pie = (int(pie_pil_image.width * ratio_pie), int(pie_pil_image.height * ratio_pie))
-                 # Resize the image using a high-quality filter
-                pie_pil_image = pie_pil_image.resize(new_size_pie, Image.Resampling.BICUBIC) # Use Image.Resampling
-
-                # Convert the PIL image to a CustomTkinter compatible image
-                pie_ctk_image = ImageTk.PhotoImage(pie_pil_image)
-
-                # Create or update the label that displays the image
-                if pie_img_label is None or not pie_img_label.winfo_exists(): # Check if label exists or was destroyed
-                    pie_img_label = ctk.CTkLabel(graphs_frame, text="", image=pie_ctk_image)
-                else:
-                     pie_img_label.configure(image=pie_ctk_image)
-                # Keep a reference to the CTkImage object
-                pie_img_label.image = pie_ctk_image
-                pie_img_label.pack(pady=5)
-
-            except FileNotFoundError: # Should be caught by outer try, but included for safety
-                 ctk.CTkLabel(graphs_frame, text="Expense pie chart file not found after generation attempt.", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=5)
-            except Exception as img_e:
-                ctk.CTkLabel(graphs_frame, text=f"Error displaying pie chart: {img_e}", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=5)
-                print(f"Error displaying pie chart: {img_e}") # Debug print
-        else:
-            # Display a message if the chart file does not exist
-            ctk.CTkLabel(graphs_frame, text="Expense pie chart not available (not enough data or generation error).", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=5)
+        future.result() # Re-raises the task's error
+        monthly_path, pie_path = chart_paths(uname, days)
+        graphs_error_label.pack_forget()
+
+        # Display a message instead if a chart file does not exist (e.g., not enough data)
+        show_chart_image(monthly_img_label, monthly_msg_label, monthly_path, 800,
+                         "Monthly trend chart not available (not enough data or generation error).")
+        show_chart_image(pie_img_label, pie_msg_label, pie_path, 500,
+                         "Expense pie chart not available (not enough data or generation error).")
+        return
 
     except FileNotFoundError:
-         ctk.CTkLabel(graphs_frame, text="Transaction data file not found to generate graphs.", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
-         print("transactions.csv not found in update_graphs_view.") # Debug print
+         error_message = "Error generating graphs: Transaction data file not found to generate graphs."
+         print("transactions.csv not found in show_graphs.") # Debug print
     except pd.errors.EmptyDataError:
-         ctk.CTkLabel(graphs_frame, text="Transaction data file is empty, cannot generate graphs.", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=20)
-         print("transactions.csv is empty in update_graphs_view.") # Debug print
+         error_message = "Error generating graphs: Transaction data file is empty, cannot generate graphs."
+         print("transactions.csv is empty in show_graphs.") # Debug print
     except Exception as e:
-        # Catch the specific pandas parser error and provide a more tailored message
-        if "Error tokenizing data" in str(e) and "saw" in str(e):
-             error_message = f"Error reading transaction data: Inconsistent format found in transactions.csv (e.g., extra commas). Please check or delete the transactions.csv file. Details: {e}"
-        else:
-             error_message = f"Could not generate or display graphs: {e}"
-
+        # Damaged ledger records are skipped when reading, so this is not a parse error of the ledger
+        error_message = f"Could not generate or display graphs: {e}"
         messagebox.showerror("Graph Error", error_message)
-        ctk.CTkLabel(graphs_frame, text=f"Error generating graphs: {error_message}", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
-        print(f"Graph generation error in update_graphs_view: {e}") # Debug print
+        error_message = f"Error generating graphs: {error_message}"
+        print(f"Graph generation error in show_graphs: {e}") # Debug print
+
+    for label in (monthly_img_label, monthly_msg_label, pie_img_label, pie_msg_label):
+        label.pack_forget()
+    graphs_error_label.configure(text=error_message)
+    graphs_error_label.pack(pady=20, before=monthly_chart_frame)
+
+graphs_view.bind(update_graphs, user_model.username, user_model.ledger, chart_range)
 
 
 # --- AI Overview View ---
 ai_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
 content_frames["AI Overview"] = ai_frame
-# ai_prediction_label = None # Keep label global to update its text - Replaced by graph label
+ai_view = views["AI Overview"] = View(ai_frame)
+
+ctk.CTkLabel(ai_frame, text="AI Expense Prediction", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+forecast_model = Observable(DEFAULT_FORECAST_MODEL) # Name of the selected forecasting model
+_model_names = {model.label: name for name, model in FORECAST_MODELS.items()}
+model_bar = ctk.CTkFrame(ai_frame, fg_color="transparent")
+model_bar.pack(pady=(0, 10), anchor="w")
+ctk.CTkLabel(model_bar, text="Model:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(side="left", padx=(0, 10))
+ctk.CTkOptionMenu(model_bar, values=list(_model_names), width=220, fg_color=ENTRY_FIELD, button_color=TERTIARY_DARK,
+                  variable=ctk.StringVar(value=FORECAST_MODELS[DEFAULT_FORECAST_MODEL].label),
+                  command=lambda label: forecast_model.set(_model_names[label])).pack(side="left")
+ai_next_month_label = ctk.CTkLabel(ai_frame, text="", font=("Arial", 16), text_color=ACCENT_GREEN)
+ai_next_month_label.pack(pady=(0,20), anchor="w")
+ctk.CTkLabel(ai_frame, text="Historical and Predicted Cumulative Expense Trend:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
 # Global variable to hold the prediction image reference
-prediction_img_label = None
+prediction_img_label = ctk.CTkLabel(ai_frame, text="")
+prediction_msg_label = ctk.CTkLabel(ai_frame, text="", font=("Arial", 14), text_color=ACCENT_RED)
 
 
-def update_ai_overview_view():
-    global prediction_img_label # Use the global variable
+def update_ai_overview():
+    """Refits and redraws the prediction. Bound to the ledger, so it only runs when the data changed."""
     if not current_user: return
-    for widget in ai_frame.winfo_children(): widget.destroy() # Clear previous content
 
-    ctk.CTkLabel(ai_frame, text="AI Expense Prediction", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+    model = forecast_model.get()
+    if model == DEFAULT_FORECAST_MODEL:
+        # Both predictions come from the background prefetch (or are recomputed there if the ledger changed)
+        future = analytics.submit("forecast", current_user.uname)
+    else:
+        # Other models are fitted on the same worker; fits are cached per user until new expenses are logged
+        future = analytics.submit("forecast", current_user.uname, model)
+    if not future.done():
+        ai_next_month_label.configure(text="Loading prediction...", text_color=TEXT_LIGHT)
+        prediction_img_label.pack_forget()
+        prediction_msg_label.pack_forget()
+    user_model.when_ready("forecast", future, show_ai_overview)
+
+
+def show_ai_overview(future):
+    """Shows the prediction made by a finished "forecast" task."""
+    try:
+        next_month_prediction_message, prediction_result = future.result()
+    except Exception as e:
+        print(f"Prediction error in show_ai_overview: {e}") # Debug print
+        next_month_prediction_message, prediction_result = f"Error predicting expenses: {e}", {"message": f"Prediction failed: {e}"}
 
     # --- Display Next Month's Predicted Amount ---
-    # Call the new function to get the next month's prediction message
-    next_month_prediction_message = predict_next_month_expense(current_user.uname)
     # Determine text color based on message content
     msg_color = ACCENT_GREEN if "📈" in next_month_prediction_message and "Error" not in next_month_prediction_message else ACCENT_RED
+    ai_next_month_label.configure(text=next_month_prediction_message, text_color=msg_color)
 
+    # --- Display Historical and Predicted Cumulative Expense Graph ---
+    plot_path = prediction_result.get("plot_path") or ""
+    message = prediction_result.get("message", "An unknown error occurred.") # Message related to graph generation
+    # Display graph generation error message if plot was not created
+    show_chart_image(prediction_img_label, prediction_msg_label, plot_path, 800, message)
 
-    ctk.CTkLabel(ai_frame, text=next_month_prediction_message, font=("Arial", 16), text_color=msg_color).pack(pady=(0,20), anchor="w")
-
+ai_view.bind(update_ai_overview, user_model.username, user_model.ledger, forecast_model)
 
-    # --- Display Historical and Predicted Cumulative Expense Graph ---
-    ctk.CTkLabel(ai_frame, text="Historical and Predicted Cumulative Expense Trend:", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
 
-    # Call the logic function to generate data and save the plot
-    prediction_result = predict_future_expense_data(current_user.uname)
-    plot_path = prediction_result.get("plot_path")
-    message = prediction_result.get("message", "An unknown error occurred.") # Message related to graph generation
+# --- Export Data View ---
+export_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
+content_frames["Export Data"] = export_frame
+views["Export Data"] = View(export_frame)
 
-    if plot_path and os.path.exists(plot_path):
-        try:
-            # Open the image file using PIL
-            prediction_pil_image = Image.open(plot_path)
-            # Resize if necessary
-            max_width = 800 # Maximum width for the plot image
-            ratio = min(max_width / prediction_pil_image.width, 1.0)
-            new_size = (int(prediction_pil_image.width * ratio), int(prediction_pil_image.height * ratio))
-            prediction_pil_image = prediction_pil_image.resize(new_size, Image.Resampling.BICUBIC)
-
-            # Convert to CustomTkinter compatible image
-            prediction_ctk_image = ImageTk.PhotoImage(prediction_pil_image)
-
-            # Create or update the label
-            if prediction_img_label is None or not prediction_img_label.winfo_exists():
-                 prediction_img_label = ctk.CTkLabel(ai_frame, text="", image=prediction_ctk_image)
-            else:
-                 prediction_img_label.configure(image=prediction_ctk_image)
+ctk.CTkLabel(export_frame, text="Export Transaction Data", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
+ctk.CTkLabel(export_frame, text="Export all your transaction history to a CSV file.", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
 
-            # Keep a reference
-            prediction_img_label.image = prediction_ctk_image
-            prediction_img_label.pack(pady=20)
+def handle_export_data():
+    try:
+        # Call the logic function to export data
+        export_msg = export_user_data(current_user.uname)
+        if "✅" in export_msg:
+             messagebox.showinfo("Export Success", export_msg)
+        else: # Handles messages indicating no data or other errors from logic.py
+             messagebox.showerror("Export Failed", export_msg)
 
-            # Display graph generation message below the graph (if any, e.g., success/error)
-            # We already displayed the next month prediction message above
-            # ctk.CTkLabel(ai_frame, text=message, font=("Arial", 12), text_color=TEXT_LIGHT).pack(pady=(0,10)) # Optional: if you want a second message specific to graph
+    except FileNotFoundError:
+         # This might be caught by logic.py and return a message, but included here for safety
+         messagebox.showerror("Export Error", "Transaction data file not found to export.")
+         print("transactions.csv not found in handle_export_data.") # Debug print
+    except pd.errors.EmptyDataError:
+         messagebox.showerror("Export Error", "No transaction data found to export (file is empty).")
+         print("transactions.csv is empty in handle_export_data.") # Debug print
+    except Exception as e:
+         error_message = f"Could not export data: {e}"
+         messagebox.showerror("Export Error", error_message)
+         print(f"Error exporting data: {e}") # Debug print
 
-        except FileNotFoundError: # Should be caught by logic, but safety
-             ctk.CTkLabel(ai_frame, text="Prediction chart file not found after generation attempt.", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
-        except Exception as img_e:
-            ctk.CTkLabel(ai_frame, text=f"Error displaying prediction chart: {img_e}", font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
-            print(f"Error displaying prediction chart: {img_e}") # Debug print
 
-    else:
-        # Display graph generation error message if plot was not created
-        ctk.CTkLabel(ai_frame, text=message, font=("Arial", 14), text_color=ACCENT_RED).pack(pady=20)
+ctk.CTkButton(export_frame, text="Export My Data", command=handle_export_data, width=200, height=40, fg_color=ACCENT_BLUE, hover_color=ACCENT_GREEN, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
 
+ctk.CTkLabel(export_frame, text="Import a bank statement (CSV with date, amount or debit/credit, and description columns).\nTransactions already in your history are skipped.", font=("Arial", 14), text_color=TEXT_LIGHT, justify="left").pack(pady=(10,10), anchor="w")
 
-# --- Export Data View ---
-export_frame = ctk.CTkFrame(main_content, fg_color=PRIMARY_DARK)
-content_frames["Export Data"] = export_frame
+def handle_import_statement():
+    path = filedialog.askopenfilename(title="Select bank statement", filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+    if not path:
+        return
+    # A large statement takes a while; it is imported on a worker thread (saving user state itself when rows
+    # were imported) and the result is polled from the Tk thread
+    import_button.configure(state="disabled", text="Importing...")
+    finish_import(importer_worker.submit(import_statement, clients, current_user.uname, path))
 
-def update_export_data_view():
-    if not current_user: return
-    for widget in export_frame.winfo_children(): widget.destroy() # Clear previous content
 
-    ctk.CTkLabel(export_frame, text="Export Transaction Data", font=("Arial", 24, "bold"), text_color=TEXT_ACCENT).pack(pady=20, anchor="w")
-    ctk.CTkLabel(export_frame, text="Export all your transaction history to a CSV file.", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(0,10), anchor="w")
+def finish_import(future, poll_ms=100):
+    """Reports a statement import once its worker is done."""
+    if not future.done():
+        app.after(poll_ms, finish_import, future, poll_ms)
+        return
+    import_button.configure(state="normal", text="Import Statement")
+    try:
+        msg = future.result()
+    except Exception as e:
+        print(f"Error importing statement: {e}") # Debug print
+        msg = f"❌ Import failed: {e}"
+    if "✅" in msg:
+        messagebox.showinfo("Import Complete", msg)
+    elif "⚠️" in msg: # Imported, but some expenses were left out
+        messagebox.showwarning("Import Complete", msg)
+    else:
+        messagebox.showerror("Import Failed", msg)
+    refresh_user_model() # Balance, spending and the ledger changed
 
-    def handle_export_data():
-        try:
-            # Call the logic function to export data
-            export_msg = export_user_data(current_user.uname)
-            if "✅" in export_msg:
-                 messagebox.showinfo("Export Success", export_msg)
-            else: # Handles messages indicating no data or other errors from logic.py
-                 messagebox.showerror("Export Failed", export_msg)
-
-        except FileNotFoundError:
-             # This might be caught by logic.py and return a message, but included here for safety
-             messagebox.showerror("Export Error", "Transaction data file not found to export.")
-             print("transactions.csv not found in handle_export_data.") # Debug print
-        except pd.errors.EmptyDataError:
-             messagebox.showerror("Export Error", "No transaction data found to export (file is empty).")
-             print("transactions.csv is empty in handle_export_data.") # Debug print
-        except Exception as e:
-             # Catch the specific pandas parser error and provide a more tailored message
-             if "Error tokenizing data" in str(e) and "saw" in str(e):
-                 error_message = f"Error reading transaction data for export: Inconsistent format found in transactions.csv (e.g., extra commas). Please check or delete the transactions.csv file. Details: {e}"
-             else:
-                 error_message = f"Could not export data: {e}"
+import_button = ctk.CTkButton(export_frame, text="Import Statement", command=handle_import_statement, width=200, height=40, fg_color=ACCENT_BLUE, hover_color=ACCENT_GREEN, font=("Arial", 14, "bold"), corner_radius=10)
+import_button.pack(pady=10, anchor="w")
 
-             messagebox.showerror("Export Error", error_message)
-             print(f"Error exporting data: {e}") # Debug print
+ctk.CTkLabel(export_frame, text="Export the UI responsiveness trace (open it in chrome://tracing or ui.perfetto.dev).", font=("Arial", 14), text_color=TEXT_LIGHT).pack(pady=(10,10), anchor="w")
 
+def handle_export_trace():
+    msg = ui_watchdog.export_trace()
+    if "✅" in msg:
+        messagebox.showinfo("Trace Exported", msg)
+    else:
+        messagebox.showerror("Export Failed", msg)
 
-    ctk.CTkButton(export_frame, text="Export My Data", command=handle_export_data, width=200, height=40, fg_color=ACCENT_BLUE, hover_color=ACCENT_GREEN, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=20, anchor="w")
+ctk.CTkButton(export_frame, text="Export UI Trace", command=handle_export_trace, width=200, height=40, fg_color=ACCENT_PURPLE, hover_color=ACCENT_PINK, font=("Arial", 14, "bold"), corner_radius=10).pack(pady=10, anchor="w")
 
 
 # --- ==================== App Initialization ==================== ---
@@ -1125,9 +1464,11 @@ def handle_logout():
     global current_user
     if current_user:
          # Save the current user's state before logging out
-         save_all_clients(clients)
+         save_clients()
          print(f"Logging out user: {current_user.uname}")
     current_user = None
+    analytics.cancel() # Drop prefetched work for the previous user
+    refresh_user_model() # Clears the username so the next login resets forms and reloads the history
 
     # Hide main content and sidebar
     # switch_view("Login") handles hiding other frames and showing the login view
@@ -1149,18 +1490,7 @@ load_initial_users()    # Load users initially using the new function from logic
 
 # Start the application at the login screen
 switch_view("Login")      # This will show the auth_frame and the login_sub_frame within it
+ui_watchdog.start(app)    # Heartbeat that detects and records main-loop stalls
 
-# Assign update functions to app object (for easy calling in switch_view)
-# This mechanism is correct for calling the specific view update functions
-app.update_dashboard_view = update_dashboard_view
-app.update_income_view = update_income_view
-app.update_expense_view = update_expense_view
-app.update_transfer_view = update_transfer_view
-app.update_loans_view = update_loans_view
-app.update_budget_view = update_budget_view
-app.update_graphs_view = update_graphs_view
-app.update_ai_overview_view = update_ai_overview_view
-app.update_export_data_view = update_export_data_view
-# No specific update needed for login/register frames usually
-
-app.mainloop()
\ No newline at end of file
+app.mainloop()
+analytics.shutdown() # Window closed: stop the prefetch worker
\ No newline at end of file
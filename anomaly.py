@@ -0,0 +1,92 @@
+"""
+Unusual-expense detection with online statistics.
+
+For every (user, category) the count, mean and M2 (sum of squared deviations from the mean) of the expense
+amounts are kept in a RunningStats and updated with Welford's method as expenses are logged, so the check
+costs the same for the thousandth expense as for the first. A new expense is scored against the statistics
+from before it: its z-score is how many standard deviations it lies above the category's mean, and at
+Z_THRESHOLD or more it is flagged. Categories with fewer than MIN_HISTORY expenses, or with no spread, are not
+scored.
+
+group_stats() computes the same state for every group at once from ledger rows (bincount sums, centred on
+each group's mean as in forecasting.least_squares), to initialise the statistics from the ledger in one pass,
+and prefix_zscores() scores every row against the rows before it, as the rows would have been scored when
+logged.
+"""
+import math
+
+import numpy as np
+
+Z_THRESHOLD = 3.0 # Standard deviations above the category mean at which an expense is flagged
+MIN_HISTORY = 5 # Expenses a category needs before new ones are scored
+RECENT_FLAGS = 5 # Flagged expenses kept per user for the dashboard
+RECENT_DAYS = 30 # When loading from the ledger, expenses of the last this many days are checked for flags
+
+
+class RunningStats:
+    """Count, mean and M2 of one (user, category)'s expense amounts (paisa)."""
+    __slots__ = ("count", "mean", "m2")
+
+    def __init__(self, count=0, mean=0.0, m2=0.0):
+        self.count = count
+        self.mean = mean
+        self.m2 = m2
+
+    def add(self, value):
+        """Welford's update."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    @property
+    def std(self):
+        """Sample standard deviation (0 with fewer than 2 values)."""
+        return math.sqrt(self.m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+    def zscore(self, value):
+        """Standard deviations value lies from the mean, or None if there is too little history or no spread."""
+        std = self.std
+        if self.count < MIN_HISTORY or std == 0:
+            return None
+        return (value - self.mean) / std
+
+
+def group_stats(groups, values, n_groups):
+    """
+    Per-group (count, mean, M2) of values; groups are int codes in [0, n_groups). Equal to adding each group's
+    values to a RunningStats one by one, up to floating-point rounding.
+    """
+    count = np.bincount(groups, minlength=n_groups)
+    mean = np.bincount(groups, weights=values, minlength=n_groups) / np.maximum(count, 1)
+    deviation = values - mean[groups]
+    return count, mean, np.bincount(groups, weights=deviation * deviation, minlength=n_groups)
+
+
+def prefix_zscores(groups, values):
+    """
+    z-score of every value against the statistics of the values before it in its group, as if the values were
+    added to RunningStats one by one in order and each scored first; NaN where it would not be scored. The
+    running sums are taken on values shifted by each group's first value, so equal amounts have exactly no spread.
+    """
+    n = len(values)
+    if n == 0:
+        return np.empty(0)
+    order = np.argsort(groups, kind="stable")
+    sorted_groups = groups[order]
+    position = np.arange(n)
+    start = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]])
+    first = np.repeat(start, np.diff(np.r_[start, n])) # Position of each value's group start
+    shifted = values[order] - values[order][first]
+    sums = np.r_[0.0, np.cumsum(shifted)[:-1]] # Sums of the values before each position
+    squares = np.r_[0.0, np.cumsum(shifted * shifted)[:-1]]
+    count = position - first # Values before each one in its group
+    with np.errstate(divide="ignore", invalid="ignore"):
+        total, total_squares = sums - sums[first], squares - squares[first]
+        mean = total / count
+        std = np.sqrt(np.maximum(total_squares - total * mean, 0.0) / (count - 1))
+        scored = (count >= MIN_HISTORY) & (std > 0)
+        z = np.where(scored, (shifted - mean) / std, np.nan)
+    result = np.empty(n)
+    result[order] = z
+    return result
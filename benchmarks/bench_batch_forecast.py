@@ -0,0 +1,85 @@
+"""
+Benchmark for the all-users expense forecast (forecasting.py).
+
+Builds a ledger for U users (default 2,000) with a few hundred rows each in a temporary directory, then times:
+  - calling predict_next_month_expense once per user (one LinearRegression fit per user),
+  - predict_next_month_expense_all (one grouped pass and one vectorised least-squares solve),
+and checks that every slope and intercept matches a per-user LinearRegression fit to floating tolerance and
+every prediction matches the single-user message to the paisa.
+
+Usage: python benchmarks/bench_batch_forecast.py [users] [rows_per_user]
+"""
+import os
+import re
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import kernels  # noqa: E402
+import ledger  # noqa: E402
+import logic  # noqa: E402
+
+
+def build_ledger(users, rows_per_user, seed=0):
+    rng = np.random.default_rng(seed)
+    n = users * rows_per_user
+    end = ledger.to_epoch(datetime.now().replace(day=1))
+    pd.DataFrame({
+        "username": np.char.add("user", rng.integers(0, users, n).astype(str)),
+        "timestamp_utc": np.sort(rng.integers(end - 365 * 86_400, end, n)),
+        "amount_paisa": rng.integers(100, 500_000, n),
+        "type": rng.choice(["Expense", "Recurring Expense", "Income", "Transfer Out"], n),
+        "category": rng.choice(["Food", "Rent", "Fuel"], n),
+    }).to_csv(ledger.LEGACY_FILE, index=False)
+    ledger.ensure()
+
+
+def sklearn_fit(username):
+    _seconds, days, cumulative = kernels.expense_series(logic.user_arrays(username))
+    model = LinearRegression().fit(days.reshape(-1, 1), cumulative)
+    return model.coef_[0], model.intercept_
+
+
+def main():
+    users = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000
+    rows_per_user = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        build_ledger(users, rows_per_user)
+        names = sorted(logic.read_ledger()["username"].unique())
+        print(f"Users: {len(names):,}  ledger rows: {len(logic.read_ledger()):,}")
+
+        start = time.perf_counter()
+        messages = {name: logic.predict_next_month_expense(name) for name in names}
+        print(f"{'one fit per user':<18} {(time.perf_counter() - start) * 1000:9.0f} ms")
+
+        start = time.perf_counter()
+        table = logic.predict_next_month_expense_all()
+        print(f"{'batched solve':<18} {(time.perf_counter() - start) * 1000:9.0f} ms")
+
+        slope_error = intercept_error = 0.0
+        mismatches = 0
+        for name in names:
+            row = table.loc[name]
+            match = re.search(r"PKR (-?[\d.]+)", messages[name])
+            if row["status"] != "ok":
+                mismatches += match is not None
+                continue
+            mismatches += match is None or abs(round(float(match.group(1)) * 100) - row["predicted"]) > 0
+            slope, intercept = sklearn_fit(name)
+            slope_error = max(slope_error, abs(row["slope"] - slope) / max(abs(slope), 1))
+            intercept_error = max(intercept_error, abs(row["intercept"] - intercept) / max(abs(intercept), 1))
+        print(f"Max relative difference from LinearRegression: slope {slope_error:.1e}, intercept {intercept_error:.1e}")
+        print(f"Predictions differing from predict_next_month_expense: {mismatches}")
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Benchmark for paying many accounts (payroll).
+
+Creates N accounts plus an employer account in users.db, in a temporary directory, and times paying K of them:
+  - one at a time, the way the GUI does it: find_client_by_username, Client.transfer, save_all_clients,
+  - with bulk_transfer: one validation pass, one ledger append and one save for the whole batch.
+Also shows that a batch with a bad item is rejected as a whole, with per-item reasons.
+
+Usage: python benchmarks/bench_bulk_transfer.py [accounts] [payees]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import logic  # noqa: E402
+
+
+def setup(n):
+    clients = [logic.StandardAccount(f"user{i}", "pw", 1000 * 100) for i in range(n)]
+    clients.append(logic.StandardAccount("employer", "pw", 10**12))
+    logic.save_all_clients(clients)
+    return logic.load_all_clients()
+
+
+def one_at_a_time(clients, payroll):
+    for sender_name, receiver_name, amount in payroll:
+        sender = logic.find_client_by_username(clients, sender_name)
+        receiver = logic.find_client_by_username(clients, receiver_name)
+        sender.transfer(receiver, amount)
+        logic.save_all_clients(clients)
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    payees = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    payroll = [("employer", f"user{i}", 50_000 + i) for i in range(0, n, max(1, n // payees))][:payees]
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        with contextlib.redirect_stdout(io.StringIO()):
+            logic.ensure_ledger()
+            clients = setup(n)
+        print(f"Accounts: {n:,}  payees: {len(payroll):,}")
+
+        start = time.perf_counter()
+        one_at_a_time(clients, payroll)
+        print(f"{'one at a time':<14} {(time.perf_counter() - start) * 1000:9.1f} ms")
+
+        start = time.perf_counter()
+        message, failures = logic.bulk_transfer(clients, payroll)
+        print(f"{'bulk_transfer':<14} {(time.perf_counter() - start) * 1000:9.1f} ms  {message}")
+
+        bad = payroll[:3] + [("employer", "nobody", 100), ("user1", "user2", 10**12)]
+        message, failures = logic.bulk_transfer(clients, bad)
+        print(message)
+        for index, reason in failures:
+            print(f"  item {index}: {reason}")
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
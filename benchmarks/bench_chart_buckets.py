@@ -0,0 +1,69 @@
+"""
+Benchmark for the chart bucket pyramid (buckets.py).
+
+For one user's history of N rows (default 10,000, 100,000 and 1,000,000 over ten years), times:
+  - computing the trend points from the raw rows (mask the range, then bucket and sum, as kernels.py does),
+  - looking them up in a BucketPyramid built once from the rows,
+for the whole history and for the last 30 days, plus the cost of adding one logged row to the pyramid. It
+checks that both give the same totals.
+
+Usage: python benchmarks/bench_chart_buckets.py [rows ...]
+"""
+import os
+import sys
+import time
+from datetime import datetime
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import buckets  # noqa: E402
+import kernels  # noqa: E402
+
+
+def build_arrays(n, seed=0):
+    rng = np.random.default_rng(seed)
+    end = int(np.datetime64(datetime.now(), "s").astype(np.int64))
+    seconds = np.sort(rng.integers(end - 3650 * kernels.SECONDS_PER_DAY, end, n))
+    return kernels.LedgerArrays(seconds, rng.integers(100, 500_000, n), rng.integers(0, len(kernels.TYPES), n).astype(np.int8),
+                                np.zeros(n, dtype=np.int32), ("General",))
+
+
+def raw_points(arrays, first_second, last_second):
+    """Trend points straight from the rows: bucket every row, keep the buckets in the range, sum per bucket."""
+    resolution = buckets.choose_resolution(first_second, last_second)
+    first, last = buckets.bucket_indexes(resolution, np.array([first_second, last_second]))
+    indexes = buckets.bucket_indexes(resolution, arrays.seconds)
+    in_range = arrays.valid_time & (indexes >= first) & (indexes <= last)
+    totals = np.bincount(indexes[in_range] - first, weights=kernels.signed_amounts(arrays)[in_range], minlength=last - first + 1)
+    return np.rint(totals).astype(np.int64)
+
+
+def timed(function, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+    print(f"{'rows':>10} {'range':>8} {'points':>7} {'raw ms':>9} {'pyramid ms':>11}")
+    for n in sizes:
+        arrays = build_arrays(n)
+        pyramid = buckets.BucketPyramid.from_arrays(arrays)
+        last = pyramid.last_second
+        for label, first in (("all", pyramid.first_second), ("30 days", last - 29 * kernels.SECONDS_PER_DAY)):
+            resolution = buckets.choose_resolution(first, last)
+            raw_ms, raw = timed(lambda: raw_points(arrays, first, last), 5)
+            pyramid_ms, (_starts, net, _expense) = timed(lambda: pyramid.series(resolution, first, last), 50)
+            assert np.array_equal(raw, net), "pyramid totals differ from the raw rows"
+            print(f"{n:>10,} {label:>8} {len(net):>7} {raw_ms:>9.2f} {pyramid_ms:>11.3f}")
+        row = [("user", datetime.now(), 1_000, "Expense", "General")]
+        add_ms, _ = timed(lambda: pyramid.add_rows(row), 200)
+        print(f"{'':>10} adding one logged row: {add_ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Benchmark for downsampling long chart series (kernels.lttb).
+
+Builds a ledger with one user holding N expenses (default 10,000, 50,000 and 200,000) in a temporary directory,
+then times predict_future_expense_data drawing every historical point against drawing at most CHART_POINTS
+points chosen by largest-triangle-three-buckets, and the downsampling step on its own.
+
+Usage: python benchmarks/bench_chart_downsampling.py [expenses ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import kernels  # noqa: E402
+import ledger  # noqa: E402
+import logic  # noqa: E402
+
+
+def build_ledger(n, seed=0):
+    rng = np.random.default_rng(seed)
+    end = ledger.to_epoch(datetime.now().replace(day=1))
+    pd.DataFrame({
+        "username": "user",
+        "timestamp_utc": np.sort(rng.integers(end - 3650 * 86_400, end, n)),
+        "amount_paisa": rng.integers(100, 500_000, n),
+        "type": "Expense",
+        "category": rng.choice(["Food", "Rent", "Fuel"], n),
+    }).to_csv(ledger.LEGACY_FILE, index=False)
+    ledger.ensure()
+
+
+def timed_plot(max_points):
+    start = time.perf_counter()
+    result = logic.predict_future_expense_data("user", max_points=max_points)
+    assert "plot_path" in result, result["message"]
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10_000, 50_000, 200_000]
+    print(f"{'expenses':>10} {'all points ms':>14} {'LTTB ms':>9} {'lttb() ms':>10}")
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            os.chdir(tmp)
+            build_ledger(n)
+            timed_plot(None) # Warm the ledger cache and the cached model fit
+            full_ms = timed_plot(n)
+            downsampled_ms = timed_plot(None)
+            _seconds, days, cumulative = kernels.expense_series(logic.user_arrays("user"))
+            start = time.perf_counter()
+            kernels.lttb(days, cumulative, logic.CHART_POINTS)
+            lttb_ms = (time.perf_counter() - start) * 1000
+            print(f"{n:>10,} {full_ms:>14.0f} {downsampled_ms:>9.0f} {lttb_ms:>10.2f}")
+            os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Memory benchmark for the Client representations.
+
+Compares, for N synthetic accounts:
+  - plain __dict__ objects holding a recurring list (the old layout),
+  - slotted StandardAccount objects,
+  - a ClientTable (NumPy columns + lightweight views).
+
+Usage: python benchmarks/bench_client_memory.py [N]
+"""
+import os
+import sys
+import tracemalloc
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from logic import StandardAccount, ClientTable  # noqa: E402
+
+
+class DictClient:
+    """Stand-in for the previous Client layout: a regular object with a __dict__."""
+
+    def __init__(self, username, password, amount):
+        self.uname = username.lower()
+        self.password = str(password)
+        self.amount = amount
+        self.total_spent = 0
+        self.budget = 0
+        self.loans = 0
+        self.recurring = []
+
+
+def build_dict_clients(n):
+    clients = []
+    for i in range(n):
+        client = DictClient(f"user{i}", "pw", float(i))
+        client.budget = 5000.0 + i
+        client.total_spent = i * 0.5
+        if i % 10 == 0:
+            client.recurring.append((500.0, "Rent", 30, datetime(2024, 1, 1)))
+        clients.append(client)
+    return clients
+
+
+def build_slotted_clients(n):
+    clients = []
+    for i in range(n):
+        # Amounts are integer paisa
+        client = StandardAccount(f"user{i}", "pw", i * 100)
+        client.budget = (5000 + i) * 100
+        client.total_spent = i * 50
+        if i % 10 == 0:
+            client.recurring = ((50000, "Rent", 30, datetime(2024, 1, 1)),)
+        clients.append(client)
+    return clients
+
+
+def build_table(n):
+    return ClientTable.from_clients(build_slotted_clients(n))
+
+
+def measure(builder, n):
+    """Returns the bytes still allocated after building the structure (the structure is kept alive)."""
+    tracemalloc.start()
+    result = builder(n)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    print(f"Accounts: {n:,}")
+    baseline = None
+    for label, builder in (("dict objects", build_dict_clients),
+                           ("slotted objects", build_slotted_clients),
+                           ("ClientTable", build_table)):
+        size = measure(builder, n)
+        baseline = baseline or size
+        print(f"{label:<16} {size / 1e6:8.1f} MB  {size / n:6.0f} B/account  ({size / baseline:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
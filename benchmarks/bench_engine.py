@@ -0,0 +1,115 @@
+"""
+Benchmark for the ledger query engines (engine.py).
+
+Builds a multi-user ledger of N rows (default 2,000,000) over two years in a temporary directory, then, for
+every available engine in its own process, times reading one user's rows (engine.user_arrays) for the whole
+ledger and for one month, runs the report / monthly roll-up / category / forecast-input queries on them, and
+reports the peak memory of the process. pandas parses the whole ledger; Polars and pyarrow push the username
+and date predicates into the scan. A second table times what the app reads after a login (the user's history,
+chart buckets, rolling spend and expense statistics through logic.py), again with the peak memory.
+
+Usage: python benchmarks/bench_engine.py [rows] [users]
+"""
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import buckets  # noqa: E402
+import engine  # noqa: E402
+import kernels  # noqa: E402
+import ledger  # noqa: E402
+import logic  # noqa: E402
+
+
+def build_ledger(n, users, seed=0):
+    """Writes a version 3 transactions.csv and lets ledger.ensure() split it into monthly segments."""
+    rng = np.random.default_rng(seed)
+    end = ledger.to_epoch(datetime.now().replace(day=1))
+    pd.DataFrame({
+        "username": np.char.add("user", rng.integers(0, users, n).astype(str)),
+        "timestamp_utc": np.sort(rng.integers(end - 730 * 86_400, end, n)),
+        "amount_paisa": rng.integers(100, 1_000_000, n),
+        "type": rng.choice(list(kernels.TYPES), n),
+        "category": rng.choice(["Food", "Rent", "Fuel", "Bills", "Fun", "General"], n),
+    }).to_csv(ledger.LEGACY_FILE, index=False)
+    ledger.ensure()
+
+
+def queries(rows):
+    """The aggregations behind the report, the charts and the forecasts."""
+    kernels.masked_sum(rows.amounts, kernels.type_mask(rows.types, kernels.INFLOW_TYPES))
+    kernels.category_totals(rows, kernels.type_mask(rows.types, kernels.EXPENSE_TYPES))
+    pyramid = buckets.BucketPyramid.from_arrays(rows)
+    if pyramid.first_second is not None:
+        pyramid.series("month", pyramid.first_second, pyramid.last_second)
+    kernels.expense_series(rows)
+
+
+def peak_memory_mb():
+    """Peak resident memory of this process. ru_maxrss is kept across exec on Linux, so VmHWM is preferred."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_engine(name):
+    """Child process: times one engine and prints its results on one line."""
+    month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    month = (datetime(month_start.year - 1, month_start.month, 1), datetime(month_start.year - 1, month_start.month, 28))
+    timings = []
+    for start, end in ((None, None), month):
+        t0 = time.perf_counter()
+        rows = engine.user_arrays("user1", start, end, engine=name)
+        queries(rows)
+        timings.append((time.perf_counter() - t0) * 1000)
+    peak_mb = peak_memory_mb()
+    print(f"{name:<8} {timings[0]:>12.0f} {timings[1]:>12.0f} {peak_mb:>12.0f}")
+
+
+def run_login(name):
+    """Child process: times the ledger reads behind a GUI login with one engine."""
+    logic.LEDGER_ENGINE = name
+    t0 = time.perf_counter()
+    logic.user_transactions("user1")
+    logic.user_buckets("user1")
+    logic.rolling_spend("user1")
+    logic.expense_anomalies("user1")
+    print(f"{name:<8} {(time.perf_counter() - t0) * 1000:>12.0f} {peak_memory_mb():>12.0f}")
+
+
+def main():
+    if len(sys.argv) > 2 and sys.argv[1] in ("--engine", "--login"):
+        (run_engine if sys.argv[1] == "--engine" else run_login)(sys.argv[2])
+        return
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        start = time.perf_counter()
+        build_ledger(n, users)
+        print(f"Ledger: {n:,} rows, {users:,} users, built in {time.perf_counter() - start:.1f} s")
+        print(f"{'engine':<8} {'all rows ms':>12} {'one month ms':>12} {'peak RSS MB':>12}")
+        for name in engine.available_engines():
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--engine", name], check=True)
+        print(f"{'engine':<8} {'login ms':>12} {'peak RSS MB':>12}")
+        for name in engine.available_engines():
+            subprocess.run([sys.executable, os.path.abspath(__file__), "--login", name], check=True)
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
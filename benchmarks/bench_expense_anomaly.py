@@ -0,0 +1,85 @@
+"""
+Benchmark for the unusual-expense statistics (anomaly.py).
+
+Builds a ledger of N rows (default 1,000,000) for U users (default 1,000) in a temporary directory, then times:
+  - initialising every (user, category)'s statistics from the ledger with group_stats (one vectorised pass),
+  - the same with Welford's update applied row by row,
+  - scoring one expense against the loaded statistics (score_expense),
+  - logging one expense (ledger append plus the statistics update),
+and reports the largest relative difference between the two initialisations.
+
+Usage: python benchmarks/bench_expense_anomaly.py [rows] [users]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import anomaly  # noqa: E402
+import kernels  # noqa: E402
+import ledger  # noqa: E402
+import logic  # noqa: E402
+
+
+def build_ledger(n, users, seed=0):
+    rng = np.random.default_rng(seed)
+    end = ledger.to_epoch(datetime.now())
+    pd.DataFrame({
+        "username": np.char.add("user", rng.integers(0, users, n).astype(str)),
+        "timestamp_utc": np.sort(rng.integers(end - 3 * 365 * 86_400, end, n)),
+        "amount_paisa": rng.lognormal(12, 0.5, n).astype(np.int64),
+        "type": rng.choice(["Expense", "Recurring Expense", "Income"], n),
+        "category": rng.choice(["Food", "Rent", "Fuel", "Bills", "Fun"], n),
+    }).to_csv(ledger.LEGACY_FILE, index=False)
+    ledger.ensure()
+
+
+def row_by_row(df):
+    stats = {}
+    for uname, category, amount in zip(df["username"].tolist(), df["category"].tolist(), df["amount"].tolist()):
+        running = stats.get((uname, category))
+        if running is None:
+            running = stats[(uname, category)] = anomaly.RunningStats()
+        running.add(amount)
+    return stats
+
+
+def timed(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        build_ledger(n, users)
+        df = logic.read_ledger() # Parsed once, so the timings below cover the statistics only
+        print(f"Ledger: {n:,} rows, {users:,} users")
+        with logic._ledger_lock:
+            batch_ms, _ = timed(logic._load_expense_stats)
+        print(f"{'vectorised initialisation':<36} {batch_ms:>9.0f} ms")
+        loop_ms, expected = timed(lambda: row_by_row(df[df["type"].isin(kernels.EXPENSE_TYPES)]))
+        print(f"{'Welford row by row':<36} {loop_ms:>9.0f} ms")
+        loaded = logic._expense_stats["stats"]
+        mean_error = max(abs(loaded[key].mean - stats.mean) / stats.mean for key, stats in expected.items())
+        m2_error = max(abs(loaded[key].m2 - stats.m2) / stats.m2 for key, stats in expected.items())
+        print(f"Max relative difference: mean {mean_error:.1e}, M2 {m2_error:.1e}")
+        score_ms, _ = timed(lambda: logic.score_expense("user1", "Food", 500_000), 1_000)
+        print(f"{'score one expense':<36} {score_ms:>9.3f} ms")
+        log_ms, _ = timed(lambda: logic.append_to_ledger([("user1", datetime.now(), 500_000, "Expense", "Food")]), 100)
+        print(f"{'log one expense (append + update)':<36} {log_ms:>9.2f} ms")
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Benchmark for the NumPy aggregation kernel (kernels.py) against the pandas code it replaced.
+
+For one user's rows at several sizes, times the aggregations behind the report (inflow/outflow sums and the
+expense breakdown by category), the monthly net-flow chart and the forecast inputs (sorted expenses, days since
+the first one, cumulative sum):
+  - pandas: boolean masks, isin, groupby, resample and cumsum on the user's DataFrame,
+  - kernel: the same results from the user's cached typed arrays,
+and separately the one-off conversion of the frame to those arrays. Plotting and model fitting are not timed.
+
+Usage: python benchmarks/bench_kernels.py [sizes...]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import buckets  # noqa: E402
+import kernels  # noqa: E402
+
+MONTH_END = "ME" if tuple(int(p) for p in pd.__version__.split(".")[:2]) >= (2, 2) else "M"
+
+
+def make_frame(n, seed=0):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "username": "alice",
+        "timestamp": pd.Timestamp("2024-01-01") + pd.to_timedelta(np.sort(rng.integers(0, 400 * 86_400, n)), unit="s"),
+        "amount": rng.integers(100, 1_000_000, n),
+        "type": rng.choice(list(kernels.TYPES), n),
+        "category": rng.choice(["Food", "Rent", "Fuel", "Bills", "Fun", "General"], n),
+    })
+
+
+def pandas_path(df):
+    income = df[df["type"].isin(kernels.INFLOW_TYPES)]["amount"].sum()
+    expense = df[df["type"].isin(kernels.OUTFLOW_TYPES)]["amount"].sum()
+    expense_data = df[df["type"].isin(kernels.EXPENSE_TYPES)].copy()
+    breakdown = expense_data.groupby("category")["amount"].sum().sort_values(ascending=False)
+
+    flow = df.dropna(subset=["timestamp"]).copy()
+    flow.loc[flow["type"].isin(kernels.OUTFLOW_TYPES), "amount"] *= -1
+    monthly = flow.resample(MONTH_END, on="timestamp")["amount"].sum().sort_index()
+
+    # A stable sort, as in the kernel; the original quicksort may order rows with equal timestamps either way
+    expenses = expense_data.dropna(subset=["timestamp"]).sort_values("timestamp", kind="stable")
+    days = (expenses["timestamp"] - expenses["timestamp"].iloc[0]).dt.days.values
+    cumulative = expenses["amount"].cumsum().values
+    return income, expense, breakdown, monthly, days, cumulative
+
+
+def kernel_path(rows):
+    income = kernels.masked_sum(rows.amounts, kernels.type_mask(rows.types, kernels.INFLOW_TYPES))
+    expense = kernels.masked_sum(rows.amounts, kernels.type_mask(rows.types, kernels.OUTFLOW_TYPES))
+    breakdown = kernels.category_totals(rows, kernels.type_mask(rows.types, kernels.EXPENSE_TYPES))
+
+    pyramid = buckets.BucketPyramid.from_arrays(rows) # Monthly net flow, as the charts get it
+    monthly = pyramid.series("month", pyramid.first_second, pyramid.last_second)[:2]
+
+    _seconds, days, cumulative = kernels.expense_series(rows)
+    return income, expense, breakdown, monthly, days, cumulative
+
+
+def convert(df):
+    # As logic.user_arrays does it
+    type_codes, type_names = pd.factorize(df["type"])
+    category_codes, category_names = pd.factorize(df["category"], sort=True)
+    return kernels.from_columns(df["timestamp"].to_numpy(), df["amount"].to_numpy(),
+                                type_codes, type_names, category_codes, category_names)
+
+
+def best_ms(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1000
+
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [50, 500, 5_000, 50_000]
+    print(f"{'rows':>8} {'pandas ms':>10} {'kernel ms':>10} {'speed-up':>9} {'convert ms':>11}")
+    for n in sizes:
+        df = make_frame(n)
+        rows = convert(df)
+        # Same results on both paths
+        p_income, p_expense, p_breakdown, p_monthly, p_days, p_cumulative = pandas_path(df)
+        k_income, k_expense, (names, totals), (_months, monthly), days, cumulative = kernel_path(rows)
+        assert (p_income, p_expense) == (k_income, k_expense)
+        assert dict(p_breakdown) == dict(zip(names, totals.tolist()))
+        assert np.array_equal(p_monthly.to_numpy(), monthly) and np.array_equal(p_days, days)
+        assert np.array_equal(p_cumulative, cumulative)
+
+        number = max(1, 20_000 // n)
+        pandas_ms = best_ms(lambda: pandas_path(df), number)
+        kernel_ms = best_ms(lambda: kernel_path(rows), number)
+        convert_ms = best_ms(lambda: convert(df), number)
+        print(f"{n:>8,} {pandas_ms:>10.3f} {kernel_ms:>10.3f} {pandas_ms / kernel_ms:>8.1f}x {convert_ms:>11.3f}")
+
+
+if __name__ == "__main__":
+    main()
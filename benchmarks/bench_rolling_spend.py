@@ -0,0 +1,82 @@
+"""
+Benchmark for the rolling-window spend figures (rolling.py, logic.rolling_spend).
+
+Builds a ledger of N rows (default 1,000,000) over three years for U users (default 1,000) in a temporary
+directory, then times:
+  - rebuilding every user's buffers from the last 90 days of the ledger (one bounded read and one bincount),
+  - reading one user's last 7/30/90-day spend from the buffers,
+  - computing the same figures by filtering the user's full ledger rows,
+  - logging one expense (ledger append plus the buffer update),
+and checks that the buffers agree with the full scan.
+
+Usage: python benchmarks/bench_rolling_spend.py [rows] [users]
+"""
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import kernels  # noqa: E402
+import ledger  # noqa: E402
+import logic  # noqa: E402
+import rolling  # noqa: E402
+
+
+def build_ledger(n, users, seed=0):
+    rng = np.random.default_rng(seed)
+    end = ledger.to_epoch(datetime.now())
+    pd.DataFrame({
+        "username": np.char.add("user", rng.integers(0, users, n).astype(str)),
+        "timestamp_utc": np.sort(rng.integers(end - 3 * 365 * 86_400, end, n)),
+        "amount_paisa": rng.integers(100, 500_000, n),
+        "type": rng.choice(["Expense", "Recurring Expense", "Income", "Transfer Out"], n),
+        "category": rng.choice(["Food", "Rent", "Fuel"], n),
+    }).to_csv(ledger.LEGACY_FILE, index=False)
+    ledger.ensure()
+
+
+def scan_spend(username):
+    """The same figures from the user's full ledger rows."""
+    rows = logic.user_arrays(username)
+    mask = kernels.type_mask(rows.types, kernels.EXPENSE_TYPES) & rows.valid_time
+    days = rolling.day_number(rows.seconds[mask])
+    today = logic._today()
+    return {window: int(rows.amounts[mask][(days > today - window) & (days <= today)].sum()) for window in rolling.WINDOWS}
+
+
+def timed(function, repeat=1):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = function()
+    return (time.perf_counter() - start) / repeat * 1000, result
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 1_000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        build_ledger(n, users)
+        print(f"Ledger: {n:,} rows, {users:,} users")
+        rebuild_ms, _ = timed(lambda: logic.rolling_spend("user1"))
+        print(f"{'rebuild all users (last 90 days read)':<40} {rebuild_ms:>9.1f} ms")
+        query_ms, spend = timed(lambda: logic.rolling_spend("user1"), 1_000)
+        print(f"{'rolling_spend from the buffers':<40} {query_ms:>9.3f} ms")
+        logic.read_ledger() # Parse the full ledger once so the scan below is timed on cached rows
+        scan_ms, scanned = timed(lambda: scan_spend("user1"))
+        print(f"{'same figures from the full ledger':<40} {scan_ms:>9.1f} ms (first read of the user's rows)")
+        assert all(spend[window] == scanned[window] for window in rolling.WINDOWS), (spend, scanned)
+        log_ms, _ = timed(lambda: logic.append_to_ledger([("user1", datetime.now(), 1_000, "Expense", "Food")]), 100)
+        assert logic.rolling_spend("user1")[7] == scanned[7] + 100 * 1_000
+        print(f"{'log one expense (append + update)':<40} {log_ms:>9.2f} ms")
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark for the bank-statement importer.
+
+Writes a synthetic statement of N rows (date, description, signed amount with thousands separators) into a
+temporary directory and times:
+  - the first import (parse, hash, one ledger append per chunk into each month's segment, balance update),
+  - importing the same statement again (every row is a duplicate),
+  - importing an overlapping statement after a GUI-style append, which hashes only the new tail of the open
+    segment.
+
+Usage: python benchmarks/bench_statement_import.py [N]
+"""
+import contextlib
+import io
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import importer  # noqa: E402
+import logic  # noqa: E402
+
+
+def write_statement(path, n, seed=0):
+    rng = np.random.default_rng(seed)
+    dates = pd.Timestamp("2025-01-01") + pd.to_timedelta(rng.integers(0, 365 * 24 * 3600, n), unit="s")
+    amounts = rng.integers(-500_000, 500_000, n) / 100
+    pd.DataFrame({"Date": dates.strftime("%Y-%m-%d %H:%M:%S"),
+                  "Description": rng.choice(["Coffee", "Salary", "Rent", "Fuel", "Groceries"], n),
+                  "Amount": [f"{amount:,.2f}" for amount in amounts]}).to_csv(path, index=False)
+
+
+def timed(label, func):
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        msg = func()
+    print(f"{label:<20} {(time.perf_counter() - start) * 1000:9.1f} ms  {msg}")
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        write_statement("statement.csv", n)
+        pd.read_csv("statement.csv", dtype=str).head(n // 10).to_csv("overlap.csv", index=False)
+        print(f"Statement rows: {n:,}  ({os.path.getsize('statement.csv') / 1e6:.1f} MB)")
+        clients = []
+        with contextlib.redirect_stdout(io.StringIO()):
+            logic.create_client(clients, "alice", "pw", 100_000_000) # Enough that no imported expense is refused
+        timed("first import", lambda: importer.import_statement(clients, "alice", "statement.csv"))
+        timed("re-import", lambda: importer.import_statement(clients, "alice", "statement.csv"))
+        with contextlib.redirect_stdout(io.StringIO()):
+            clients[0].add_income(100)
+        timed("overlap after append", lambda: importer.import_statement(clients, "alice", "overlap.csv"))
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+
+
+if __name__ == "__main__":
+    main()
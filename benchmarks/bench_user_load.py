@@ -0,0 +1,79 @@
+"""
+Startup benchmark for loading users.txt.
+
+Writes a synthetic users.txt with N accounts (10% with recurring items) into a temporary directory and times:
+  - the previous row-by-row csv.reader + float() + strptime parser,
+  - ClientTable.from_users_file (column-wise parse, no per-account objects, recurring decoded lazily),
+  - import_users_txt (column-wise parse plus writing the users.db snapshot),
+  - load_all_clients and ClientTable.from_snapshot reading that snapshot,
+  - a plain read of the file, as the I/O floor.
+
+Usage: python benchmarks/bench_user_load.py [N]
+"""
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import logic  # noqa: E402
+
+
+def write_users(path, n):
+    with open(path, "w", newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(logic.USER_COLUMNS)
+        for i in range(n):
+            recurring = "500.0|Rent|30|2024-01-01 09:00:00;25.5|Gym|7|2024-02-01 09:00:00" if i % 10 == 0 else ""
+            writer.writerow([f"user{i}", f"pw{i}", 1000.0 + i, 5000.0, i * 0.25, 0.0, recurring])
+
+
+def row_by_row(path):
+    """The previous loader's parsing work (without building Client objects)."""
+    rows = []
+    with open(path, "r") as f:
+        reader = csv.reader(f)
+        next(reader)
+        for row in reader:
+            uname, pw, amount, budget, total_spent, loans, recurring_str = row
+            recurring = []
+            if recurring_str:
+                for item_str in recurring_str.split(";"):
+                    parts = item_str.split("|")
+                    recurring.append((float(parts[0]), parts[1], int(parts[2]),
+                                      datetime.strptime(parts[3], '%Y-%m-%d %H:%M:%S')))
+            rows.append((uname, pw, float(amount), float(budget), float(total_spent), float(loans), recurring))
+    return rows
+
+
+def read_only(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def timed(func):
+    start = time.perf_counter()
+    func()
+    return time.perf_counter() - start
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        write_users("users.txt", n)
+        print(f"Accounts: {n:,}  ({os.path.getsize('users.txt') / 1e6:.1f} MB)")
+        for label, func in (("raw file read", lambda: read_only("users.txt")),
+                            ("row-by-row parse", lambda: row_by_row("users.txt")),
+                            ("ClientTable (txt)", logic.ClientTable.from_users_file),
+                            ("import_users_txt", logic.import_users_txt),
+                            ("load_all_clients", logic.load_all_clients),
+                            ("ClientTable (db)", logic.ClientTable.from_snapshot)):
+            print(f"{label:<18} {timed(func) * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""
+Load test for server.py.
+
+Starts the API server in a temporary directory on a free port, registers U users and logs them in, then runs C
+concurrent keep-alive connections for D seconds. Each connection sends a mix of income, expense and balance
+requests for one of the users. Reports requests per second, p50/p95/p99/max latency, and how many requests the
+server's single writer committed per batch (GET /stats).
+
+Usage: python benchmarks/load_test_server.py [connections] [seconds] [users]
+"""
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+SERVER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "server.py")
+
+
+class Connection:
+    """One keep-alive HTTP/1.1 connection to the server."""
+
+    def __init__(self, reader, writer):
+        self.reader, self.writer = reader, writer
+
+    @classmethod
+    async def open(cls, port):
+        return cls(*await asyncio.open_connection("127.0.0.1", port))
+
+    async def request(self, method, path, body=None, token=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        headers = f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Length: {len(data)}\r\n"
+        if token:
+            headers += f"Authorization: Bearer {token}\r\n"
+        self.writer.write((headers + "\r\n").encode() + data)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while (line := await self.reader.readline()) not in (b"\r\n", b""):
+            name, _, value = line.decode().partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, json.loads(await self.reader.readexactly(length))
+
+    def close(self):
+        self.writer.close()
+
+
+async def wait_for_server(port, process, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("Server exited during startup")
+        try:
+            return await Connection.open(port)
+        except OSError:
+            await asyncio.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+async def worker(port, token, deadline, latencies, errors, rng):
+    conn = await Connection.open(port)
+    try:
+        while time.monotonic() < deadline:
+            choice = rng.random()
+            if choice < 0.4:
+                args = ("POST", "/income", {"amount": f"{rng.randint(1, 500)}.{rng.randint(0, 99):02d}"})
+            elif choice < 0.8:
+                args = ("POST", "/expense", {"amount": str(rng.randint(1, 100)), "category": rng.choice(["Food", "Fuel", "Rent"])})
+            else:
+                args = ("GET", "/balance", None)
+            start = time.perf_counter()
+            status, _payload = await conn.request(*args, token=token)
+            latencies.append(time.perf_counter() - start)
+            if status >= 500:
+                errors.append(status)
+    finally:
+        conn.close()
+
+
+async def run(port, process, connections, seconds, users):
+    admin = await wait_for_server(port, process)
+    tokens = []
+    for i in range(users):
+        await admin.request("POST", "/register", {"username": f"user{i}", "password": "pw", "amount": "100000"})
+        status, payload = await admin.request("POST", "/login", {"username": f"user{i}", "password": "pw"})
+        assert status == 200, payload
+        tokens.append(payload["token"])
+
+    latencies, errors = [], []
+    deadline = time.monotonic() + seconds
+    start = time.perf_counter()
+    await asyncio.gather(*(worker(port, tokens[i % users], deadline, latencies, errors, random.Random(i))
+                           for i in range(connections)))
+    elapsed = time.perf_counter() - start
+
+    _status, stats = await admin.request("GET", "/stats")
+    admin.close()
+    ms = np.array(latencies) * 1000
+    print(f"Connections: {connections}  users: {users}  duration: {elapsed:.1f} s")
+    print(f"Requests: {len(ms):,}  ({len(ms) / elapsed:,.0f} req/s)  server errors: {len(errors)}")
+    print(f"Latency ms  p50 {np.percentile(ms, 50):.2f}  p95 {np.percentile(ms, 95):.2f}  "
+          f"p99 {np.percentile(ms, 99):.2f}  max {ms.max():.2f}")
+    batches = max(stats["batches"], 1)
+    print(f"Write batches: {stats['batches']:,}  requests per batch: {stats['batched_requests'] / batches:.1f}  "
+          f"ledger rows: {stats['ledger_rows']:,}")
+
+
+def main():
+    connections = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 10
+    users = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    with tempfile.TemporaryDirectory() as tmp:
+        process = subprocess.Popen([sys.executable, os.path.abspath(SERVER), "--port", str(port)], cwd=tmp,
+                                   stdout=subprocess.DEVNULL)
+        try:
+            asyncio.run(run(port, process, connections, seconds, users))
+        finally:
+            process.terminate()
+            process.wait()
+
+
+if __name__ == "__main__":
+    main()
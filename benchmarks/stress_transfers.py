@@ -0,0 +1,120 @@
+"""
+Stress test for concurrent transfers.
+
+Creates N accounts in a temporary directory and runs T threads that each make K transfers between random pairs
+of accounts (so opposite transfers A -> B and B -> A run at the same time), mixed with deposits and withdrawals
+on the same accounts. Then checks that:
+  - every thread finished within the timeout (no deadlock; stacks are dumped otherwise),
+  - the total money supply equals the opening balances plus deposits minus withdrawals,
+  - no balance went negative,
+  - the ledger holds exactly one Transfer Out and one Transfer In row per successful transfer, and each
+    account's ledger rows add up to its balance change.
+
+Usage: python benchmarks/stress_transfers.py [accounts] [threads] [transfers_per_thread]
+Exits with status 1 if any check fails.
+"""
+import faulthandler
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import logic  # noqa: E402
+
+OPENING_BALANCE = 10_000 * 100 # paisa
+TIMEOUT = 300 # seconds
+
+
+def worker(clients, count, seed, stats):
+    rng = random.Random(seed)
+    for _ in range(count):
+        sender, receiver = rng.sample(clients, 2)
+        action = rng.random()
+        if action < 0.8:
+            msg = sender.transfer(receiver, rng.randint(1, OPENING_BALANCE // 5))
+            key = "transfers" if msg.startswith("✅") else "rejected"
+        elif action < 0.9:
+            amount = rng.randint(1, 10_000)
+            msg = sender.add_income(amount)
+            key = "deposits"
+            stats["deposited"] += amount if msg.startswith("✅") else 0
+        else:
+            amount = rng.randint(1, 10_000)
+            msg = sender.withdraw(amount, "Stress")
+            key = "withdrawals"
+            stats["withdrawn"] += amount if msg.startswith(("✅", "⚠️")) else 0
+        stats[key] += 1
+
+
+def main():
+    n_accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    n_threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    per_thread = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.chdir(tmp)
+        logic.ensure_ledger()
+        clients = [logic.StandardAccount(f"user{i:03d}", "pw", OPENING_BALANCE) for i in range(n_accounts)]
+        opening_total = sum(client.amount for client in clients)
+
+        stats = [dict.fromkeys(("transfers", "rejected", "deposits", "withdrawals", "deposited", "withdrawn"), 0)
+                 for _ in range(n_threads)]
+        threads = [threading.Thread(target=worker, args=(clients, per_thread, seed, stats[seed]), daemon=True)
+                   for seed in range(n_threads)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        deadline = start + TIMEOUT
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.perf_counter()))
+        elapsed = time.perf_counter() - start
+
+        failures = []
+        if any(thread.is_alive() for thread in threads):
+            faulthandler.dump_traceback(all_threads=True)
+            print(f"FAIL: threads still running after {TIMEOUT}s (deadlock?)")
+            sys.exit(1)
+
+        totals = {key: sum(s[key] for s in stats) for key in stats[0]}
+        expected_total = opening_total + totals["deposited"] - totals["withdrawn"]
+        actual_total = sum(client.amount for client in clients)
+        if actual_total != expected_total:
+            failures.append(f"money supply {actual_total} != expected {expected_total}")
+        negative = [client.uname for client in clients if client.amount < 0]
+        if negative:
+            failures.append(f"negative balances: {negative}")
+
+        df = logic.read_ledger()
+        outs = df[df["type"] == "Transfer Out"]
+        ins = df[df["type"] == "Transfer In"]
+        if not len(outs) == len(ins) == totals["transfers"]:
+            failures.append(f"ledger has {len(outs)} out / {len(ins)} in rows for {totals['transfers']} transfers")
+        if outs["amount"].sum() != ins["amount"].sum():
+            failures.append("ledger transfer amounts do not balance")
+        sign = df["type"].map({"Transfer In": 1, "Income": 1, "Transfer Out": -1, "Expense": -1})
+        net = (df["amount"] * sign).groupby(df["username"]).sum()
+        mismatched = [client.uname for client in clients
+                      if OPENING_BALANCE + int(net.get(client.uname, 0)) != client.amount]
+        if mismatched:
+            failures.append(f"ledger does not match balances for {mismatched}")
+
+        operations = n_threads * per_thread
+        print(f"{n_threads} threads x {per_thread} operations on {n_accounts} accounts in {elapsed:.2f} s "
+              f"({operations / elapsed:,.0f} ops/s)")
+        print(f"transfers: {totals['transfers']} ok, {totals['rejected']} rejected; "
+              f"deposits: {totals['deposits']}; withdrawals: {totals['withdrawals']}")
+        print(f"money supply: {actual_total} paisa (expected {expected_total})")
+        os.chdir(os.path.dirname(tmp)) # Leave the directory before it is removed
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("OK: money conserved, ledger consistent, no deadlock")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Per-user time buckets at day, week, month and year resolution, for charts over any date range.
+
+A BucketPyramid holds one user's net cash flow and expense totals per bucket at every resolution. It is built
+once from the user's ledger rows (kernels.LedgerArrays) and then kept up to date row by row as transactions are
+logged (logic.append_to_ledger), so a chart never goes back to the raw rows. For a date range,
+choose_resolution() picks the coarsest resolution that still gives MIN_POINTS buckets, and series() looks up
+only the buckets in the range. The cost of a chart therefore depends on the number of points drawn, not on
+the length of the history.
+
+Buckets are numbered from 1970 in local time: days, weeks starting on Monday, calendar months and calendar
+years.
+"""
+import numpy as np
+
+import kernels
+
+RESOLUTIONS = ("day", "week", "month", "year") # Finest first
+RESOLUTION_LABELS = {"day": "Daily", "week": "Weekly", "month": "Monthly", "year": "Yearly"}
+MIN_POINTS = 12 # A chart uses the coarsest resolution with at least this many buckets in its range
+
+SECONDS_PER_DAY = kernels.SECONDS_PER_DAY
+
+
+def bucket_indexes(resolution, seconds):
+    """Local seconds since 1970 (int64 array) -> bucket numbers at resolution."""
+    if resolution == "day":
+        return seconds // SECONDS_PER_DAY
+    if resolution == "week":
+        return (seconds // SECONDS_PER_DAY + 3) // 7 # 1970-01-01 was a Thursday; weeks start on Monday
+    months = kernels.month_index(seconds)
+    return months if resolution == "month" else months // 12
+
+
+def bucket_starts(resolution, indexes):
+    """Bucket numbers -> the first day of each bucket as datetime64[D]."""
+    if resolution == "day":
+        return indexes.astype("datetime64[D]")
+    if resolution == "week":
+        return (indexes * 7 - 3).astype("datetime64[D]")
+    unit = "datetime64[M]" if resolution == "month" else "datetime64[Y]"
+    return indexes.astype(unit).astype("datetime64[D]")
+
+
+def choose_resolution(first_second, last_second, min_points=MIN_POINTS):
+    """The coarsest resolution with at least min_points buckets from first_second to last_second (else days)."""
+    seconds = np.array([first_second, last_second], dtype=np.int64)
+    for resolution in reversed(RESOLUTIONS):
+        first, last = bucket_indexes(resolution, seconds)
+        if last - first + 1 >= min_points:
+            return resolution
+    return RESOLUTIONS[0]
+
+
+class BucketPyramid:
+    """One user's net cash flow and expense totals (paisa) per bucket, at every resolution."""
+    __slots__ = ("levels", "first_second", "last_second")
+
+    def __init__(self):
+        self.levels = {resolution: {} for resolution in RESOLUTIONS} # bucket number -> [net, expense]
+        self.first_second = None # Earliest and latest transaction times held (None while empty)
+        self.last_second = None
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """Builds the pyramid from ledger rows (kernels.LedgerArrays); rows without a valid time are left out."""
+        pyramid = cls()
+        valid = arrays.valid_time
+        expense = np.where(kernels.type_mask(arrays.types, kernels.EXPENSE_TYPES), arrays.amounts, 0)
+        pyramid.add(arrays.seconds[valid], kernels.signed_amounts(arrays)[valid], expense[valid])
+        return pyramid
+
+    def add_rows(self, rows):
+        """Adds logged (username, datetime, amount_paisa, type, category) rows."""
+        seconds = np.array([np.datetime64(row[1], "s").astype(np.int64) for row in rows], dtype=np.int64)
+        amounts = np.array([row[2] for row in rows], dtype=np.int64)
+        types = np.array([kernels.TYPE_CODES.get(row[3], kernels.OTHER_TYPE) for row in rows], dtype=np.int8)
+        net = np.where(kernels.type_mask(types, kernels.OUTFLOW_TYPES), -amounts, amounts)
+        self.add(seconds, net, np.where(kernels.type_mask(types, kernels.EXPENSE_TYPES), amounts, 0))
+
+    def add(self, seconds, net, expense):
+        """Adds rows given as local seconds, signed net amounts and expense amounts (int64 arrays)."""
+        if len(seconds) == 0:
+            return
+        for resolution, level in self.levels.items():
+            indexes, inverse = np.unique(bucket_indexes(resolution, seconds), return_inverse=True)
+            net_sums = np.bincount(inverse, weights=net, minlength=len(indexes))
+            expense_sums = np.bincount(inverse, weights=expense, minlength=len(indexes))
+            for index, net_sum, expense_sum in zip(indexes.tolist(), net_sums.tolist(), expense_sums.tolist()):
+                totals = level.setdefault(index, [0, 0])
+                totals[0] += round(net_sum)
+                totals[1] += round(expense_sum)
+        low, high = int(seconds.min()), int(seconds.max())
+        self.first_second = low if self.first_second is None else min(self.first_second, low)
+        self.last_second = high if self.last_second is None else max(self.last_second, high)
+
+    def series(self, resolution, first_second, last_second):
+        """
+        Every bucket from the one holding first_second to the one holding last_second, empty ones included, as
+        (first days as datetime64[D], int64 net totals, int64 expense totals).
+        """
+        first, last = bucket_indexes(resolution, np.array([first_second, last_second], dtype=np.int64))
+        indexes = np.arange(first, max(first, last) + 1)
+        level = self.levels[resolution]
+        totals = np.array([level.get(index, (0, 0)) for index in indexes.tolist()], dtype=np.int64).reshape(-1, 2)
+        return bucket_starts(resolution, indexes), totals[:, 0], totals[:, 1]
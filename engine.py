@@ -0,0 +1,234 @@
+"""
+Optional query engines for large ledgers.
+
+The pandas path (ledger.read) parses every row of every segment into one DataFrame before a user's rows are
+picked out, so for a multi-million-row, multi-user ledger each analytics call pays for the whole ledger in time
+and memory. When Polars or pyarrow is installed, user_arrays() instead scans the segment files lazily with the
+username and date predicates pushed into the scan, so only the matching rows are ever materialised:
+  - polars: pl.scan_csv per segment (closed, gzip-compressed segments are decompressed by pl.read_csv),
+    filtered and projected before collect(),
+  - pyarrow: a pyarrow.dataset CSV scan per segment with a filter expression (gzip is read transparently).
+The result is the same kernels.LedgerArrays (or, from user_frame() and rows_frame(), the same DataFrame) the
+pandas path produces, so the report, monthly roll-up, category breakdown and forecast-input queries
+(kernels.py) give identical results whichever engine read the rows. rows_frame() reads every user's rows,
+optionally only some transaction types, for the aggregates kept across users (rolling spend, expense
+statistics, the batched forecast); the type predicate is pushed into the scan as well. Segments are still
+chosen from the manifest first (ledger.segment_files), so a date range only touches the months it overlaps.
+
+The engines read schema version 3 and 4 segments, which hold integer epoch seconds and paisa. Older segments,
+text timestamps and damaged records are left to the pandas reader: the records of open segments are checked
+first (ledger.damaged_records), closed segments are covered by gzip's CRC, and if a scan fails for any reason
+the query falls back to it. Set FINANCE_LEDGER_ENGINE to polars, pyarrow or pandas to choose; by default the first one
+installed is used.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import kernels
+import ledger
+
+try:
+    import polars as pl
+except ImportError:
+    pl = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.dataset as pa_ds
+except ImportError:
+    pa = None
+
+ENGINES = ("polars", "pyarrow", "pandas")
+SCAN_COLUMNS = ["username", "timestamp_utc", "amount_paisa", "type", "category"] # Columns of version 3 and 4 segments
+
+
+def available_engines():
+    """The engines that can be used here, fastest first; pandas is always available."""
+    return tuple(name for name, module in zip(ENGINES, (pl, pa, pd)) if module is not None)
+
+
+def default_engine():
+    """The engine named by FINANCE_LEDGER_ENGINE if it is installed, else the first available one."""
+    requested = os.environ.get("FINANCE_LEDGER_ENGINE", "").strip().lower()
+    if requested in available_engines():
+        return requested
+    if requested:
+        print(f"Ledger engine '{requested}' is not available; using {available_engines()[0]}.") # Debug print
+    return available_engines()[0]
+
+
+def frame_to_arrays(df):
+    """Ledger rows as a DataFrame (ledger.COLUMNS) -> kernels.LedgerArrays."""
+    type_codes, type_names = pd.factorize(df["type"])
+    category_codes, category_names = pd.factorize(df["category"], sort=True)
+    return kernels.from_columns(df["timestamp"].to_numpy(), df["amount"].to_numpy(),
+                                type_codes, type_names, category_codes, category_names)
+
+
+def _columns_to_arrays(epoch, amounts, types, categories):
+    """Scanned columns (float64 UTC epoch seconds with NaN for a missing timestamp, paisa, text) -> LedgerArrays."""
+    valid = ~np.isnan(epoch)
+    local = np.full(len(epoch), np.datetime64("NaT"), dtype="datetime64[s]")
+    local[valid] = (epoch[valid].astype(np.int64) + ledger.LOCAL_UTC_OFFSET).astype("datetime64[s]")
+    type_codes, type_names = pd.factorize(types)
+    category_codes, category_names = pd.factorize(categories, sort=True)
+    return kernels.from_columns(local, amounts, type_codes, type_names, category_codes, category_names)
+
+
+def _bounds(start, end):
+    """Local datetime bounds -> UTC epoch bounds (None = unbounded)."""
+    return (None if start is None else ledger.to_epoch(start)), (None if end is None else ledger.to_epoch(end))
+
+
+def _scan_paths(directory, start, end):
+    """
+    The segments overlapping the range, or None if one of them needs the pandas reader: a schema before 3, or
+    an open segment with damaged records (the engines do not check record checksums; pandas skips them).
+    """
+    paths = []
+    for path in ledger.segment_files(directory, start, end):
+        version = ledger.schema_version(path)
+        if version == 0:
+            continue # Missing or empty segment
+        if version < 3 or (version >= 4 and ledger.damaged_records(path)):
+            return None
+        paths.append(path)
+    return paths
+
+
+def _polars_scan(paths, uname, start_ts, end_ts, types):
+    schema = {"username": pl.String, "timestamp_utc": pl.Int64, "amount_paisa": pl.Int64,
+              "type": pl.String, "category": pl.String}
+    predicate = pl.lit(True)
+    if uname is not None:
+        predicate &= pl.col("username") == uname
+    if start_ts is not None:
+        predicate &= pl.col("timestamp_utc") >= start_ts
+    if end_ts is not None:
+        predicate &= pl.col("timestamp_utc") < end_ts
+    if types is not None:
+        predicate &= pl.col("type").is_in(list(types))
+    scans = []
+    for path in paths:
+        if path.endswith(".gz"):
+            # scan_csv cannot read gzip; filtered right away, so only one whole segment is in memory at a time
+            scans.append(pl.read_csv(path, columns=SCAN_COLUMNS, schema_overrides=schema).filter(predicate).lazy())
+        else:
+            scans.append(pl.scan_csv(path, schema_overrides=schema).select(SCAN_COLUMNS))
+    df = (pl.concat(scans).filter(predicate)
+          .select(pl.col("username").fill_null(""), pl.col("timestamp_utc").cast(pl.Float64), "amount_paisa",
+                  pl.col("type").fill_null(""), pl.col("category").fill_null("")) # Empty text is null in Polars
+          .collect())
+    return (df["username"].to_numpy(), df["timestamp_utc"].to_numpy(), df["amount_paisa"].to_numpy(),
+            df["type"].to_numpy(), df["category"].to_numpy())
+
+
+def _pyarrow_scan(paths, uname, start_ts, end_ts, types):
+    column_types = {"username": pa.string(), "timestamp_utc": pa.int64(), "amount_paisa": pa.int64(),
+                    "type": pa.string(), "category": pa.string()}
+    csv_format = pa_ds.CsvFileFormat(convert_options=pa_csv.ConvertOptions(column_types=column_types))
+    conditions = []
+    if uname is not None:
+        conditions.append(pa_ds.field("username") == uname)
+    if start_ts is not None:
+        conditions.append(pa_ds.field("timestamp_utc") >= start_ts)
+    if end_ts is not None:
+        conditions.append(pa_ds.field("timestamp_utc") < end_ts)
+    if types is not None:
+        conditions.append(pa_ds.field("type").isin(list(types)))
+    predicate = None
+    for condition in conditions:
+        predicate = condition if predicate is None else predicate & condition
+    # One dataset per segment: version 3 and 4 segments have different columns
+    tables = [pa_ds.dataset(path, format=csv_format).to_table(columns=SCAN_COLUMNS, filter=predicate) for path in paths]
+    table = pa.concat_tables(tables) if tables else pa.table({name: pa.array([], dtype) for name, dtype in column_types.items()})
+    return (table.column("username").to_numpy(zero_copy_only=False),
+            table.column("timestamp_utc").cast(pa.float64()).to_numpy(),
+            table.column("amount_paisa").to_numpy(),
+            table.column("type").to_numpy(zero_copy_only=False),
+            table.column("category").to_numpy(zero_copy_only=False))
+
+
+def _scan(directory, start, end, uname, types, engine):
+    """
+    The matching rows as columns (usernames, float64 UTC epoch seconds with NaN if missing, paisa, types,
+    categories), read by the polars or pyarrow engine; None if they must be read with pandas instead.
+    """
+    if engine == "pandas":
+        return None
+    paths = _scan_paths(directory, start, end)
+    if paths is None:
+        return None
+    start_ts, end_ts = _bounds(start, end)
+    try:
+        if engine == "polars":
+            return _polars_scan(paths, uname, start_ts, end_ts, types)
+        return _pyarrow_scan(paths, uname, start_ts, end_ts, types)
+    except Exception as e:
+        print(f"{engine} scan of the ledger failed, reading it with pandas: {e}") # Debug print
+        return None
+
+
+def _columns_to_frame(usernames, epoch, amounts, types, categories):
+    """Scanned columns -> a DataFrame with ledger.COLUMNS, as ledger.read returns it."""
+    local = np.where(np.isnan(epoch), np.iinfo(np.int64).min, epoch + ledger.LOCAL_UTC_OFFSET).astype(np.int64)
+    return pd.DataFrame({"username": usernames, "timestamp": local.view("datetime64[s]").astype("datetime64[ns]"),
+                         "amount": np.asarray(amounts, dtype=np.int64), "type": types, "category": categories})
+
+
+def _pandas_rows(directory, start, end, uname, types):
+    df = ledger.read(directory, start, end)
+    mask = np.ones(len(df), dtype=bool)
+    if uname is not None:
+        mask &= (df["username"] == uname).to_numpy()
+    if types is not None:
+        mask &= df["type"].isin(types).to_numpy()
+    return df[mask].reset_index(drop=True)
+
+
+def _check_ledger(directory):
+    if ledger.signature(directory) is None:
+        raise FileNotFoundError(f"No ledger found in {directory}/")
+
+
+def user_arrays(username, start=None, end=None, directory=ledger.LEDGER_DIR, engine=None):
+    """
+    Returns one user's ledger rows (optionally only start <= timestamp < end, local datetimes) as
+    kernels.LedgerArrays, read with the given engine (default_engine() if None).
+    Raises FileNotFoundError if there is no ledger.
+    """
+    uname = username.lower()
+    _check_ledger(directory)
+    columns = _scan(directory, start, end, uname, None, engine or default_engine())
+    if columns is None:
+        return frame_to_arrays(_pandas_rows(directory, start, end, uname, None))
+    return _columns_to_arrays(*columns[1:])
+
+
+def user_frame(username, start=None, end=None, directory=ledger.LEDGER_DIR, engine=None):
+    """
+    Like user_arrays(), but returns the rows as a DataFrame with ledger.COLUMNS in ledger order (for paging,
+    exports). Raises FileNotFoundError if there is no ledger.
+    """
+    uname = username.lower()
+    _check_ledger(directory)
+    columns = _scan(directory, start, end, uname, None, engine or default_engine())
+    if columns is None:
+        return _pandas_rows(directory, start, end, uname, None)
+    return _columns_to_frame(*columns)
+
+
+def rows_frame(start=None, end=None, types=None, directory=ledger.LEDGER_DIR, engine=None):
+    """
+    Every user's ledger rows with start <= timestamp < end (None = unbounded) and, if types is given, one of
+    those transaction types, as a DataFrame with ledger.COLUMNS in ledger order; for aggregates across users.
+    Raises FileNotFoundError if there is no ledger.
+    """
+    _check_ledger(directory)
+    columns = _scan(directory, start, end, None, types, engine or default_engine())
+    if columns is None:
+        return _pandas_rows(directory, start, end, None, types)
+    return _columns_to_frame(*columns)
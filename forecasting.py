@@ -0,0 +1,244 @@
+"""
+Expense forecasting models, and forecasts for many users at once.
+
+Models (MODELS) all fit one user's expense series: the valid-time expenses in time order as seconds, whole days
+since the first expense and cumulative paisa (kernels.expense_series). They then predict the cumulative expense
+at given day offsets, which is what predict_next_month_expense and predict_future_expense_data (logic.py) need.
+  - linear: a straight line over cumulative expense (LinearRegression), the default,
+  - weekday: average spend per day of the week, so weekly cycles such as weekend spending show up,
+  - month: average daily spend per calendar month, for yearly cycles (months without history use the overall
+    average),
+  - smoothing: simple exponential smoothing of daily spend, with the smoothing factor chosen from a grid by
+    one-step-ahead error. The recursion runs once over the days for all candidate factors at the same time.
+The seasonal models work on daily totals (bincount over day offsets, zero-spend days included). cached_fit()
+keeps each user's fitted parameters until the user's expense rows change.
+
+predict_next_month_expense fits one model per call. forecast_next_month() produces the linear forecast for
+every user in the ledger from one grouped pass. Expense rows are sorted by (user, time) once, and each user's cumulative
+series and day offsets are built with segmented NumPy operations. The least-squares sufficient statistics
+(count, means, centred sums of squares and cross-products) are bincount sums per user, so all slope/intercept
+pairs come out of a few vector operations instead of thousands of model fits. Centring, as LinearRegression
+does, keeps the large cumulative sums from cancelling.
+"""
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+from sklearn.linear_model import LinearRegression
+
+import kernels
+
+SECONDS_PER_DAY = kernels.SECONDS_PER_DAY
+
+# Why a user has no forecast, as in predict_next_month_expense's messages
+OK = "ok"
+TOO_FEW_EXPENSES = "too few expenses" # Fewer than 2 expense rows
+NO_VALID_EXPENSES = "no valid expenses" # No expense row has a readable timestamp
+NO_VARIATION = "no variation" # All expenses fall on the same day offset
+
+
+def next_month_bounds(today=None):
+    """(first day of next month, last day of next month) as datetimes at midnight."""
+    today = today or datetime.now()
+    first = datetime(today.year + (today.month == 12), today.month % 12 + 1, 1)
+    after = datetime(first.year + (first.month == 12), first.month % 12 + 1, 1)
+    return first, datetime.fromordinal(after.toordinal() - 1)
+
+
+def _seconds(value):
+    """Local datetime -> local seconds since 1970, like LedgerArrays.seconds."""
+    return np.datetime64(value, "s").astype(np.int64)
+
+
+def least_squares(groups, x, y, n_groups):
+    """
+    Per-group ordinary least squares of y on x. groups are int codes in [0, n_groups).
+    Returns (count, slope, intercept, sxx); slope and intercept are NaN where sxx is 0 (all x equal).
+    """
+    count = np.bincount(groups, minlength=n_groups)
+    safe = np.maximum(count, 1)
+    mean_x = np.bincount(groups, weights=x, minlength=n_groups) / safe
+    mean_y = np.bincount(groups, weights=y, minlength=n_groups) / safe
+    dx = x - mean_x[groups]
+    sxx = np.bincount(groups, weights=dx * dx, minlength=n_groups)
+    sxy = np.bincount(groups, weights=dx * (y - mean_y[groups]), minlength=n_groups)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        slope = np.where(sxx > 0, sxy / sxx, np.nan)
+    return count, slope, mean_y - slope * mean_x, sxx
+
+
+def forecast_next_month(ledger_rows, today=None):
+    """
+    Linear next-month expense forecast for every user in ledger_rows (a ledger DataFrame, ledger.COLUMNS).
+    Returns a DataFrame indexed by username with expenses (valid expense rows used), slope (paisa per day),
+    intercept, predicted (int64 paisa, 0 when there is no forecast) and status (OK or the reason there is none).
+    """
+    usernames, user_codes = np.unique(ledger_rows["username"].to_numpy().astype(str), return_inverse=True)
+    user_codes = user_codes.reshape(-1)
+    n_users = len(usernames)
+    is_expense = ledger_rows["type"].isin(kernels.EXPENSE_TYPES).to_numpy()
+    expense_rows = np.bincount(user_codes[is_expense], minlength=n_users)
+
+    seconds = ledger_rows["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64)
+    use = is_expense & (seconds != kernels.NO_TIME)
+    groups, seconds = user_codes[use], seconds[use]
+    amounts = ledger_rows["amount"].to_numpy()[use].astype(np.int64)
+
+    # Sort by (user, time); stable, so equal timestamps keep ledger order as in the single-user path
+    order = np.lexsort((seconds, groups))
+    groups, seconds, amounts = groups[order], seconds[order], amounts[order]
+    starts = np.flatnonzero(np.r_[True, groups[1:] != groups[:-1]]) if len(groups) else np.empty(0, dtype=np.intp)
+    lengths = np.diff(np.r_[starts, len(groups)])
+    first_seconds = np.zeros(n_users, dtype=np.int64)
+    first_seconds[groups[starts]] = seconds[starts]
+
+    # Per-user day offsets and running totals (int64, exact) via one cumsum minus each user's offset
+    days = (seconds - first_seconds[groups]) // SECONDS_PER_DAY
+    running = np.cumsum(amounts)
+    before_user = np.repeat(running[starts] - amounts[starts], lengths)
+    cumulative = running - before_user
+    last_day = np.zeros(n_users, dtype=np.int64)
+    last_day[groups[starts + lengths - 1]] = days[starts + lengths - 1]
+
+    count, slope, intercept, sxx = least_squares(groups, days.astype(np.float64), cumulative.astype(np.float64), n_users)
+
+    first_day, last_of_month = next_month_bounds(today)
+    day_start = np.maximum(last_day, (_seconds(first_day) - first_seconds) // SECONDS_PER_DAY)
+    day_end = np.maximum(last_day, (_seconds(last_of_month) - first_seconds) // SECONDS_PER_DAY)
+    status = np.select([expense_rows < 2, count == 0, sxx <= 0], [TOO_FEW_EXPENSES, NO_VALID_EXPENSES, NO_VARIATION], OK)
+    ok = status == OK
+    # Predicted cumulative at the end of next month minus at its start; the intercept cancels
+    predicted = np.zeros(n_users, dtype=np.int64)
+    predicted[ok] = np.rint(np.maximum(0, (slope * day_end + intercept - (slope * day_start + intercept))[ok]))
+    return pd.DataFrame({"expenses": count, "slope": np.where(ok, slope, np.nan),
+                         "intercept": np.where(ok, intercept, np.nan), "predicted": predicted, "status": status},
+                        index=pd.Index(usernames, name="username"))
+
+
+# --- Per-user models ---
+
+class LinearTrend:
+    """Straight line over cumulative expense against days since the first expense."""
+    name = "linear"
+    label = "Linear trend"
+
+    def fit(self, seconds, days, cumulative):
+        return LinearRegression().fit(days.reshape(-1, 1), cumulative)
+
+    def predict_cumulative(self, params, days):
+        return params.predict(np.asarray(days).reshape(-1, 1))
+
+
+class _DailyRateModel:
+    """
+    A model of expected spend per calendar day. The predicted cumulative expense at day d (on or after the last
+    expense day) is the actual total so far plus the expected spend of each day after the last one up to d.
+    """
+
+    def fit(self, seconds, days, cumulative):
+        daily = np.bincount(days, weights=np.diff(cumulative, prepend=0)) # Spend per day since the first expense
+        # Day offsets count whole days from the first expense's time; offset d is mapped to the calendar day
+        # (local days since 1970) holding most of it
+        first_day = int((seconds[0] + SECONDS_PER_DAY // 2) // SECONDS_PER_DAY)
+        return {"first_day": first_day, "last_day": int(days[-1]), "total": float(cumulative[-1]),
+                "rates": self._fit_rates(daily, first_day + np.arange(len(daily)))}
+
+    def predict_cumulative(self, params, days):
+        days = np.asarray(days, dtype=np.int64)
+        last_day = params["last_day"]
+        ahead = np.arange(last_day + 1, max(last_day, int(days.max(initial=last_day))) + 1)
+        spend = np.concatenate(([0.0], np.cumsum(self._rates(params["rates"], params["first_day"] + ahead))))
+        return params["total"] + spend[np.clip(days - last_day, 0, None)]
+
+
+def _group_means(keys, values, n_keys):
+    """Mean of values per key; keys never seen get the overall mean."""
+    counts = np.bincount(keys, minlength=n_keys)
+    sums = np.bincount(keys, weights=values, minlength=n_keys)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), values.mean())
+
+
+class DayOfWeekBaseline(_DailyRateModel):
+    """Average spend for each day of the week."""
+    name = "weekday"
+    label = "Day-of-week average"
+
+    @staticmethod
+    def _weekday(day_numbers):
+        return (day_numbers + 3) % 7 # 1970-01-01 was a Thursday; 0 is Monday
+
+    def _fit_rates(self, daily, day_numbers):
+        return _group_means(self._weekday(day_numbers), daily, 7)
+
+    def _rates(self, rates, day_numbers):
+        return rates[self._weekday(day_numbers)]
+
+
+class MonthOfYearBaseline(_DailyRateModel):
+    """Average daily spend for each calendar month."""
+    name = "month"
+    label = "Month-of-year average"
+
+    @staticmethod
+    def _month(day_numbers):
+        return day_numbers.astype("datetime64[D]").astype("datetime64[M]").astype(np.int64) % 12
+
+    def _fit_rates(self, daily, day_numbers):
+        return _group_means(self._month(day_numbers), daily, 12)
+
+    def _rates(self, rates, day_numbers):
+        return rates[self._month(day_numbers)]
+
+
+class ExponentialSmoothing(_DailyRateModel):
+    """Simple exponential smoothing of daily spend; forecasts a flat rate equal to the final level."""
+    name = "smoothing"
+    label = "Exponential smoothing"
+    ALPHAS = np.linspace(0.05, 0.95, 19)
+
+    def _fit_rates(self, daily, day_numbers):
+        alphas = self.ALPHAS
+        level = np.full(len(alphas), daily[0])
+        errors = np.zeros(len(alphas))
+        for spend in daily[1:]: # One step per day, vectorised over every candidate alpha
+            errors += (spend - level) ** 2
+            level += alphas * (spend - level)
+        return float(level[np.argmin(errors)])
+
+    def _rates(self, rates, day_numbers):
+        return np.full(len(day_numbers), rates)
+
+
+MODELS = {model.name: model for model in (LinearTrend(), DayOfWeekBaseline(), MonthOfYearBaseline(), ExponentialSmoothing())}
+DEFAULT_MODEL = "linear"
+
+
+def get_model(name=None):
+    """The model registered under name (DEFAULT_MODEL if None). Raises ValueError for unknown names."""
+    try:
+        return MODELS[name or DEFAULT_MODEL]
+    except KeyError:
+        raise ValueError(f"Unknown forecasting model '{name}'. Choose from {', '.join(MODELS)}.") from None
+
+
+_fit_cache = {} # (model name, username) -> (series key, fitted parameters)
+_fit_cache_lock = threading.Lock() # Fits run on the GUI thread and the analytics prefetch worker
+
+
+def cached_fit(username, model, series):
+    """
+    Fits model to a user's expense series (seconds, days, cumulative), reusing the previous fit while the
+    series is unchanged: same number of expenses, same last timestamp and same total.
+    """
+    seconds, days, cumulative = series
+    key = (len(seconds), int(seconds[-1]), int(cumulative[-1]))
+    cache_key = (model.name, username.lower())
+    with _fit_cache_lock:
+        cached = _fit_cache.get(cache_key)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    params = model.fit(seconds, days, cumulative)
+    with _fit_cache_lock:
+        _fit_cache[cache_key] = (key, params)
+    return params
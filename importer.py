@@ -0,0 +1,296 @@
+"""
+Bank-statement importer.
+
+import_statement() streams a CSV statement exported by a bank in chunks (pandas read_csv with chunksize), maps
+its columns onto the ledger schema, drops rows that are already in the ledger and appends the rest with one
+ledger write per chunk (logic.write_ledger_records, so the chart buckets, rolling spend and expense statistics
+take the rows in as the GUI's own writes do). Each row goes to the segment of its own month, so old statements
+do not widen the current month's date range. Expenses that would take the balance below zero are left out and reported. The
+account's balance and spending are updated once per chunk.
+
+Duplicates are found with a persisted hash index, ledger/dedup_index.npz: one 64-bit hash
+(pd.util.hash_pandas_object) of (username, timestamp, amount, type, category) per ledger row, kept per segment
+together with the number of rows (and, for the open segment, bytes) it covers. Rows that reached the ledger
+some other way (the GUI, recurring expenses, other processes) are hashed at the start of the next import:
+only the new tail of the open segment is read, so other writers never have to keep the index up to date. Identical rows within one statement are kept (two equal payments on the same day are
+common); re-importing a statement, or an overlapping one, adds nothing twice.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+import ledger
+import logic
+from locking import file_lock
+from money import rupees_to_paisa
+
+INDEX_FILE = "dedup_index.npz"
+CHUNK_ROWS = 50_000
+
+# Statement header names (lower case) recognised for each ledger field
+COLUMN_ALIASES = {
+    "timestamp": ("date", "transaction date", "posting date", "booking date", "value date", "timestamp"),
+    "amount": ("amount", "transaction amount"),
+    "debit": ("debit", "withdrawal", "withdrawals", "money out", "paid out"),
+    "credit": ("credit", "deposit", "deposits", "money in", "paid in"),
+    "category": ("category", "description", "details", "narration", "particulars", "memo"),
+}
+
+
+def detect_mapping(columns):
+    """
+    Maps ledger fields to statement columns by header name. Returns {field: column}.
+    Raises ValueError if there is no date column or no amount / debit / credit column.
+    """
+    by_name = {str(column).strip().lower(): column for column in columns}
+    mapping = {}
+    for field, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in by_name:
+                mapping[field] = by_name[alias]
+                break
+    if "timestamp" not in mapping:
+        raise ValueError(f"No date column found in {list(columns)}")
+    if not {"amount", "debit", "credit"} & mapping.keys():
+        raise ValueError(f"No amount, debit or credit column found in {list(columns)}")
+    return mapping
+
+
+def _parse_amounts(text):
+    """Vectorised: statement amount text -> float rupees (NaN if empty or invalid). '(12.50)' is negative."""
+    text = text.astype(str).str.strip()
+    negative = text.str.startswith("(") & text.str.endswith(")")
+    values = pd.to_numeric(text.str.replace(r"[^0-9.\-]", "", regex=True), errors='coerce')
+    return values.where(~negative, -values.abs())
+
+
+def _to_epoch(timestamps):
+    """Vectorised: parsed timestamps (naive local, or timezone-aware) -> int64 UTC epoch seconds."""
+    if timestamps.dt.tz is not None:
+        return timestamps.dt.tz_convert("UTC").dt.tz_localize(None).to_numpy().astype("datetime64[s]").astype(np.int64)
+    return timestamps.to_numpy().astype("datetime64[s]").astype(np.int64) - ledger.LOCAL_UTC_OFFSET
+
+
+def map_chunk(chunk, username, mapping, date_format=None, dayfirst=False):
+    """
+    Converts a chunk of statement rows to ledger records: a DataFrame with username, epoch (int64 UTC seconds),
+    amount (int64 paisa, positive), type ("Income" for money in, "Expense" for money out) and category.
+    Returns (records, number of rows skipped because the date or amount could not be read or the amount is 0).
+    """
+    timestamps = pd.to_datetime(chunk[mapping["timestamp"]], format=date_format, dayfirst=dayfirst, errors='coerce')
+    if "amount" in mapping:
+        signed = _parse_amounts(chunk[mapping["amount"]])
+    else:
+        debit = _parse_amounts(chunk[mapping["debit"]]).abs() if "debit" in mapping else pd.Series(np.nan, index=chunk.index)
+        credit = _parse_amounts(chunk[mapping["credit"]]).abs() if "credit" in mapping else pd.Series(np.nan, index=chunk.index)
+        signed = (credit.fillna(0) - debit.fillna(0)).where(credit.notna() | debit.notna())
+
+    valid = (timestamps.notna() & signed.notna() & (signed != 0)).to_numpy()
+    paisa = rupees_to_paisa(signed.to_numpy()[valid])
+    if "category" in mapping:
+        # The ledger stores text fields on one line, so line breaks are replaced the same way it does
+        categories = chunk[mapping["category"]].astype(str).to_numpy()[valid]
+        categories = [" ".join(str(c).replace("\r", " ").replace("\n", " ").split()) or "Imported" for c in categories]
+    else:
+        categories = ["Imported"] * int(valid.sum())
+    records = pd.DataFrame({
+        "username": np.full(len(paisa), username, dtype=object),
+        "epoch": _to_epoch(timestamps[valid]),
+        "amount": np.abs(paisa),
+        "type": np.where(paisa > 0, "Income", "Expense").astype(object),
+        "category": np.asarray(categories, dtype=object),
+    })
+    return records, int((~valid).sum())
+
+
+def row_hashes(records):
+    """64-bit hash per record of (username, epoch, amount, type, category); dtypes are normalised first."""
+    normalised = pd.DataFrame({
+        "username": np.asarray(records["username"], dtype=object),
+        "epoch": np.asarray(records["epoch"], dtype=np.int64),
+        "amount": np.asarray(records["amount"], dtype=np.int64),
+        "type": np.asarray(records["type"], dtype=object),
+        "category": np.asarray(records["category"], dtype=object),
+    })
+    return pd.util.hash_pandas_object(normalised, index=False).to_numpy()
+
+
+def _record_hashes(records):
+    """Hashes of ledger.read_records() tuples, equal to _segment_hashes of the same rows."""
+    columns = list(zip(*records)) or [[], [], [], [], []]
+    epoch = [np.iinfo(np.int64).min if t is None else t for t in columns[1]]
+    return row_hashes({"username": columns[0], "epoch": epoch, "amount": columns[2], "type": columns[3], "category": columns[4]})
+
+
+def _segment_hashes(path):
+    """Hashes of every readable row of a ledger segment."""
+    df = ledger.read_file(path)
+    # Same epoch conversion as map_chunk; rows with an invalid timestamp get a value no import can produce
+    epoch = df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64) - ledger.LOCAL_UTC_OFFSET
+    return row_hashes({"username": df["username"], "epoch": np.where(df["timestamp"].isna(), np.iinfo(np.int64).min, epoch),
+                       "amount": df["amount"], "type": df["type"], "category": df["category"]})
+
+
+class DedupIndex:
+    """The persisted per-segment hash index of the ledger rows."""
+
+    def __init__(self, directory=ledger.LEDGER_DIR):
+        self.directory = directory
+        self.path = os.path.join(directory, INDEX_FILE)
+        self.segments = {} # month -> (rows covered, bytes covered (-1 for closed segments), uint64 hashes)
+        self.changed = False
+        try:
+            with np.load(self.path) as data:
+                for month, rows, size in zip(data["months"].tolist(), data["rows"].tolist(), data["bytes"].tolist()):
+                    self.segments[month] = (rows, size, data[f"hashes_{month}"])
+        except (FileNotFoundError, KeyError, ValueError, OSError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Rebuilding {self.path}: {e}") # Debug print
+
+    def refresh(self):
+        """
+        Brings the index up to date with the manifest. When the open segment only gained rows since it was
+        hashed (the usual case: GUI writes between imports), just the bytes past the covered size are read and
+        hashed; any other segment whose row count changed is re-hashed whole.
+        """
+        manifest = ledger.load_manifest(self.directory)
+        for month, entry in manifest["segments"].items():
+            covered = self.segments.get(month)
+            if covered is not None and covered[0] == entry["rows"]:
+                continue
+            path = os.path.join(self.directory, entry["file"])
+            size = -1 if entry["closed"] else entry["bytes"]
+            if covered is not None and not entry["closed"] and 0 < covered[1] <= (size or 0) and covered[0] < entry["rows"]:
+                tail = ledger.read_records(path, covered[1], size)
+                if len(tail) == entry["rows"] - covered[0]:
+                    self.add(month, entry["rows"], size, _record_hashes(tail))
+                    continue
+            hashes = _segment_hashes(path) if entry["rows"] else np.empty(0, np.uint64)
+            self.segments[month] = (entry["rows"], -1 if size is None else size, hashes)
+            self.changed = True
+        for month in set(self.segments) - set(manifest["segments"]):
+            del self.segments[month]
+            self.changed = True
+
+    def all_hashes(self):
+        if not self.segments:
+            return np.empty(0, dtype=np.uint64)
+        return np.concatenate([hashes for _rows, _size, hashes in self.segments.values()])
+
+    def add(self, month, rows, size, hashes):
+        """Records hashes of rows just appended to a segment, which now holds rows rows (size bytes if open, else -1)."""
+        old = self.segments.get(month, (0, -1, np.empty(0, np.uint64)))[2]
+        self.segments[month] = (rows, size, np.concatenate([old, hashes]))
+        self.changed = True
+
+    def save(self):
+        if not self.changed:
+            return
+        months = sorted(self.segments)
+        arrays = {f"hashes_{month}": self.segments[month][2] for month in months}
+        temp_file = self.path + ".tmp"
+        with open(temp_file, "wb") as f:
+            np.savez(f, months=np.array(months, dtype=str), rows=np.array([self.segments[m][0] for m in months], dtype=np.int64),
+                     bytes=np.array([self.segments[m][1] for m in months], dtype=np.int64), **arrays)
+        os.replace(temp_file, self.path)
+        self.changed = False
+
+
+def _affordable(balance, records):
+    """
+    Which records can be imported without the balance going below zero, taking them in time order: an expense
+    larger than the balance at that point is left out, as withdraw() would refuse it. Returns a boolean mask.
+    """
+    signed = np.where(records["type"].to_numpy() == "Expense", -records["amount"].to_numpy(), records["amount"].to_numpy())
+    order = np.argsort(records["epoch"].to_numpy(), kind="stable")
+    if balance + np.cumsum(signed[order]).min(initial=0) >= 0:
+        return np.ones(len(records), dtype=bool) # The common case: the balance never goes negative
+    keep = np.ones(len(records), dtype=bool)
+    for i in order.tolist():
+        if balance + signed[i] < 0:
+            keep[i] = False
+        else:
+            balance += signed[i]
+    return keep
+
+
+def import_statement(clients, username, path, mapping=None, date_format=None, dayfirst=False,
+                     chunksize=CHUNK_ROWS, directory=ledger.LEDGER_DIR):
+    """
+    Imports a CSV bank statement into username's account. mapping ({field: column}, see COLUMN_ALIASES) is
+    detected from the header when not given. Money in becomes Income, money out Expense; the balance and
+    spending change by the imported totals and user state is saved once at the end. Returns a status message.
+    """
+    client = logic.find_client_by_username(clients, username)
+    if client is None:
+        return f"❌ Account '{username}' not found."
+    imported = duplicates = skipped = unaffordable = 0
+    try:
+        ledger.ensure(directory)
+        # The account lock is taken before the ledger locks, in the same order as the Client operations
+        with logic.account_lock(client.uname), logic.ledger_write_lock(), file_lock(os.path.join(directory, ledger.LOCK_FILE)):
+            index = DedupIndex(directory)
+            index.refresh()
+            existing = index.all_hashes()
+            for chunk in pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunksize, skipinitialspace=True):
+                if mapping is None:
+                    mapping = detect_mapping(chunk.columns)
+                records, bad_rows = map_chunk(chunk, client.uname, mapping, date_format, dayfirst)
+                skipped += bad_rows
+                hashes = row_hashes(records)
+                new = ~np.isin(hashes, existing) # Only rows that were in the ledger before this import
+                duplicates += int((~new).sum())
+                if not new.any():
+                    continue
+                records, hashes = records[new], hashes[new]
+                affordable = _affordable(int(client.amount), records)
+                unaffordable += int((~affordable).sum())
+                if not affordable.any():
+                    continue
+                records, hashes = records[affordable], hashes[affordable]
+                # Each record goes to its own month's segment
+                appended = logic.write_ledger_records(list(records.itertuples(index=False, name=None)), directory)
+                months = appended.months
+                for month in sorted(appended.segments):
+                    entry = appended.segments[month]
+                    index.add(month, entry["rows"], -1 if entry["closed"] else entry["bytes"], hashes[months == month])
+                # One balance update per chunk
+                is_expense = (records["type"] == "Expense").to_numpy()
+                income = int(records["amount"].to_numpy()[~is_expense].sum())
+                expenses = int(records["amount"].to_numpy()[is_expense].sum())
+                client.amount += income - expenses
+                client.total_spent += expenses
+                imported += len(records)
+            index.save()
+    except (OSError, ValueError, pd.errors.ParserError) as e:
+        print(f"Error importing statement {path}: {e}") # Debug print
+        if imported:
+            rejected = _save(clients, client)
+            if rejected:
+                return rejected
+        return f"❌ Import stopped after {imported} transactions: {e}"
+
+    if imported:
+        rejected = _save(clients, client)
+        if rejected:
+            return rejected
+    message = (f"Imported {imported} transactions from {os.path.basename(path)} "
+               f"({duplicates} already in the ledger, {skipped} unreadable rows skipped).")
+    if unaffordable:
+        return f"⚠️ {message} {unaffordable} expenses were not imported: they would take the balance below zero."
+    return f"✅ {message}"
+
+
+def _save(clients, client):
+    """Saves the imported totals; returns an error message if they could not be saved, else None."""
+    try:
+        # Under the account lock, as the import may run on another thread than the account's other operations
+        with logic.account_lock(client.uname):
+            logic.save_all_clients(clients)
+    except logic.InvalidMergeError as e:
+        print(f"Error saving imported totals: {e}") # Debug print
+        return f"❌ The transactions were added to the ledger, but the account was changed elsewhere and its balance was not updated: {e}"
+    if logic.dirty_clients([client]):
+        return "❌ The transactions were added to the ledger, but the new balance could not be saved yet; it is saved with your next change."
+    return None
@@ -0,0 +1,145 @@
+"""
+NumPy aggregation kernel for reports, charts and forecasts.
+
+A user's ledger rows are converted once into typed arrays (LedgerArrays): local timestamps as int64 seconds
+since 1970, int64 paisa amounts, small integer type codes and category codes. The functions below work on
+those arrays only: masked sums, bincount category totals, month numbers and cumulative series. lttb() thins
+long series for plotting. Per-user frames are small, so this avoids the fixed overhead of pandas masks, isin,
+groupby and resample, which is larger than the arithmetic itself (benchmarks/bench_kernels.py).
+"""
+import numpy as np
+
+# Ledger transaction types -> codes; anything else gets OTHER_TYPE
+TYPES = ("Income", "Expense", "Transfer In", "Transfer Out", "Loan Received", "Loan Repayment",
+         "Recurring Expense", "Recurring Expense Failed")
+TYPE_CODES = {name: code for code, name in enumerate(TYPES)}
+OTHER_TYPE = len(TYPES)
+
+INFLOW_TYPES = ("Income", "Loan Received", "Transfer In")
+OUTFLOW_TYPES = ("Expense", "Loan Repayment", "Transfer Out", "Recurring Expense", "Recurring Expense Failed")
+EXPENSE_TYPES = ("Expense", "Recurring Expense")
+
+SECONDS_PER_DAY = 86_400
+NO_TIME = np.iinfo(np.int64).min # seconds value of an unreadable timestamp
+
+
+class LedgerArrays:
+    """Typed columns of a set of ledger rows, in ledger order."""
+    __slots__ = ("seconds", "amounts", "types", "categories", "category_names")
+
+    def __init__(self, seconds, amounts, types, categories, category_names):
+        self.seconds = seconds # int64 local seconds since 1970, NO_TIME if unreadable
+        self.amounts = amounts # int64 paisa, always positive
+        self.types = types # int8 codes into TYPES (OTHER_TYPE for unknown types)
+        self.categories = categories # int32 codes into category_names
+        self.category_names = category_names # sorted tuple of distinct categories
+
+    def __len__(self):
+        return len(self.amounts)
+
+    @property
+    def valid_time(self):
+        return self.seconds != NO_TIME
+
+
+def from_columns(timestamps, amounts, type_codes, type_names, category_codes, category_names):
+    """
+    Builds LedgerArrays from ledger columns: datetime64 local timestamps (NaT if unreadable), paisa amounts, and
+    the type and category columns as codes into their distinct values (as returned by pd.factorize; category
+    values sorted).
+    """
+    seconds = np.asarray(timestamps).astype("datetime64[s]").astype(np.int64) # NaT -> NO_TIME
+    lookup = np.array([TYPE_CODES.get(name, OTHER_TYPE) for name in type_names] + [OTHER_TYPE], dtype=np.int8)
+    return LedgerArrays(seconds, np.asarray(amounts, dtype=np.int64), lookup[type_codes],
+                        np.asarray(category_codes, dtype=np.int32), tuple(category_names))
+
+
+def type_mask(types, names):
+    """Boolean mask of the rows whose type is one of names (a lookup table, not isin)."""
+    table = np.zeros(OTHER_TYPE + 1, dtype=bool)
+    table[[TYPE_CODES[name] for name in names]] = True
+    return table[types]
+
+
+def masked_sum(values, mask):
+    """Exact int64 sum of values where mask is set."""
+    return int(values[mask].sum())
+
+
+def signed_amounts(arrays):
+    """Amounts with outflows negated, for net cash flow."""
+    return np.where(type_mask(arrays.types, OUTFLOW_TYPES), -arrays.amounts, arrays.amounts)
+
+
+def category_totals(arrays, mask):
+    """
+    Sum of amounts per category over the masked rows, as (names, int64 totals) sorted by total, largest first
+    (ties in name order). Categories without masked rows are left out. bincount sums in float64, which is exact
+    for totals below 2**53 paisa.
+    """
+    codes = arrays.categories[mask]
+    counts = np.bincount(codes, minlength=len(arrays.category_names))
+    totals = np.rint(np.bincount(codes, weights=arrays.amounts[mask], minlength=len(arrays.category_names))).astype(np.int64)
+    present = np.flatnonzero(counts)
+    order = present[np.argsort(-totals[present], kind="stable")]
+    return [arrays.category_names[i] for i in order], totals[order]
+
+
+def month_index(seconds):
+    """Seconds since 1970 -> months since January 1970."""
+    return seconds.astype("datetime64[s]").astype("datetime64[M]").astype(np.int64)
+
+
+def cumulative(values):
+    """Running int64 total."""
+    return np.cumsum(values, dtype=np.int64)
+
+
+def day_offsets(seconds):
+    """Whole days since the first timestamp (seconds sorted ascending)."""
+    return (seconds - seconds[0]) // SECONDS_PER_DAY
+
+
+def expense_series(arrays):
+    """
+    The valid-time expense rows in time order as (seconds, whole days since the first expense, cumulative
+    expense in paisa); the inputs of the expense forecasts.
+    """
+    mask = type_mask(arrays.types, EXPENSE_TYPES) & arrays.valid_time
+    seconds = arrays.seconds[mask]
+    order = np.argsort(seconds, kind="stable")
+    seconds = seconds[order]
+    if len(seconds) == 0:
+        return seconds, seconds, seconds
+    return seconds, day_offsets(seconds), cumulative(arrays.amounts[mask][order])
+
+
+def lttb(x, y, target):
+    """
+    Largest-triangle-three-buckets downsampling: indexes of at most target points of the series (x ascending)
+    that keep its visual shape. The first and last points are always kept. The rest are split into target - 2
+    equal buckets, and from each bucket the point forming the largest triangle with the point kept from the
+    previous bucket and the mean of the next bucket is kept. Series of at most target points (or target < 3)
+    are returned whole.
+    """
+    n = len(x)
+    if target >= n or target < 3:
+        return np.arange(n)
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    edges = (np.arange(target - 1) * ((n - 2) / (target - 2))).astype(np.int64) + 1 # Bucket i is edges[i]:edges[i + 1]
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    # Mean of every bucket at once; the bucket after the last one is the last point
+    mean_x = np.append(np.add.reduceat(x[:-1], edges[:-1]) / sizes, x[-1])
+    mean_y = np.append(np.add.reduceat(y[:-1], edges[:-1]) / sizes, y[-1])
+    kept = np.empty(target, dtype=np.int64)
+    kept[0], kept[-1] = 0, n - 1
+    a = 0
+    for i in range(target - 2):
+        start, end = edges[i], edges[i + 1]
+        # Twice the triangle area; the constant factor does not change the argmax
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[start:end] - y[a]) - (x[a] - x[start:end]) * (mean_y[i + 1] - y[a]))
+        a = start + int(np.argmax(area))
+        kept[i + 1] = a
+    return kept
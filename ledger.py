@@ -0,0 +1,726 @@
+"""
+Transaction ledger storage.
+
+The ledger is split into per-month segment files in LEDGER_DIR. Rows are appended to the segment of the
+current (local) month; when a month is over its segment is closed: gzip-compressed, and only extended when
+back-dated rows (a bank-statement import) are added to it.
+manifest.json lists every segment with its row count and the range of timestamps it holds, so date-bounded
+reads only open the segments that overlap the range. Closed segments rarely change, so their parsed frames
+are cached for the life of the process (keyed by file size and mtime, which a rewrite changes). The
+single-file transactions.csv of earlier versions is split into segments on first run (and kept as
+transactions.csv.imported).
+
+Each segment is a CSV file whose header line declares the schema:
+  - version 1: username,timestamp,amount,type,category  (timestamp text, amount in rupees as float text)
+  - version 2: username,timestamp,amount_paisa,type,category  (timestamp text, amount as integer paisa)
+  - version 3: username,timestamp_utc,amount_paisa,type,category  (timestamp as integer UTC epoch seconds)
+  - version 4: username,timestamp_utc,amount_paisa,type,category,length,crc32  (framed records, see below)
+New rows are always written in the current version; read_file() accepts every version. A version 3 file may
+still contain text timestamps (e.g. rows appended by an older copy of the app); read_file() handles such
+mixed files, parsing only the text rows.
+
+Torn writes: every version 4 record ends with the byte length of the fields before it and their CRC-32, so a
+partial or damaged line can be told apart from a good one. The manifest records how many bytes of the open
+segment were committed by the last append; after a crash recover() only checks the bytes past that offset,
+keeps the complete records, and moves anything else to quarantine/ before truncating the file. Segments are
+fully verified once more when they are closed. Readers check every record of an open segment (gzip's own CRC
+covers closed ones) and skip (and report) damaged records instead of failing, so one bad row never blocks the
+rest of the ledger.
+
+Several processes may share the ledger: every change (append, recovery, closing) holds the advisory lock on
+ledger/.lock (see locking.py). Readers do not lock; the manifest is replaced atomically.
+
+Timezone policy: stored timestamps are UTC epoch seconds. In memory, timestamps are naive local wall-clock
+times at LOCAL_UTC_OFFSET, the machine's UTC offset when the app starts (Pakistan Standard Time has no DST).
+Text timestamps were written with datetime.now(), so they are read as local time at that same offset.
+
+This module works on plain rows; logic.py adds caching and the per-user views on top.
+"""
+import copy
+import csv
+import gzip
+import io
+import json
+import os
+import re
+import shutil
+import warnings
+import zlib
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from locking import file_lock
+from money import rupees_to_paisa
+
+LEDGER_DIR = "ledger"
+MANIFEST_FILE = "manifest.json"
+LOCK_FILE = ".lock" # Held by every writer (append, recover, close_segments), across processes
+LEGACY_FILE = "transactions.csv" # Single-file ledger of earlier versions, imported into segments once
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S" # Text timestamps of schema versions 1 and 2
+SCHEMA_VERSION = 4
+_HEADERS = {
+    1: ["username", "timestamp", "amount", "type", "category"],
+    2: ["username", "timestamp", "amount_paisa", "type", "category"],
+    3: ["username", "timestamp_utc", "amount_paisa", "type", "category"],
+    4: ["username", "timestamp_utc", "amount_paisa", "type", "category", "length", "crc32"],
+}
+QUARANTINE_DIR = "quarantine" # Damaged records removed by recover() / close_segments(), inside the ledger directory
+COLUMNS = ["username", "timestamp", "amount", "type", "category"] # Columns of the frames returned by read()
+
+LOCAL_UTC_OFFSET = int(datetime.now().astimezone().utcoffset().total_seconds())
+_EPOCH = datetime(1970, 1, 1)
+
+
+def to_epoch(timestamp):
+    """Local naive datetime (or an aware one) -> integer UTC epoch seconds."""
+    if timestamp.tzinfo is not None:
+        return int(timestamp.timestamp())
+    return (timestamp - _EPOCH) // timedelta(seconds=1) - LOCAL_UTC_OFFSET
+
+
+def from_epoch(seconds):
+    """Integer UTC epoch seconds -> local naive datetime."""
+    return _EPOCH + timedelta(seconds=int(seconds) + LOCAL_UTC_OFFSET)
+
+
+def _open_text(path):
+    """Opens a plain or gzip-compressed (closed) segment for reading text."""
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline='')
+    return open(path, "r", newline='')
+
+
+def _open_binary(path):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    return open(path, "rb")
+
+
+# --- Record framing ---
+
+def _frame(records):
+    """
+    Encodes (username, epoch, paisa, type, category) records as framed lines, each "CSV fields,length,crc32"
+    where length and crc32 cover the CSV fields.
+    """
+    # Line breaks inside text fields would split a record; they are never meaningful in names or categories
+    buffer = io.StringIO()
+    csv.writer(buffer, lineterminator="\n").writerows(
+        [value.replace("\r", " ").replace("\n", " ") if isinstance(value, str) else value for value in record]
+        for record in records)
+    payloads = buffer.getvalue().encode("utf-8").split(b"\n")[:-1]
+    return b"".join(b"%s,%d,%08x\n" % (payload, len(payload), zlib.crc32(payload)) for payload in payloads)
+
+
+def _valid_record(line):
+    """True if a framed line (without its newline) is complete and its checksum matches."""
+    parts = line.rsplit(b",", 2)
+    if len(parts) != 3 or not parts[1].isdigit() or len(parts[2]) != 8:
+        return False
+    payload = parts[0]
+    try:
+        return int(parts[1]) == len(payload) and int(parts[2], 16) == zlib.crc32(payload)
+    except ValueError:
+        return False
+
+
+def _scan_records(data):
+    """
+    Splits framed bytes that start at a record boundary into (valid lines, damaged lines), without newlines.
+    A last line that is missing its newline is a torn write and counts as damaged.
+    """
+    lines = data.split(b"\n")
+    torn = lines.pop() # b"" when the data ends with a complete record
+    good, bad = [], []
+    for line in lines:
+        (good if _valid_record(line) else bad).append(line)
+    if torn:
+        bad.append(torn)
+    return good, bad
+
+
+def _record_epoch(line):
+    """Timestamp field of a valid framed line (None if empty)."""
+    timestamp = next(csv.reader([line.decode("utf-8")]))[1]
+    return int(timestamp) if timestamp else None
+
+
+def schema_version(path):
+    """Version declared by the file's header, or 0 if the file is missing or empty. Raises ValueError if unknown."""
+    try:
+        with _open_text(path) as f:
+            header = next(csv.reader(f), None)
+    except FileNotFoundError:
+        return 0
+    if not header:
+        return 0
+    for version, columns in _HEADERS.items():
+        if header == columns:
+            return version
+    raise ValueError(f"Unrecognised header in {path}: {header}")
+
+
+def _text_to_epoch(text):
+    """Vectorised: text timestamps (local time) -> float epoch seconds, NaN where unparseable."""
+    parsed = pd.to_datetime(pd.Series(text, dtype=str), format=TIMESTAMP_FORMAT, errors='coerce')
+    seconds = (parsed - _EPOCH).dt.total_seconds() - LOCAL_UTC_OFFSET
+    return seconds.to_numpy(dtype=np.float64)
+
+
+def _valid_records(path):
+    """
+    The header and the records of a version 4 file whose length and checksum match, as a file object for
+    read_csv; damaged records are reported and skipped, and the file itself is left untouched.
+    """
+    with _open_binary(path) as f:
+        header_line, _, body = f.read().partition(b"\n")
+    good, bad = _scan_records(body)
+    if bad:
+        print(f"Skipping {len(bad)} damaged ledger record(s) in {path}.") # Debug print
+    return io.BytesIO(header_line + b"\n" + b"".join(line + b"\n" for line in good))
+
+
+_damaged_cache = {} # path -> ((inode, size, mtime_ns), damaged record count), for damaged_records()
+
+
+def damaged_records(path):
+    """
+    Number of records of an open (version 4) segment whose length or checksum does not match, counting a torn
+    last line. The file is read again only when it changed. Closed segments are not read: their records were
+    checked when they were closed, and gzip's CRC makes reading them fail if they were damaged since.
+    """
+    if path.endswith(".gz"):
+        return 0
+    with open(path, "rb") as f:
+        stat = os.fstat(f.fileno())
+        key = (stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        cached = _damaged_cache.get(path)
+        if cached is None or cached[0] != key:
+            f.readline() # Header
+            _good, bad = _scan_records(f.read())
+            cached = _damaged_cache[path] = (key, len(bad))
+    return cached[1]
+
+
+def _read_columns(path, version):
+    """
+    Reads the file into (frame of username/amount/type/category, float64 epoch seconds with NaN if invalid).
+    Amounts are int64 paisa (malformed amounts become 0).
+    """
+    header = _HEADERS[version]
+    time_column, amount_column = header[1], header[2]
+    text_columns = {"username": str, "type": str, "category": str}
+    frame_columns = {"length": np.int64, "crc32": str} if version >= 4 else {}
+    source = path
+    if version >= 4 and not path.endswith(".gz"):
+        # Every record of an open segment is checked before it is parsed. Closed segments were checked when they
+        # were closed, and gzip's own CRC makes reading them fail if they were damaged since.
+        source = _valid_records(path)
+    df = None
+    if version >= 3:
+        try:
+            # Fast path: the C parser reads epoch seconds and paisa as numbers; no date parsing at all.
+            # An empty timestamp becomes NaN, which is why the time column is float64 (exact below 2**53).
+            df = pd.read_csv(source, dtype={**text_columns, **frame_columns, time_column: np.float64,
+                                          amount_column: np.int64},
+                             keep_default_na=False, na_values={time_column: [""]})
+            epoch = df.pop(time_column).to_numpy(copy=True)
+        except ValueError:
+            df = None # Some row holds text or has the wrong field count; take the checked path
+    if df is None:
+        if version >= 4:
+            source = _valid_records(path)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always", pd.errors.ParserWarning)
+            df = pd.read_csv(source, dtype=str, keep_default_na=False, on_bad_lines="warn")
+        for warning in caught:
+            print(f"Skipping malformed ledger row in {path}: {str(warning.message).strip().removeprefix('Skipping ')}") # Debug print
+        times = df.pop(time_column)
+        epoch = pd.to_numeric(times, errors='coerce').to_numpy(dtype=np.float64, copy=True)
+        text_rows = np.isnan(epoch) & (times != "").to_numpy()
+        if text_rows.any():
+            # Only the rows that are not epoch integers go through date parsing
+            epoch[text_rows] = _text_to_epoch(times.to_numpy()[text_rows])
+        values = pd.to_numeric(df[amount_column], errors='coerce').fillna(0)
+        df[amount_column] = rupees_to_paisa(values) if version == 1 else values.round().astype(np.int64)
+    df = df.drop(columns=list(frame_columns)).rename(columns={amount_column: "amount"})
+    return df, epoch
+
+
+def read_file(path):
+    """
+    Reads one ledger CSV (a segment, or a legacy transactions.csv) as a DataFrame with COLUMNS: local timestamps
+    (NaT if invalid), int64 paisa amounts and string categories. Accepts every schema version.
+    Raises FileNotFoundError / pandas EmptyDataError like read_csv.
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found")
+    version = schema_version(path)
+    if version == 0:
+        raise pd.errors.EmptyDataError(f"{path} is empty")
+    df, epoch = _read_columns(path, version)
+    # Epoch -> local wall-clock time is integer arithmetic; invalid rows become NaT
+    local = np.where(np.isnan(epoch), np.iinfo(np.int64).min, epoch + LOCAL_UTC_OFFSET).astype(np.int64)
+    df.insert(1, "timestamp", local.view("datetime64[s]").astype("datetime64[ns]"))
+    return df[COLUMNS]
+
+
+# --- Segments ---
+
+def _month(epoch):
+    """UTC epoch seconds -> 'YYYY-MM' of the local month."""
+    return from_epoch(epoch).strftime("%Y-%m")
+
+
+def _locked(directory):
+    """Exclusive lock for changes to the segment files and the manifest, shared with other processes."""
+    return file_lock(os.path.join(directory, LOCK_FILE))
+
+
+_GENERATION = re.compile(rb'"generation": (\d+)') # In the manifest's head, where the sorted keys put it
+
+
+def _manifest_path(directory):
+    return os.path.join(directory, MANIFEST_FILE)
+
+
+def load_manifest(directory=LEDGER_DIR):
+    """
+    Returns {"schema": version, "generation": saves so far, "segments": {month: entry}}. Each entry has file,
+    closed, rows, and min_ts / max_ts (UTC epoch seconds of the earliest and latest timestamp, None if no valid
+    timestamp).
+    """
+    try:
+        with open(_manifest_path(directory), "r") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {"schema": SCHEMA_VERSION, "segments": {}}
+
+
+def _save_manifest(directory, manifest):
+    manifest["generation"] = manifest.get("generation", 0) + 1 # Read back by signature()
+    temp_file = _manifest_path(directory) + ".tmp"
+    with open(temp_file, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(temp_file, _manifest_path(directory)) # Atomic, so readers never see a half-written manifest
+
+
+def _extend_range(entry, epochs):
+    """Adds rows with the given timestamps (NaN/None for invalid ones) to a manifest entry."""
+    valid = [int(t) for t in epochs if t is not None and t == t]
+    entry["rows"] += len(epochs)
+    if valid:
+        entry["min_ts"] = min(valid + ([entry["min_ts"]] if entry["min_ts"] is not None else []))
+        entry["max_ts"] = max(valid + ([entry["max_ts"]] if entry["max_ts"] is not None else []))
+
+
+def _new_entry(month):
+    return {"file": f"{month}.csv", "closed": False, "rows": 0, "min_ts": None, "max_ts": None, "bytes": 0}
+
+
+def _header_version(line):
+    """Schema version of a header line (bytes), or None if it is not a known header."""
+    columns = next(csv.reader([line.decode("utf-8", "replace")]), [])
+    for version, header in _HEADERS.items():
+        if columns == header:
+            return version
+    return None
+
+
+def _write_rows(path, rows):
+    """
+    Appends (username, epoch, paisa, type, category) rows as framed records in a single write, with the header
+    first if the file is new, and syncs them to disk. Returns the file size afterwards (the committed size).
+    """
+    data = _frame(rows)
+    with open(path, "ab") as f:
+        if f.tell() == 0:
+            data = (",".join(_HEADERS[SCHEMA_VERSION]) + "\n").encode("utf-8") + data
+        f.write(data)
+        f.flush()
+        os.fsync(f.fileno())
+        return f.tell()
+
+
+def _records(df, epoch, index):
+    """(username, epoch, paisa, type, category) records for the given rows of a _read_columns result."""
+    usernames, amounts = df["username"].to_numpy(), df["amount"].to_numpy()
+    types, categories = df["type"].to_numpy(), df["category"].to_numpy()
+    return [(usernames[i], "" if np.isnan(epoch[i]) else int(epoch[i]), int(amounts[i]), types[i], categories[i])
+            for i in index]
+
+
+def _upgrade_segment(path, version):
+    """Rewrites an open segment of an older schema version as framed records."""
+    df, epoch = _read_columns(path, version)
+    temp_file = path + ".tmp"
+    if os.path.exists(temp_file):
+        os.remove(temp_file) # Left over from an interrupted upgrade
+    _write_rows(temp_file, _records(df, epoch, range(len(df))))
+    os.replace(temp_file, path)
+    print(f"Upgraded ledger segment {path} to schema version {SCHEMA_VERSION}.") # Debug print
+
+
+def _quarantine(directory, name, lines):
+    """Moves damaged records to quarantine/<segment>.<time>.bad, so nothing is silently thrown away."""
+    quarantine_dir = os.path.join(directory, QUARANTINE_DIR)
+    os.makedirs(quarantine_dir, exist_ok=True)
+    path = os.path.join(quarantine_dir, f"{name}.{datetime.now():%Y%m%d-%H%M%S}.bad")
+    with open(path, "ab") as f:
+        f.write(b"".join(line + b"\n" for line in lines))
+    print(f"Quarantined {len(lines)} damaged ledger record(s) from {name} to {path}.") # Debug print
+
+
+def _recover_segment(directory, entry, full=False):
+    """
+    Checks an open segment against its manifest entry and repairs it in place; updates the entry.
+    Normally only the bytes past the committed size are scanned: complete records found there (written just
+    before a crash, without the manifest update) are kept and counted, damaged or torn ones are quarantined and
+    cut off. Every record is checked if full is set, or if the file is shorter than committed or has no
+    committed size. Returns True if the entry may have changed.
+    """
+    path = os.path.join(directory, entry["file"])
+    committed = entry.get("bytes")
+    if not os.path.exists(path):
+        changed = entry["rows"] != 0 or committed != 0
+        entry.update(rows=0, min_ts=None, max_ts=None, bytes=0)
+        return changed
+    size = os.path.getsize(path)
+    if committed == size and not full:
+        return False # The common case: nothing was written after the last manifest update
+
+    with open(path, "rb") as f:
+        header = f.readline()
+        header_end = f.tell()
+        version = _header_version(header.rstrip(b"\r\n")) if header.endswith(b"\n") else 0
+        tail_only = not full and committed is not None and header_end <= committed <= size
+        if version == SCHEMA_VERSION:
+            start = committed if tail_only else header_end
+            f.seek(start)
+            good, bad = _scan_records(f.read())
+    if version is None:
+        raise ValueError(f"Unrecognised header in {path}: {header[:200]!r}")
+    if version == 0:
+        start, good, bad = 0, [], [header] # Torn header: the file never held a complete record
+    elif version < SCHEMA_VERSION:
+        _upgrade_segment(path, version)
+        entry["bytes"] = None
+        return _recover_segment(directory, entry, full=True)
+
+    if not tail_only:
+        entry.update(rows=0, min_ts=None, max_ts=None)
+    _extend_range(entry, [_record_epoch(line) for line in good])
+    if bad:
+        _quarantine(directory, entry["file"], bad)
+        with open(path, "r+b") as f:
+            f.seek(start)
+            f.truncate()
+            f.write(b"".join(line + b"\n" for line in good))
+            f.flush()
+            os.fsync(f.fileno())
+            size = f.tell()
+    entry["bytes"] = size
+    return True
+
+
+def recover(directory=LEDGER_DIR):
+    """
+    Repairs the open segments after a crash or an interrupted write (see _recover_segment).
+    Costs one stat per open segment when every write completed.
+    """
+    with _locked(directory):
+        manifest = load_manifest(directory)
+        changed = False
+        for _month_name, entry in sorted(manifest["segments"].items()):
+            if not entry["closed"]:
+                changed = _recover_segment(directory, entry) or changed
+        if changed:
+            _save_manifest(directory, manifest)
+
+
+def close_segments(directory=LEDGER_DIR, current_month=None):
+    """
+    Compresses every open segment from before current_month (default: this month) and marks it closed.
+    Every record is verified first, so closed segments only hold valid records.
+    Safe to re-run after a crash: the .gz is written completely before the manifest points at it.
+    """
+    with _locked(directory):
+        current_month = current_month or datetime.now().strftime("%Y-%m")
+        manifest = load_manifest(directory)
+        for month, entry in sorted(manifest["segments"].items()):
+            if entry["closed"] or month >= current_month:
+                continue
+            _recover_segment(directory, entry, full=True)
+            plain = os.path.join(directory, entry["file"])
+            compressed = plain + ".gz"
+            with open(plain, "rb") as src, gzip.open(compressed + ".tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(compressed + ".tmp", compressed)
+            entry.update(file=entry["file"] + ".gz", closed=True)
+            _save_manifest(directory, manifest)
+            os.remove(plain)
+            print(f"Closed ledger segment {month} ({entry['rows']} rows).") # Debug print
+
+
+def record_months(epochs, current_month=None):
+    """
+    The segment month ('YYYY-MM') of each UTC epoch (float array, NaN if invalid): the local month of the
+    timestamp, or current_month (default: this month) for invalid timestamps and future months.
+    """
+    current_month = current_month or datetime.now().strftime("%Y-%m")
+    epochs = np.asarray(epochs, dtype=np.float64)
+    valid = ~np.isnan(epochs)
+    months = np.full(len(epochs), current_month, dtype=object)
+    local = (epochs[valid] + LOCAL_UTC_OFFSET).astype(np.int64).view("datetime64[s]")
+    months[valid] = np.datetime_as_string(local, unit="M")
+    months[months > current_month] = current_month # Clock skew: never create segments for future months
+    return months
+
+
+def import_file(path, directory=LEDGER_DIR):
+    """
+    Splits a single-file ledger (any schema version) into monthly segments by row timestamp.
+    Past months become closed segments; rows of this month and rows without a valid timestamp go to the open one.
+    """
+    df, epoch = _read_columns(path, schema_version(path))
+    current_month = datetime.now().strftime("%Y-%m")
+    months = record_months(epoch, current_month)
+
+    manifest = load_manifest(directory)
+    for month in sorted(set(months)):
+        selected = np.flatnonzero(months == month)
+        entry = manifest["segments"].setdefault(month, _new_entry(month))
+        entry["bytes"] = _write_rows(os.path.join(directory, entry["file"]), _records(df, epoch, selected))
+        _extend_range(entry, epoch[selected].tolist())
+    _save_manifest(directory, manifest)
+    close_segments(directory, current_month)
+    print(f"Imported {len(df)} ledger rows from {path} into {len(set(months))} monthly segments.") # Debug print
+
+
+def ensure(directory=LEDGER_DIR, legacy_path=LEGACY_FILE):
+    """
+    Prepares the segment directory: imports a legacy transactions.csv on first run, recovers the open segments
+    after a crash and closes segments of months that have ended.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with _locked(directory):
+        if not os.path.exists(_manifest_path(directory)):
+            if os.path.exists(legacy_path) and schema_version(legacy_path) != 0:
+                import_file(legacy_path, directory)
+                os.replace(legacy_path, legacy_path + ".imported") # Kept as a backup, no longer read
+            else:
+                _save_manifest(directory, load_manifest(directory))
+                print(f"Created ledger in {directory}/.") # Debug print
+        recover(directory)
+        close_segments(directory)
+
+
+class Appended:
+    """What append_records() wrote, as seen under the ledger lock."""
+    __slots__ = ("months", "segments", "before", "after")
+
+    def __init__(self, months, segments, before, after):
+        self.months = months # Segment month of every record, as an array
+        self.segments = segments # month -> manifest entry after the append, for the months written
+        self.before = before # signature() just before the append and just after it; no other process can
+        self.after = after   # append in between, so an aggregate at before plus these records is at after
+
+
+def append(rows, directory=LEDGER_DIR):
+    """
+    Appends rows of (username, timestamp datetime, amount_paisa int, type, category) to the segment of their
+    month (this month's, except for back-dated rows) in one write, and records them in the manifest. Holds the
+    ledger lock, so appends from several processes never interleave or lose each other's manifest updates.
+    Returns an Appended (see append_records).
+    """
+    return append_records([(uname, to_epoch(timestamp), int(amount), t_type, category)
+                           for uname, timestamp, amount, t_type, category in rows], directory)
+
+
+def append_records(records, directory=LEDGER_DIR):
+    """
+    Like append(), for records whose timestamps are already UTC epoch seconds (bulk imports). Every record is
+    stored in the segment of its own month (record_months), so date-bounded reads can still skip whole months:
+    this month's records are appended to the open segment, older ones are added to their month's closed
+    segment (_append_closed). All or nothing: if a write fails, the segments already written are cut back
+    (_undo_append) before the error is raised. Returns an Appended.
+    """
+    if not os.path.exists(_manifest_path(directory)):
+        ensure(directory)
+    with _locked(directory):
+        before = signature(directory)
+        current_month = datetime.now().strftime("%Y-%m")
+        manifest = load_manifest(directory)
+        if any(not entry["closed"] and m < current_month for m, entry in manifest["segments"].items()):
+            close_segments(directory, current_month) # The month rolled over while the app was running
+            manifest = load_manifest(directory)
+        months = record_months([np.nan if record[1] is None or record[1] == "" else record[1] for record in records],
+                               current_month)
+        segments_before = copy.deepcopy(manifest["segments"])
+        written = [] # (path, size before this append) of every segment written so far
+        try:
+            for month in sorted(set(months)):
+                selected = [records[i] for i in np.flatnonzero(months == month)]
+                entry = manifest["segments"].get(month)
+                if month == current_month or (entry is not None and not entry["closed"]):
+                    entry = manifest["segments"].setdefault(month, _new_entry(month))
+                    _recover_segment(directory, entry) # Never append after a torn record; a no-op unless a write was interrupted
+                    path = os.path.join(directory, entry["file"])
+                    written.append((path, os.path.getsize(path) if os.path.exists(path) else 0))
+                    entry["bytes"] = _write_rows(path, selected)
+                else:
+                    if entry is None:
+                        entry = manifest["segments"][month] = dict(_new_entry(month), file=f"{month}.csv.gz", closed=True)
+                    written.append((os.path.join(directory, entry["file"]), _append_closed(directory, entry, selected)))
+                _extend_range(entry, [record[1] for record in selected])
+                _save_manifest(directory, manifest) # After each segment, so the manifest never lags more than one behind
+        except BaseException:
+            _undo_append(directory, written, segments_before)
+            raise
+        return Appended(months, {month: manifest["segments"][month] for month in set(months)}, before,
+                        signature(directory))
+
+
+def _undo_append(directory, written, segments):
+    """
+    Cuts the segments written by a failed append back to their sizes before it (removing the ones it created)
+    and restores the manifest entries, so no record of the failed append stays in the ledger. Needs the lock.
+    """
+    try:
+        for path, size in written:
+            if size == 0:
+                if os.path.exists(path):
+                    os.remove(path)
+                continue
+            with open(path, "r+b") as f:
+                f.truncate(size)
+                f.flush()
+                os.fsync(f.fileno())
+        manifest = load_manifest(directory)
+        manifest["segments"] = segments
+        _save_manifest(directory, manifest)
+    except OSError as e:
+        print(f"Could not undo a failed ledger append in {directory}: {e}") # Debug print
+
+
+def _append_closed(directory, entry, records):
+    """
+    Adds records to a closed segment, creating it if it does not exist. A gzip file may hold several members,
+    read back as one stream (RFC 1952), so the records are compressed as a new member after a copy of the
+    existing bytes and the copy replaces the file atomically; nothing already stored is decompressed.
+    Segments of older schema versions are converted first, into a member of their own. Returns the offset of
+    the new records' member (0 for a new file), to which the file can be cut back to remove them.
+    """
+    path = os.path.join(directory, entry["file"])
+    version = schema_version(path)
+    header = (",".join(_HEADERS[SCHEMA_VERSION]) + "\n").encode("utf-8")
+    existing = b""
+    if version == SCHEMA_VERSION:
+        with open(path, "rb") as f:
+            existing = f.read()
+        data = _frame(records)
+    elif version == 0:
+        data = header + _frame(records)
+    else:
+        df, epoch = _read_columns(path, version)
+        existing = gzip.compress(header + _frame(_records(df, epoch, range(len(df)))), compresslevel=6)
+        data = _frame(records)
+    temp_file = path + ".tmp"
+    with open(temp_file, "wb") as raw:
+        raw.write(existing)
+        # zlib's default level: about three times faster than gzip's 9 on ledger text, for files under 1% larger
+        with gzip.GzipFile(fileobj=raw, mode="wb", compresslevel=6) as f:
+            f.write(data)
+        raw.flush()
+        os.fsync(raw.fileno())
+    os.replace(temp_file, path)
+    return len(existing)
+
+
+def read_records(path, start, end):
+    """
+    The valid records between byte offsets start and end of an open (version 4) segment, as (username, epoch or
+    None, paisa, type, category) tuples; e.g. the rows appended since an earlier committed size. start must be
+    the beginning of a record.
+    """
+    with open(path, "rb") as f:
+        f.seek(start)
+        good, _bad = _scan_records(f.read(end - start))
+    records = []
+    for line in good:
+        username, timestamp, amount, t_type, category = next(csv.reader([line.decode("utf-8")]))[:5]
+        records.append((username, int(timestamp) if timestamp else None, int(amount), t_type, category))
+    return records
+
+
+def signature(directory=LEDGER_DIR):
+    """
+    A cheap value that changes whenever rows are appended: the manifest's generation, which every save
+    increments (size and mtime alone can repeat when two appends land in one timestamp tick). Keys are saved
+    sorted, so the generation is in the first line after the brace and only the head of the file is read.
+    """
+    try:
+        with open(_manifest_path(directory), "rb") as f:
+            stat = os.fstat(f.fileno())
+            head = f.read(64)
+    except FileNotFoundError:
+        return None
+    match = _GENERATION.search(head)
+    return (directory, stat.st_ino, stat.st_mtime_ns, int(match.group(1)) if match else None)
+
+
+def segment_files(directory=LEDGER_DIR, start=None, end=None):
+    """
+    Paths of the segments that may hold rows with start <= timestamp < end (local datetimes, None = unbounded),
+    in month order. Decided from the manifest alone; segments holding only invalid timestamps are skipped
+    when a bound is given.
+    """
+    start_ts = None if start is None else to_epoch(start)
+    end_ts = None if end is None else to_epoch(end)
+    paths = []
+    for _month_name, entry in sorted(load_manifest(directory)["segments"].items()):
+        if start is not None or end is not None:
+            if entry["min_ts"] is None:
+                continue
+            if (start_ts is not None and entry["max_ts"] < start_ts) or (end_ts is not None and entry["min_ts"] >= end_ts):
+                continue
+        paths.append(os.path.join(directory, entry["file"]))
+    return paths
+
+
+_segment_cache = {} # path -> ((size, mtime_ns), frame); closed segments are rarely rewritten, so entries stay valid
+
+
+def _read_segment(path):
+    stat = os.stat(path)
+    key = (stat.st_size, stat.st_mtime_ns)
+    cached = _segment_cache.get(path)
+    if cached is None or cached[0] != key:
+        cached = _segment_cache[path] = (key, read_file(path))
+    return cached[1]
+
+
+def read(directory=LEDGER_DIR, start=None, end=None):
+    """
+    Returns the ledger rows as one DataFrame with COLUMNS, in segment order. With start/end (local datetimes,
+    end exclusive) only the overlapping segments are read and only rows inside the range are returned.
+    Raises FileNotFoundError if the ledger has not been created.
+    """
+    if not os.path.exists(_manifest_path(directory)):
+        raise FileNotFoundError(f"No ledger found in {directory}/")
+    frames = [_read_segment(path) for path in segment_files(directory, start, end)]
+    if not frames:
+        return pd.DataFrame({"username": pd.Series(dtype=str), "timestamp": pd.Series(dtype="datetime64[ns]"),
+                             "amount": pd.Series(dtype=np.int64), "type": pd.Series(dtype=str),
+                             "category": pd.Series(dtype=str)})
+    df = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+    if start is not None or end is not None:
+        mask = df["timestamp"].notna()
+        if start is not None:
+            mask &= df["timestamp"] >= pd.Timestamp(start)
+        if end is not None:
+            mask &= df["timestamp"] < pd.Timestamp(end)
+        df = df[mask].reset_index(drop=True)
+    return df
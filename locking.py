@@ -0,0 +1,78 @@
+"""
+Cross-process advisory file locks.
+
+Several copies of the app (or batch jobs) may share one data directory. Code that changes shared files takes an
+exclusive lock on a small lock file next to them (fcntl.flock on POSIX, msvcrt.locking on Windows). The locks
+are advisory: they only exclude code that takes the same lock. Readers do not lock; the files they read are
+replaced atomically or written as framed records (see ledger.py).
+
+Locks are re-entrant within a thread, so a locked function may call another function that takes the same lock.
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError: # Windows
+    fcntl = None
+    import msvcrt
+
+LOCK_TIMEOUT = 10.0 # Seconds to wait for another process before giving up
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a lock is still held by someone else after the timeout."""
+
+
+_held = threading.local() # Lock paths held by the current thread
+
+
+def _try_lock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_NBLCK, 1)
+
+
+def _unlock(fd):
+    if fcntl is not None:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
+
+
+@contextmanager
+def file_lock(path, timeout=LOCK_TIMEOUT, poll_interval=0.005):
+    """
+    Holds an exclusive lock on path (created if missing) for the duration of the with block.
+    Raises LockTimeout if the lock cannot be taken within timeout seconds.
+    """
+    path = os.path.abspath(path)
+    held = _held.__dict__.setdefault("paths", set())
+    if path in held:
+        yield # Already held further up this thread's stack
+        return
+
+    fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                _try_lock(fd)
+                break
+            except OSError: # BlockingIOError on POSIX, PermissionError/OSError on Windows
+                if time.monotonic() >= deadline:
+                    raise LockTimeout(f"Timed out after {timeout:.0f}s waiting for {path}") from None
+                time.sleep(poll_interval)
+        held.add(path)
+        try:
+            yield
+        finally:
+            held.discard(path)
+            _unlock(fd)
+    finally:
+        os.close(fd)
@@ -3,113 +3,525 @@ from datetime import datetime, timedelta
 from abc import ABC, abstractmethod
 import matplotlib.pyplot as plt
 import pandas as pd
-from sklearn.linear_model import LinearRegression
 import numpy as np
 import os # Added os for file existence check and renaming
+import warnings
+import threading
+import functools
+import contextvars
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ThreadPoolExecutor
+import userstore
+import ledger
+import kernels
+import engine
+import forecasting
+import buckets
+import rolling
+import anomaly
+from money import PAISA_PER_RUPEE, to_paisa, rupees_to_paisa, to_rupees, format_amount
+
+SAVE_ATTEMPTS = 5 # Conflicting saves are merged and retried this many times before giving up
+
+
+class InvalidMergeError(userstore.ConflictError):
+    """Raised by save_all_clients when another process's changes and ours cannot both apply to an account."""
+
+    def __init__(self, current, reasons):
+        super().__init__(current)
+        self.reasons = reasons # uname -> why the merged account was rejected
+
+    def __str__(self):
+        return "; ".join(f"'{uname}': {reason}" for uname, reason in sorted(self.reasons.items()))
+
+# Function to save all clients to the user snapshot (users.db)
+def save_all_clients(clients, force=False):
+    """
+    Saves client state to the users.db snapshot.
+    Only accounts with unsaved changes are written (every account if force is True), and the write is skipped
+    entirely when nothing is dirty. Returns True if anything was written.
+    If another process saved some of the accounts since they were loaded, its changes are merged into these
+    clients (see _merge_stored) and the save is retried, so neither side's changes are lost.
+    Accounts whose merged state would be invalid are reset to the stored state instead, the others are saved,
+    and InvalidMergeError is raised for the rejected ones.
+    """
+    to_save = list(clients) if force else dirty_clients(clients)
+    if not to_save:
+        return False
+    rejected, reasons = {}, {}
 
-# Function to save all clients to users.txt
-def save_all_clients(clients):
-    """Saves the state of all client objects to users.txt."""
+    try:
+        for attempt in range(SAVE_ATTEMPTS):
+            snapshot = snapshot_clients(to_save, force=True)
+            try:
+                new_versions = save_snapshot(snapshot)
+            except userstore.ConflictError as conflict:
+                print(f"Save conflict (attempt {attempt + 1}): {conflict}") # Debug print
+                invalid = merge_conflict(to_save, conflict)
+                if invalid is not None:
+                    to_save = [client for client in to_save if client.uname not in invalid.reasons]
+                    rejected.update(invalid.current)
+                    reasons.update(invalid.reasons)
+                if not to_save:
+                    raise InvalidMergeError(rejected, reasons)
+                continue
+            finish_save(snapshot, new_versions)
+            # print("Clients saved successfully.") # Debug print
+            if rejected:
+                raise InvalidMergeError(rejected, reasons)
+            return True
+        print(f"Error saving users to {userstore.USER_STORE}: still conflicting after {SAVE_ATTEMPTS} attempts") # Debug print
+        return False
+    except InvalidMergeError:
+        raise
+    except Exception as e:
+        print(f"Error saving users to {userstore.USER_STORE}: {e}") # Debug print
+        return False
+
+
+# The steps of a save, for callers that save from another thread than the one changing the clients (server.py)
+# or write other data in the same transaction (bulk_transfer): snapshot_clients on the changing thread,
+# save_snapshot anywhere, then finish_save or merge_conflict back on it.
+def snapshot_clients(clients, force=False):
+    """
+    The state to save of the clients with unsaved changes (every client if force): a list of (client, change
+    version, users row, recurring rows, stored version, persisted values). Cheap, and taken at one point in time.
+    """
+    to_save = list(clients) if force else dirty_clients(clients)
+    return [(client, client.version, _user_record(client), _recurring_records(client.recurring),
+             client.stored_version, client.persisted_values()) for client in to_save]
+
+
+def save_snapshot(snapshot, before_commit=None):
+    """
+    Writes a snapshot_clients() result to users.db in one write transaction and returns {uname: new version}.
+    before_commit runs inside the transaction (see userstore.save). Raises userstore.ConflictError, writing
+    nothing, if another process saved some of the accounts since they were loaded.
+    """
+    conn = userstore.connect()
+    try:
+        return userstore.save(conn,
+                              [row for _client, _version, row, _recurring, _stored, _values in snapshot],
+                              {row[0]: recurring for _client, _version, row, recurring, _stored, _values in snapshot},
+                              {row[0]: stored for _client, _version, row, _recurring, stored, _values in snapshot},
+                              before_commit)
+    finally:
+        conn.close()
+
+
+def finish_save(snapshot, new_versions):
+    """Records a successful save_snapshot(). Changes made to a client since the snapshot stay unsaved."""
+    for client, version, _row, _recurring, _stored, values in snapshot:
+        client.stored_version = new_versions[client.uname]
+        if client.version == version:
+            client.mark_clean() # Only marked clean once the state is safely on disk
+        else:
+            client.saved_version = version
+            client.stored_values = values # What later changes are merged against
+
+
+def merge_conflict(clients, conflict):
+    """
+    Merges the accounts another process saved (a userstore.ConflictError) into our copies among clients (see
+    _merge_stored). Accounts whose merge would be invalid are reset to the stored state instead; returns an
+    InvalidMergeError for them, or None if every account was merged.
+    """
+    rejected, reasons = {}, {}
+    for client in clients:
+        if client.uname in conflict.current:
+            try:
+                _merge_stored(client, *conflict.current[client.uname])
+            except InvalidMergeError as invalid:
+                # Our changes cannot apply on top of theirs: drop them and keep the stored account
+                _reset_to_stored(client, *conflict.current[client.uname])
+                rejected.update(invalid.current)
+                reasons.update(invalid.reasons)
+    return InvalidMergeError(rejected, reasons) if rejected else None
+
+
+def _merge_stored(client, user_row, recurring_rows):
+    """
+    Rebases a client's unsaved changes onto the account as another process saved it.
+    Balances and totals are merged as deltas (theirs + ours - base), so concurrent deposits and withdrawals all
+    count; the budget and recurring items keep our value if we changed them and take theirs otherwise.
+    Raises InvalidMergeError, leaving the client unchanged, if the merged balance or loans would be negative
+    (e.g. both sides withdrew the whole balance), or if we created the account and another process created the
+    same username first.
+    """
+    base = client.stored_values
+    if base is None:
+        # Nothing to merge against: the account was created by another process under the same username
+        raise InvalidMergeError({client.uname: (user_row, recurring_rows)},
+                                {client.uname: "the username was created by another process"})
+    theirs = _client_from_record(user_row, recurring_rows)
+    base_amount, base_budget, base_total_spent, base_loans, base_recurring = base
+    merged = (theirs.amount + client.amount - base_amount,
+              client.budget if client.budget != base_budget else theirs.budget,
+              theirs.total_spent + client.total_spent - base_total_spent,
+              theirs.loans + client.loans - base_loans,
+              client.recurring if client.recurring != base_recurring else theirs.recurring)
+    problems = [f"{name} would be {format_amount(value)}"
+                for name, value in (("balance", merged[0]), ("loans", merged[3])) if value < 0]
+    if problems:
+        raise InvalidMergeError({client.uname: (user_row, recurring_rows)}, {client.uname: ", ".join(problems)})
+    client.stored_version = theirs.stored_version
+    client.stored_values = theirs.persisted_values()
+    client.amount, client.budget, client.total_spent, client.loans, client.recurring = merged
+    print(f"Merged changes to '{client.uname}' saved by another process (version {theirs.stored_version}).") # Debug print
+
+
+def _reset_to_stored(client, user_row, recurring_rows):
+    """Discards a client's unsaved changes in favour of the account as stored now."""
+    theirs = _client_from_record(user_row, recurring_rows)
+    client.password = theirs.password # Differs only if another process created the same username
+    client.amount, client.budget, client.total_spent, client.loans, client.recurring = theirs.persisted_values()
+    client.stored_version = theirs.stored_version
+    client.mark_clean()
+    print(f"Discarded unsaved changes to '{client.uname}': they conflict with changes saved by another process.") # Debug print
+
+
+# Helper functions mapping clients to userstore records
+def _user_record(client):
+    """Client -> users row (amounts as integer paisa)."""
+    return (client.uname, client.password, client.account_type,
+            int(client.amount), int(client.budget), int(client.total_spent), int(client.loans))
+
+def _recurring_records(recurring):
+    """Recurring tuples -> typed recurring rows, with last_processed as epoch seconds."""
+    return [(int(amount), category, int(freq), last_time.timestamp())
+            for amount, category, freq, last_time in recurring]
+
+def _client_from_record(user_row, recurring_rows):
+    """Rebuilds a clean Client of the stored account type from a users row (with version) and its recurring rows."""
+    uname, password, account_type, amount, budget, total_spent, loans, version = user_row
+    recurring = tuple((amount_, category, freq, datetime.fromtimestamp(last_processed))
+                      for amount_, category, freq, last_processed in recurring_rows)
+    account_cls = ACCOUNT_TYPES.get(account_type, StandardAccount)
+    return account_cls.from_storage(uname, password, amount, budget, total_spent, loans, recurring,
+                                    stored_version=version)
+
+
+# Function to write users.txt (the legacy format) from the current clients
+def export_users_txt(clients, path="users.txt"):
+    """Writes all clients to a users.txt-format CSV (amounts in rupees). Account types are not part of that format."""
     try:
         # Using a temporary file for safer writing
-        temp_file = "users.txt.tmp"
+        temp_file = path + ".tmp"
         with open(temp_file, "w", newline='') as f:
             writer = csv.writer(f)
             # Write header
-            writer.writerow(["username", "password", "amount", "budget", "total_spent", "loans", "recurring"])
+            writer.writerow(USER_COLUMNS)
 
             for client in clients:
-                # Format recurring list into a string: amount|category|freq|last_time;amount2|...
-                # Ensure last_time is formatted as a string
-                recurring_str = ";".join([
-                    f"{item[0]}|{item[1]}|{item[2]}|{item[3].strftime('%Y-%m-%d %H:%M:%S')}"
-                    for item in client.recurring
-                ])
+                # Recurring items that were never decoded are written back verbatim
+                recurring_str = _format_recurring(client.raw_recurring)
                 writer.writerow([
                     client.uname,
                     client.password,
-                    client.amount,
-                    client.budget,
-                    client.total_spent,
-                    client.loans,
+                    format_amount(client.amount),
+                    format_amount(client.budget),
+                    format_amount(client.total_spent),
+                    format_amount(client.loans),
                     recurring_str
                 ])
 
         # Replace the old file with the new one atomically
-        os.replace(temp_file, "users.txt")
-        # print("Clients saved successfully.") # Debug print
+        os.replace(temp_file, path)
+        return f"✅ Users exported to {path}"
     except Exception as e:
-        print(f"Error saving users to file: {e}") # Debug print
+        print(f"Error exporting users to {path}: {e}") # Debug print
+        return f"❌ Error exporting users: {e}"
+
+# Helper function to parse the recurring column of users.txt
+def _parse_recurring(recurring_str):
+    """Parses 'amount|category|freq|last_time;...' (amount in rupees) into a tuple of recurring items (amount in paisa)."""
+    recurring = []
+    if recurring_str:
+        recurring_items = recurring_str.split(";")
+        for item_str in recurring_items:
+            parts = item_str.split("|")
+            if len(parts) == 4:
+                try:
+                    rec_amount = to_paisa(parts[0])
+                    rec_category = parts[1]
+                    rec_freq = int(parts[2])
+                    # Convert timestamp string back to datetime object
+                    rec_last_time = datetime.strptime(parts[3], '%Y-%m-%d %H:%M:%S')
+                    recurring.append((rec_amount, rec_category, rec_freq, rec_last_time))
+                except (ValueError, IndexError):
+                    print(f"Skipping malformed recurring item during load: {item_str}")
+            else:
+                 print(f"Skipping malformed recurring item parts during load: {item_str}")
+    # Most users have no recurring items; share the empty tuple instead of allocating a list each
+    return tuple(recurring)
+
+
+# Helper function to build the recurring column of users.txt
+def _format_recurring(recurring):
+    """Formats recurring items as 'amount|category|freq|last_time;...' with rupee amounts. Raw (still undecoded) strings pass through."""
+    if isinstance(recurring, str):
+        return recurring
+    # Ensure last_time is formatted as a string
+    return ";".join([
+        f"{format_amount(item[0])}|{item[1]}|{item[2]}|{item[3].strftime('%Y-%m-%d %H:%M:%S')}"
+        for item in recurring
+    ])
 
-# Function to load all clients from users.txt
+
+USER_COLUMNS = ["username", "password", "amount", "budget", "total_spent", "loans", "recurring"]
+NUMERIC_USER_COLUMNS = ["amount", "budget", "total_spent", "loans"]
+
+
+# Helper function shared by load_all_clients and ClientTable
+def _read_users_columns(path="users.txt"):
+    """
+    Parses users.txt column-wise: one C-level CSV pass and one vectorised numeric conversion per column.
+    Returns (unames, passwords, {column: int64 paisa array}, recurring strings). Recurring strings are left undecoded.
+    Malformed rows are reported and skipped, as before.
+    """
+    text_dtypes = {name: str for name in USER_COLUMNS if name not in NUMERIC_USER_COLUMNS}
+    # Empty numeric fields (e.g. short rows) become NaN; text columns keep empty strings
+    na_values = {name: [""] for name in NUMERIC_USER_COLUMNS}
+    with warnings.catch_warnings(record=True) as caught:
+        warnings.simplefilter("always", pd.errors.ParserWarning)
+        try:
+            # Fast path: the C parser converts the numeric columns itself
+            df = pd.read_csv(path, dtype={**text_dtypes, **{name: np.float64 for name in NUMERIC_USER_COLUMNS}},
+                             keep_default_na=False, na_values=na_values, on_bad_lines="warn")
+        except ValueError:
+            # Some numeric field holds text; read everything as text and coerce so the bad rows can be reported
+            caught.clear()
+            df = pd.read_csv(path, dtype=str, keep_default_na=False, na_values=na_values, on_bad_lines="warn")
+    for warning in caught:
+        print(f"Skipping malformed row in users.txt (incorrect column count): {str(warning.message).strip().removeprefix('Skipping ')}")
+
+    if list(df.columns[:len(USER_COLUMNS)]) != USER_COLUMNS:
+        raise ValueError(f"Unexpected users.txt header: {list(df.columns)}")
+
+    numeric = {name: pd.to_numeric(df[name], errors="coerce").to_numpy(dtype=np.float64, copy=True) for name in NUMERIC_USER_COLUMNS}
+    valid = np.logical_and.reduce([~np.isnan(column) for column in numeric.values()])
+    if not valid.all():
+        for row in df.loc[~valid, USER_COLUMNS].itertuples(index=False):
+            print(f"Skipping invalid row in users.txt (data conversion error): {['' if pd.isna(v) else v for v in row]}")
+        df = df.loc[valid]
+        numeric = {name: column[valid] for name, column in numeric.items()}
+
+    # users.txt holds rupees; everything in memory is integer paisa
+    numeric = {name: rupees_to_paisa(column) for name, column in numeric.items()}
+    return df["username"].tolist(), df["password"].tolist(), numeric, df["recurring"].tolist()
+
+
+# Function to load all clients
 def load_all_clients():
-    """Loads all client data from users.txt"""
+    """Loads all clients from the users.db snapshot. On first run, imports users.txt into a new snapshot."""
     clients = []
-    if not os.path.exists("users.txt"):
-        print("users.txt not found. Starting with no users.")
-        return clients # Return empty list if file doesn't exist
+    if not userstore.exists():
+        if os.path.exists("users.txt"):
+            return import_users_txt()
+        print("No user data found. Starting with no users.")
+        return clients # Return empty list if neither file exists
 
     try:
-        with open("users.txt", "r") as f:
-            reader = csv.reader(f)
-            header = next(reader) # Skip header row
-
-            for row in reader:
-                # Ensure row has the expected number of columns (at least 7)
-                if len(row) >= 7:
-                    try:
-                        uname, pw, amount_str, budget_str, total_spent_str, loans_str, recurring_str = row
-                        amount = float(amount_str)
-                        budget = float(budget_str)
-                        total_spent = float(total_spent_str)
-                        loans = float(loans_str)
-
-                        # Parse recurring string
-                        recurring = []
-                        if recurring_str:
-                            recurring_items = recurring_str.split(";")
-                            for item_str in recurring_items:
-                                parts = item_str.split("|")
-                                if len(parts) == 4:
-                                    try:
-                                        rec_amount = float(parts[0])
-                                        rec_category = parts[1]
-                                        rec_freq = int(parts[2])
-                                        # Convert timestamp string back to datetime object
-                                        rec_last_time = datetime.strptime(parts[3], '%Y-%m-%d %H:%M:%S')
-                                        recurring.append((rec_amount, rec_category, rec_freq, rec_last_time))
-                                    except (ValueError, IndexError):
-                                        print(f"Skipping malformed recurring item during load: {item_str}")
-                                else:
-                                     print(f"Skipping malformed recurring item parts during load: {item_str}")
-
-
-                        # Assuming StandardAccount for all loaded users for simplicity.
-                        # If account type needs to be preserved, it should be added to the file format.
-                        client = StandardAccount(uname, pw, amount)
-                        client.set_budget(budget) # Use the setter
-                        client.total_spent = total_spent # Load saved state
-                        client.loans = loans           # Load saved state
-                        client.recurring = recurring     # Load saved state
-                        clients.append(client)
-
-                    except ValueError:
-                        print(f"Skipping invalid row in users.txt (data conversion error): {row}")
-                    except IndexError:
-                         print(f"Skipping malformed row in users.txt (too few columns): {row}")
-                    except Exception as e:
-                        print(f"Error processing row in users.txt '{row}': {e}")
-                else:
-                    print(f"Skipping malformed row in users.txt (incorrect column count): {row}")
-
+        conn = userstore.connect()
+        try:
+            user_rows, recurring_by_user = userstore.load_all(conn)
+        finally:
+            conn.close()
+        clients = [_client_from_record(row, recurring_by_user.get(row[0], ())) for row in user_rows]
     except Exception as e:
         print(f"Failed to load users: {e}")
 
     return clients
 
 
+# Function to load a single client by username
+def load_client(username):
+    """Loads one client from the snapshot with a primary-key lookup. Returns None if not found."""
+    if not userstore.exists():
+        return None
+    conn = userstore.connect()
+    try:
+        record = userstore.load_one(conn, username.lower())
+    finally:
+        conn.close()
+    return None if record is None else _client_from_record(*record)
+
+
+# Function to import the legacy users.txt
+def import_users_txt(path="users.txt"):
+    """Loads users.txt and writes every account to the users.db snapshot. Returns the loaded clients."""
+    clients = []
+    try:
+        unames, passwords, numeric, recurring = _read_users_columns(path)
+        # users.txt does not record the account type, so imported accounts are StandardAccount
+        clients = [
+            StandardAccount.from_storage(uname, pw, amount, budget, total_spent, loans, recurring_str)
+            for uname, pw, amount, budget, total_spent, loans, recurring_str in zip(
+                unames, passwords, *(numeric[name].tolist() for name in NUMERIC_USER_COLUMNS), recurring)
+        ]
+    except Exception as e:
+        print(f"Failed to load users from {path}: {e}")
+        return clients
+
+    if save_all_clients(clients, force=True):
+        print(f"Imported {len(clients)} users from {path} into {userstore.USER_STORE}.")
+    return clients
+
+
+# Helper function to get only the clients with unsaved changes
+def dirty_clients(clients):
+    """Returns the clients whose state changed since they were last saved or loaded."""
+    if isinstance(clients, ClientTable):
+        return [clients[row] for row in clients.dirty_rows()] # Vectorised check over the version columns
+    return [client for client in clients if client.is_dirty]
+
+
+_MISSING = object()
+
+
+class _TrackedField:
+    """Descriptor for a persisted Client attribute; assigning a new value marks the client dirty."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.storage_name = "_" + name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj, self.storage_name)
+
+    def __set__(self, obj, value):
+        # Re-assigning the same value is not a change and should not trigger a save
+        if getattr(obj, self.storage_name, _MISSING) != value:
+            obj.before_change()
+            setattr(obj, self.storage_name, value)
+            obj.mark_dirty()
+
+
+class _LazyRecurringField(_TrackedField):
+    """Recurring items are kept as the raw users.txt string until first accessed, then decoded once."""
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        value = getattr(obj, self.storage_name)
+        if isinstance(value, str):
+            # Decoding is not a change, so store directly without marking the client dirty
+            value = _parse_recurring(value)
+            setattr(obj, self.storage_name, value)
+        return value
+
+
+# --- Ledger writes ---
+# By default the rows of an operation are appended (and synced) right away. A caller that batches writes, such
+# as server.py, sets ledger_sink to a list for the duration of an operation and writes the collected rows itself
+# with write_ledger.
+ledger_sink = contextvars.ContextVar("ledger_sink", default=None)
+
+
+def append_to_ledger(rows):
+    """Appends (username, datetime, amount_paisa, type, category) rows to the ledger, or to the active sink."""
+    sink = ledger_sink.get()
+    if sink is None:
+        write_ledger(rows)
+    else:
+        sink.extend(rows)
+
+
+def write_ledger(rows):
+    """
+    Appends rows to the ledger now (ignoring any sink) and adds them to the aggregates kept alongside it: the
+    chart buckets, rolling spend and expense statistics.
+    """
+    with _ledger_lock:
+        appended = ledger.append(rows)
+        _update_buckets(rows, appended.before, appended.after)
+        _update_rolling_spend(rows, appended.before, appended.after)
+        _update_expense_stats(rows, appended.before, appended.after)
+
+
+def write_ledger_records(records, directory=ledger.LEDGER_DIR):
+    """
+    Like write_ledger, for records already in the ledger's form ((username, UTC epoch seconds, paisa, type,
+    category), as ledger.append_records takes them), e.g. a chunk of an imported statement. Returns the
+    ledger.Appended. A caller that holds the ledger's file lock across writes must take ledger_write_lock() first.
+    """
+    with _ledger_lock:
+        appended = ledger.append_records(records, directory)
+        # Local datetimes, as write_ledger rows carry them (converted in one NumPy pass: chunks are large)
+        local = (np.array([record[1] for record in records], dtype=np.int64) + ledger.LOCAL_UTC_OFFSET).astype("datetime64[s]")
+        rows = [(uname, when, amount, t_type, category)
+                for (uname, _epoch, amount, t_type, category), when in zip(records, local.tolist())]
+        _update_buckets(rows, appended.before, appended.after)
+        _update_rolling_spend(rows, appended.before, appended.after)
+        _update_expense_stats(rows, appended.before, appended.after)
+        return appended
+
+
+def ledger_write_lock():
+    """The in-process lock write_ledger holds around the ledger's file lock; taken before it, never after."""
+    return _ledger_lock
+
+
+# --- Account locks ---
+# Client operations may run on background threads (scheduler, batch jobs, an API) as well as the GUI thread.
+# Each account has a re-entrant lock, created on first use. Operations on two accounts take both locks in
+# username order, so two transfers in opposite directions can never wait on each other.
+_account_locks = {}
+_account_locks_guard = threading.Lock()
+
+
+def account_lock(username):
+    """The lock of one account (by username)."""
+    with _account_locks_guard:
+        lock = _account_locks.get(username)
+        if lock is None:
+            lock = _account_locks[username] = threading.RLock()
+        return lock
+
+
+@contextmanager
+def account_locks(*usernames):
+    """Holds the locks of all the given accounts, acquired in sorted username order."""
+    with ExitStack() as stack:
+        for username in sorted(set(usernames)):
+            stack.enter_context(account_lock(username))
+        yield
+
+
+def _with_account_lock(method):
+    """Runs a Client method while holding that account's lock."""
+    @functools.wraps(method)
+    def locked_method(self, *args, **kwargs):
+        with account_lock(self.uname):
+            return method(self, *args, **kwargs)
+    return locked_method
+
+
 class Client(ABC):
+    # __slots__ keeps per-account memory small for very large user tables (no per-instance __dict__)
+    # Persisted values live in the underscore slots; the public names are _TrackedField descriptors
+    __slots__ = ("uname", "password", "_amount", "_total_spent", "_budget", "_loans", "_recurring",
+                 "version", "saved_version", "stored_version", "stored_values")
+    account_type = "standard"
+
+    # Persisted attributes; every assignment goes through _TrackedField so changes bump the version
+    # All amounts are integer paisa (see money.py); they are only converted to rupees for display
+    amount = _TrackedField()
+    total_spent = _TrackedField()
+    budget = _TrackedField()
+    loans = _TrackedField()
+    recurring = _LazyRecurringField()
+
     def __init__(self, username, password, amount):
+        # amount is the opening balance in paisa
+        # version counts changes; saved_version is the version last written to (or read from) storage
+        self.version = 0
+        self.saved_version = 0
+        # stored_version is the users.db row version this state is based on (0 until first saved)
+        self.stored_version = 0
+        self.stored_values = None
         self.uname = username.lower()
         self.password = str(password)  # No hashing for simplicity - Consider adding hashing in production
         self.amount = amount
@@ -117,27 +529,79 @@ class Client(ABC):
         self.total_spent = 0
         self.budget = 0
         self.loans = 0
-        self.recurring = []  # list of (amount, category, frequency_days, last_processed_datetime)
+        self.recurring = ()  # tuple of (amount_paisa, category, frequency_days, last_processed_datetime)
+
+    @classmethod
+    def from_storage(cls, username, password, amount, budget, total_spent, loans, recurring, stored_version=0):
+        """
+        Rebuilds a clean client from persisted values without going through the tracked setters.
+        recurring may be the raw users.txt string; it is decoded on first access. stored_version is the
+        users.db row version (0 for accounts not yet in users.db).
+        """
+        client = cls.__new__(cls)
+        client.uname = username.lower()
+        client.password = str(password)
+        client._amount = amount
+        client._budget = budget
+        client._total_spent = total_spent
+        client._loans = loans
+        client._recurring = recurring if recurring else ()
+        client.version = 0
+        client.saved_version = 0
+        client.stored_version = stored_version
+        client.stored_values = None
+        return client
+
+    @property
+    def raw_recurring(self):
+        """The stored recurring value without decoding it: a raw users.txt string or a tuple of items."""
+        return self._recurring
+
+    @property
+    def is_dirty(self):
+        """True if the client has changes that have not been persisted yet."""
+        return self.version != self.saved_version
+
+    def mark_dirty(self):
+        """Records a change. Call this after changing persisted state without assigning a tracked attribute."""
+        self.version += 1
+
+    def mark_clean(self):
+        """Records that the current state has been persisted."""
+        self.saved_version = self.version
+        self.stored_values = None
+
+    def persisted_values(self):
+        """The values merged when another process saved the account concurrently (see _merge_stored)."""
+        return (self.amount, self.budget, self.total_spent, self.loans, self.recurring)
+
+    def before_change(self):
+        """Called before a persisted value changes: remembers the stored values the unsaved changes start from."""
+        if self.stored_values is None and self.stored_version and not self.is_dirty:
+            self.stored_values = self.persisted_values()
 
     def validate_pass(self, password):
         return self.password == str(password)
 
+    @_with_account_lock
     def set_budget(self, budget):
         if budget >= 0:
             self.budget = budget
             # Saving will be handled by the calling GUI function
-            return f"✅ Budget set to {budget:.2f}" # Added return for GUI feedback, format budget
+            return f"✅ Budget set to {format_amount(budget)}" # Added return for GUI feedback, format budget
         else:
             return "❌ Budget cannot be negative." # Added error return
 
+    @_with_account_lock
     def add_income(self, amount):
         if amount <= 0:
             return "❌ Invalid income amount. Amount must be positive."
         self.amount += amount
         self.log_transaction(amount, "Income", "General")
         # Saving will be handled by the calling GUI function
-        return f"✅ Income of {amount:.2f} added. Current Balance: {self.amount:.2f}" # Format amounts
+        return f"✅ Income of {format_amount(amount)} added. Current Balance: {format_amount(self.amount)}" # Format amounts
 
+    @_with_account_lock
     def withdraw(self, amount, category):
         if amount <= 0:
             return "❌ Invalid expense amount. Amount must be positive."
@@ -148,6 +612,9 @@ class Client(ABC):
         if self.budget > 0 and (self.total_spent + amount) > self.budget:
              budget_alert = True
 
+        # Scored against this category's history before the expense is added to it
+        unusual = self._unusual_expense_note(amount, category)
+
         self.amount -= amount
         self.total_spent += amount
         self.log_transaction(amount, "Expense", category)
@@ -155,33 +622,54 @@ class Client(ABC):
         # Saving will be handled by the calling GUI function
 
         if budget_alert:
-             return f"⚠️ Withdrawn: {amount:.2f} in category '{category}'. You are now over budget! Remaining Balance: {self.amount:.2f}"
+             return f"⚠️ Withdrawn: {format_amount(amount)} in category '{category}'. You are now over budget! Remaining Balance: {format_amount(self.amount)}{unusual}"
         else:
-             return f"✅ Withdrawn: {amount:.2f} in category '{category}'. Remaining Balance: {self.amount:.2f}" # Format amounts
+             return f"✅ Withdrawn: {format_amount(amount)} in category '{category}'. Remaining Balance: {format_amount(self.amount)}{unusual}" # Format amounts
+
+    def _unusual_expense_note(self, amount, category):
+        """A sentence for the withdraw message if the expense is unusually large for its category, else ""."""
+        try:
+            score = score_expense(self.uname, category, amount)
+        except Exception as e:
+            print(f"Error scoring expense for user {self.uname}: {e}") # Debug print
+            return ""
+        if score is None or score[0] < anomaly.Z_THRESHOLD:
+            return ""
+        z, mean = score
+        return f" ⚠️ Unusual for '{category}': {z:.1f} standard deviations above your average of {format_amount(round(mean))}."
 
     def transfer(self, receiver, amount):
         if amount <= 0:
             return "❌ Invalid transfer amount. Amount must be positive."
-        if self.amount < amount:
-            return "❌ Insufficient funds for transfer."
         # Prevent transfer to self handled in GUI
 
-        self.amount -= amount
-        receiver.amount += amount
-        self.log_transaction(amount, "Transfer Out", receiver.uname)
-        receiver.log_transaction(amount, "Transfer In", self.uname)
+        with account_locks(self.uname, receiver.uname):
+            # Checked under both locks, so no other thread can spend the funds in between
+            if self.amount < amount:
+                return "❌ Insufficient funds for transfer."
+            # Both rows go to the ledger in one write before any balance changes, so a failed write moves no money
+            now = datetime.now()
+            try:
+                append_to_ledger([(self.uname, now, amount, "Transfer Out", receiver.uname),
+                               (receiver.uname, now, amount, "Transfer In", self.uname)])
+            except Exception as e:
+                print(f"Error logging transfer from {self.uname} to {receiver.uname}: {e}") # Debug print
+                return f"❌ Transfer failed: could not record it in the ledger ({e})."
+            self.amount -= amount
+            receiver.amount += amount
 
         # Saving will be handled by the calling GUI function for both sender and receiver state
 
-        return f"✅ Transferred {amount:.2f} to {receiver.uname}. Remaining Balance: {self.amount:.2f}" # Format amounts
+        return f"✅ Transferred {format_amount(amount)} to {receiver.uname}. Remaining Balance: {format_amount(self.amount)}" # Format amounts
 
+    @_with_account_lock
     def request_loan(self, amount):
         if amount <= 0:
             return "❌ Invalid loan amount. Amount must be positive."
         # Added simple eligibility checks
-        if self.amount < 100 and self.loans == 0: # Check minimum balance only if no existing loan
+        if self.amount < 100 * PAISA_PER_RUPEE and self.loans == 0: # Check minimum balance only if no existing loan
              return "❌ Not eligible for loan. Maintain a minimum balance of PKR 100."
-        if self.loans > 0 and amount > self.loans * 2 and self.loans > 500: # Prevent excessive new loans if one exists and is substantial
+        if self.loans > 0 and amount > self.loans * 2 and self.loans > 500 * PAISA_PER_RUPEE: # Prevent excessive new loans if one exists and is substantial
              return "❌ Cannot take a new loan more than double your current outstanding loan."
 
 
@@ -191,8 +679,9 @@ class Client(ABC):
 
         # Saving will be handled by the calling GUI function
 
-        return f"✅ Loan of {amount:.2f} approved. Current Outstanding Loan: {self.loans:.2f}" # Format amounts
+        return f"✅ Loan of {format_amount(amount)} approved. Current Outstanding Loan: {format_amount(self.loans)}" # Format amounts
 
+    @_with_account_lock
     def repay_loan(self, amount):
         if amount <= 0:
             return "❌ Invalid repayment amount. Amount must be positive."
@@ -200,7 +689,7 @@ class Client(ABC):
             return "❌ Insufficient funds."
         if amount > self.loans:
             # Allow repaying less than the outstanding loan, but not more
-            return f"❌ Cannot repay more than the outstanding loan amount ({self.loans:.2f})."
+            return f"❌ Cannot repay more than the outstanding loan amount ({format_amount(self.loans)})."
 
         self.amount -= amount
         self.loans -= amount
@@ -208,18 +697,21 @@ class Client(ABC):
 
         # Saving will be handled by the calling GUI function
 
-        return f"✅ Repaid {amount:.2f} towards loan. Remaining Loan: {self.loans:.2f}" # Format amounts
+        return f"✅ Repaid {format_amount(amount)} towards loan. Remaining Loan: {format_amount(self.loans)}" # Format amounts
 
 
+    @_with_account_lock
     def schedule_recurring(self, amount, category, frequency_days):
         if amount <= 0 or frequency_days <= 0:
             return "❌ Invalid amount or frequency for recurring expense. Both must be positive."
         # Store amount, category, frequency, and the datetime it was scheduled or last processed
-        self.recurring.append((amount, category, frequency_days, datetime.now()))
+        # Assign a new tuple (rather than mutating in place) so the change is tracked
+        self.recurring = (*self.recurring, (amount, category, frequency_days, datetime.now()))
         # Saving will be handled by the calling GUI function
-        return f"✅ Recurring expense of {amount:.2f} '{category}' scheduled every {frequency_days} days." # Format amount
+        return f"✅ Recurring expense of {format_amount(amount)} '{category}' scheduled every {frequency_days} days." # Format amount
 
 
+    @_with_account_lock
     def process_recurring(self):
         """Processes overdue recurring transactions and logs them. Updates recurring list."""
         # This method modifies self.amount, self.total_spent, and self.recurring
@@ -248,12 +740,12 @@ class Client(ABC):
                          self.amount -= amount
                          self.total_spent += amount
                          # Collect transaction details to log later
-                         log_entries.append((self.uname, occurrence_time.strftime("%Y-%m-%d %H:%M:%S"), amount, "Recurring Expense", category))
+                         log_entries.append((self.uname, occurrence_time, amount, "Recurring Expense", category))
                          processed_count += 1
                      else:
-                         print(f"Warning: Insufficient funds ({self.amount:.2f}) for recurring expense {amount:.2f} '{category}'. Skipping this occurrence.")
+                         print(f"Warning: Insufficient funds ({format_amount(self.amount)}) for recurring expense {format_amount(amount)} '{category}'. Skipping this occurrence.")
                          # Optionally log failed recurring transaction
-                         log_entries.append((self.uname, occurrence_time.strftime("%Y-%m-%d %H:%M:%S"), amount, "Recurring Expense Failed", category)) # Log failure
+                         log_entries.append((self.uname, occurrence_time, amount, "Recurring Expense Failed", category)) # Log failure
 
                 # Update last_time for the next cycle based on the last processed occurrence
                 last_processed_date = last_time + timedelta(days=num_occurrences * freq)
@@ -262,14 +754,12 @@ class Client(ABC):
                 # Not overdue, keep the item as is
                 new_list.append((amount, category, freq, last_time))
 
-        self.recurring = new_list # Update the recurring list
+        self.recurring = tuple(new_list) # Update the recurring items
 
         # Log all processed transactions for this user at once
         if log_entries:
             try:
-                with open("transactions.csv", "a", newline='') as file:
-                    writer = csv.writer(file)
-                    writer.writerows(log_entries)
+                append_to_ledger(log_entries)
                 print(f"Logged {len(log_entries)} recurring transaction occurrences for {self.uname}.") # Debug print
             except Exception as e:
                  print(f"Error logging recurring transactions for user {self.uname}: {e}") # Debug print
@@ -294,26 +784,21 @@ class Client(ABC):
     # Removed the old save_to_file method from the class
 
     def log_transaction(self, amount, t_type, category):
-        """Logs a single transaction to transactions.csv."""
+        """Logs a single transaction (amount in paisa) to transactions.csv."""
         try:
-            with open("transactions.csv", "a", newline='') as file:
-                writer = csv.writer(file)
-                writer.writerow([
-                    self.uname,
-                    datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    amount,
-                    t_type,
-                    category
-                ])
+            append_to_ledger([(self.uname, datetime.now(), amount, t_type, category)])
         except Exception as e:
             print(f"Error logging transaction for user {self.uname} ({t_type}): {e}") # Debug print
 
 
 class StandardAccount(Client):
     # Inherits all methods from Client. Specific overrides for restrictions.
-    pass
+    __slots__ = ()
 
 class ChildAccount(Client):
+    __slots__ = ()
+    account_type = "child"
+
     # Override restricted methods
     def request_loan(self, amount):
         return "❌ Loan not available for child accounts."
@@ -324,10 +809,290 @@ class ChildAccount(Client):
     # Child accounts can set budget and have expenses/income, no specific overrides needed unless restrictions apply
 
 
+# Account type name -> class, used when rebuilding clients from storage
+ACCOUNT_TYPES = {"standard": StandardAccount, "child": ChildAccount}
+
+
+class _ColumnField:
+    """Descriptor for a table-backed Client attribute stored in a ClientTable NumPy column."""
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, obj, objtype=None):
+        if obj is None:
+            return self
+        return getattr(obj._table, self.name)[obj._row]
+
+    def __set__(self, obj, value):
+        column = getattr(obj._table, self.name)
+        if column[obj._row] != value:
+            obj.before_change()
+            column[obj._row] = value
+            obj.mark_dirty()
+
+
+class _TableClient:
+    """Mixin with the shared accessors of ClientTable views. Views hold only (table, row)."""
+    __slots__ = ()
+
+    amount = _ColumnField()
+    total_spent = _ColumnField()
+    budget = _ColumnField()
+    loans = _ColumnField()
+
+    def __init__(self, table, row):
+        self._table = table
+        self._row = row
+
+    @property
+    def uname(self):
+        return self._table.unames[self._row]
+
+    @property
+    def password(self):
+        return self._table.passwords[self._row]
+
+    @property
+    def recurring(self):
+        # Stored sparsely: only rows that actually have recurring items take up space
+        value = self._table.recurring.get(self._row, ())
+        if isinstance(value, str):
+            value = _parse_recurring(value) # Decode lazily, once
+            self._table.recurring[self._row] = value
+        return value
+
+    @property
+    def raw_recurring(self):
+        return self._table.recurring.get(self._row, ())
+
+    @recurring.setter
+    def recurring(self, value):
+        if self.recurring != value:
+            self.before_change()
+            if value:
+                self._table.recurring[self._row] = tuple(value)
+            else:
+                self._table.recurring.pop(self._row, None)
+            self.mark_dirty()
+
+    @property
+    def version(self):
+        return int(self._table.versions[self._row])
+
+    @version.setter
+    def version(self, value):
+        self._table.versions[self._row] = value
+
+    @property
+    def saved_version(self):
+        return int(self._table.saved_versions[self._row])
+
+    @saved_version.setter
+    def saved_version(self, value):
+        self._table.saved_versions[self._row] = value
+
+    @property
+    def stored_version(self):
+        return int(self._table.stored_versions[self._row])
+
+    @stored_version.setter
+    def stored_version(self, value):
+        self._table.stored_versions[self._row] = value
+
+    @property
+    def stored_values(self):
+        return self._table.stored_values.get(self._row)
+
+    @stored_values.setter
+    def stored_values(self, value):
+        # Sparse like recurring: only rows with unsaved changes to merge hold an entry
+        if value is None:
+            self._table.stored_values.pop(self._row, None)
+        else:
+            self._table.stored_values[self._row] = value
+
+    def __eq__(self, other):
+        # Two views of the same table row are the same account
+        if isinstance(other, _TableClient):
+            return self._table is other._table and self._row == other._row
+        return NotImplemented
+
+    def __hash__(self):
+        return hash((id(self._table), self._row))
+
+
+class StandardAccountView(_TableClient, StandardAccount):
+    __slots__ = ("_table", "_row")
+
+
+class ChildAccountView(_TableClient, ChildAccount):
+    __slots__ = ("_table", "_row")
+
+
+class ClientTable:
+    """
+    Struct-of-arrays store for very large user tables.
+    Numeric fields live in NumPy columns (int64 paisa for amounts); indexing returns lightweight Client views with the usual methods,
+    so a ClientTable can be passed anywhere a list of clients is expected.
+    """
+    _KINDS = ("standard", "child")
+    _VIEW_CLASSES = (StandardAccountView, ChildAccountView)
+
+    def __init__(self, capacity=0):
+        self._size = 0
+        self.unames = []
+        self.passwords = []
+        self.recurring = {}  # row -> tuple of recurring items, only for rows that have any
+        self.stored_values = {}  # row -> values before the unsaved changes, only for rows that have them
+        self._index = {}     # uname -> row, makes lookups O(1)
+        self.kinds = np.zeros(capacity, dtype=np.uint8)
+        self.amount = np.zeros(capacity, dtype=np.int64) # paisa
+        self.budget = np.zeros(capacity, dtype=np.int64)
+        self.total_spent = np.zeros(capacity, dtype=np.int64)
+        self.loans = np.zeros(capacity, dtype=np.int64)
+        self.versions = np.zeros(capacity, dtype=np.int64)
+        self.saved_versions = np.zeros(capacity, dtype=np.int64)
+        self.stored_versions = np.zeros(capacity, dtype=np.int64) # users.db row versions
+
+    @classmethod
+    def from_clients(cls, clients):
+        """Builds a table from existing Client objects."""
+        table = cls(capacity=len(clients))
+        for client in clients:
+            table.append(client)
+        return table
+
+    @classmethod
+    def from_users_file(cls, path="users.txt"):
+        """Loads users.txt straight into columns without creating a Client object per row."""
+        table = cls()
+        if not os.path.exists(path):
+            print(f"{path} not found. Starting with no users.")
+            return table
+
+        try:
+            unames, passwords, numeric, recurring = _read_users_columns(path)
+        except Exception as e:
+            print(f"Failed to load users: {e}")
+            return table
+
+        unames = [uname.lower() for uname in unames]
+        table._size = len(unames)
+        table.unames = unames
+        table.passwords = passwords
+        table.recurring = {row: value for row, value in enumerate(recurring) if value} # Raw strings, decoded on access
+        table._index = {uname: row for row, uname in enumerate(unames)}
+        table.kinds = np.zeros(table._size, dtype=np.uint8)  # users.txt does not record the account type
+        table.amount, table.budget, table.total_spent, table.loans = (numeric[name] for name in NUMERIC_USER_COLUMNS)
+        table.versions = np.zeros(table._size, dtype=np.int64)
+        table.saved_versions = np.zeros(table._size, dtype=np.int64)
+        table.stored_versions = np.zeros(table._size, dtype=np.int64) # Not in users.db yet
+        return table
+
+    @classmethod
+    def from_snapshot(cls, path=userstore.USER_STORE):
+        """Loads the users.db snapshot straight into columns, keeping each account's type."""
+        table = cls()
+        if not userstore.exists(path):
+            return table
+        conn = userstore.connect(path)
+        try:
+            user_rows, recurring_by_user = userstore.load_all(conn)
+        finally:
+            conn.close()
+        if not user_rows:
+            return table
+
+        unames, passwords, account_types, amount, budget, total_spent, loans, versions = zip(*user_rows)
+        table._size = len(unames)
+        table.unames = list(unames)
+        table.passwords = list(passwords)
+        table._index = {uname: row for row, uname in enumerate(unames)}
+        table.kinds = np.array([cls._KINDS.index(t) if t in cls._KINDS else 0 for t in account_types], dtype=np.uint8)
+        table.amount, table.budget, table.total_spent, table.loans = (
+            np.array(column, dtype=np.int64) for column in (amount, budget, total_spent, loans))
+        table.recurring = {
+            table._index[uname]: tuple((a, c, f, datetime.fromtimestamp(t)) for a, c, f, t in items)
+            for uname, items in recurring_by_user.items() if uname in table._index}
+        table.versions = np.zeros(table._size, dtype=np.int64)
+        table.saved_versions = np.zeros(table._size, dtype=np.int64)
+        table.stored_versions = np.array(versions, dtype=np.int64)
+        return table
+
+    def _grow(self, min_capacity):
+        """Doubles the column capacity so repeated appends stay amortised O(1)."""
+        new_capacity = max(min_capacity, 2 * len(self.amount), 16)
+        for name in ("kinds", "amount", "budget", "total_spent", "loans", "versions", "saved_versions", "stored_versions"):
+            old = getattr(self, name)
+            new = np.zeros(new_capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, name, new)
+
+    def append(self, client):
+        """Copies a Client into a new row. The row keeps the client's dirty state."""
+        if client.uname in self._index:
+            raise ValueError(f"Username '{client.uname}' already exists in the table.")
+        row = self._size
+        if row >= len(self.amount):
+            self._grow(row + 1)
+        self._size += 1
+        self.unames.append(client.uname)
+        self.passwords.append(client.password)
+        self._index[client.uname] = row
+        self.kinds[row] = self._KINDS.index(client.account_type)
+        self.amount[row] = client.amount
+        self.budget[row] = client.budget
+        self.total_spent[row] = client.total_spent
+        self.loans[row] = client.loans
+        if client.raw_recurring:
+            self.recurring[row] = client.raw_recurring
+        self.versions[row] = client.version
+        self.saved_versions[row] = client.saved_version
+        self.stored_versions[row] = client.stored_version
+        if client.stored_values is not None:
+            self.stored_values[row] = client.stored_values
+
+    def dirty_rows(self):
+        """Row numbers of accounts with unsaved changes."""
+        n = self._size
+        return np.flatnonzero(self.versions[:n] != self.saved_versions[:n]).tolist()
+
+    def find(self, username):
+        """O(1) lookup of a view by username (case-insensitive). Returns None if not found."""
+        row = self._index.get(username.lower())
+        return None if row is None else self[row]
+
+    def index(self, client):
+        """Row of the given client, matching list.index semantics."""
+        row = self._index.get(client.uname)
+        if row is None:
+            raise ValueError(f"{client.uname} is not in the table")
+        return row
+
+    def __len__(self):
+        return self._size
+
+    def __getitem__(self, row):
+        if row < 0:
+            row += self._size
+        if not 0 <= row < self._size:
+            raise IndexError("ClientTable index out of range")
+        return self._VIEW_CLASSES[self.kinds[row]](self, row)
+
+    def __iter__(self):
+        for row in range(self._size):
+            yield self[row]
+
+
 # Moved functions that operate on the list of clients or files outside the class
 
-def create_client(clients, username, password, initial_amount, account_type="standard"):
-    """Creates a new client, adds them to the clients list, and saves all clients."""
+def create_client(clients, username, password, initial_amount, account_type="standard", save=True):
+    """
+    Creates a new client, adds them to the clients list, and saves the new account. If it cannot be saved, the
+    account is not created; if another process created the same username first, the list holds that account.
+    With save=False the new account is only added to the list, for a caller that saves it itself.
+    """
     # Basic input validation
     if not username or not password:
         return "❌ Username and password cannot be empty."
@@ -347,8 +1112,17 @@ def create_client(clients, username, password, initial_amount, account_type="sta
     # Add the new client to the in-memory list
     clients.append(new_client)
 
-    # Save the entire list of clients to persist the new user
-    save_all_clients(clients)
+    if not save:
+        return f"✅ Account '{username}' created successfully!"
+    # Save only the new account; other accounts' changes are saved by whoever made them
+    try:
+        saved = save_all_clients([new_client])
+    except InvalidMergeError:
+        # Reset to the account the other process stored, which the list now holds instead of ours
+        return "❌ Username already exists."
+    if not saved:
+        clients.remove(new_client)
+        return f"❌ Account '{username}' could not be saved. Please try again."
 
     return f"✅ Account '{username}' created successfully!"
 
@@ -365,46 +1139,519 @@ def validate(clients, name, password):
 # Helper function to find a client by username
 def find_client_by_username(clients, username):
     """Finds a client object in the list by username (case-insensitive)."""
+    if isinstance(clients, ClientTable):
+        return clients.find(username) # O(1) index lookup instead of a scan
     for client in clients:
         if client.uname == username.lower():
             return client
     return None
 
 
+# Function to apply many transfers at once (payroll, bulk payments)
+def bulk_transfer(clients, transfers, save=True):
+    """
+    Applies a batch of (sender_username, receiver_username, amount_paisa) transfers all-or-nothing.
+    Every item is validated first. Funds are checked per sender against the net effect of the whole batch
+    (money received within the batch counts), so the order of the items does not matter. If any item fails,
+    nothing is applied. Otherwise the ledger rows of all items are written in one append. If save is True, the
+    changed accounts are saved in the same users.db transaction (the rows are written directly, ignoring any
+    ledger sink), so the batch is stored whole or not at all. An account another process changed in a way the
+    batch cannot be merged with fails the items that touch it, like missing funds, and nothing is applied.
+    Returns (message, failures), where failures is a list of (item index, reason) for every rejected item.
+    """
+    if not transfers:
+        return "❌ No transfers given.", []
+    if isinstance(clients, ClientTable):
+        find = clients.find
+    else:
+        by_name = {client.uname: client for client in clients} # One pass instead of a scan per item
+        find = lambda username: by_name.get(str(username).lower())
+
+    failures = []
+    accounts = {} # uname -> client, for every account in a valid item
+    items = []
+    for index, (sender_name, receiver_name, amount) in enumerate(transfers):
+        sender, receiver = find(sender_name), find(receiver_name)
+        if sender is None:
+            failures.append((index, f"Unknown sender '{sender_name}'."))
+        elif receiver is None:
+            failures.append((index, f"Unknown receiver '{receiver_name}'."))
+        elif sender.uname == receiver.uname:
+            failures.append((index, "Sender and receiver are the same account."))
+        elif isinstance(sender, ChildAccount):
+            failures.append((index, f"Transfers not allowed for child account '{sender.uname}'."))
+        elif isinstance(amount, bool) or not isinstance(amount, (int, np.integer)) or amount <= 0:
+            failures.append((index, f"Invalid amount {amount!r}: must be a positive whole number of paisa."))
+        else:
+            accounts[sender.uname] = sender
+            accounts[receiver.uname] = receiver
+            items.append((index, sender, receiver, int(amount)))
+
+    with account_locks(*accounts):
+        # Funds are checked under the locks, so no other thread can spend them before the batch is applied
+        net = dict.fromkeys(accounts, 0)
+        for _index, sender, receiver, amount in items:
+            net[sender.uname] -= amount
+            net[receiver.uname] += amount
+        for index, sender, _receiver, _amount in items:
+            shortfall = -(sender.amount + net[sender.uname])
+            if shortfall > 0:
+                failures.append((index, f"Insufficient funds: '{sender.uname}' would be short by {format_amount(shortfall)}."))
+        if failures:
+            failures.sort()
+            return (f"❌ Bulk transfer rejected: {len(failures)} of {len(transfers)} item(s) failed. Nothing was applied.",
+                    failures)
+
+        now = datetime.now()
+        rows = []
+        for _index, sender, receiver, amount in items:
+            rows.append((sender.uname, now, amount, "Transfer Out", receiver.uname))
+            rows.append((receiver.uname, now, amount, "Transfer In", sender.uname))
+        total = sum(amount for _index, _sender, _receiver, amount in items)
+        applied = f"Applied {len(items)} transfers totalling {format_amount(total)} between {len(accounts)} accounts."
+        if not save:
+            try:
+                append_to_ledger(rows)
+            except Exception as e:
+                print(f"Error logging bulk transfer: {e}") # Debug print
+                return f"❌ Bulk transfer failed: could not record it in the ledger ({e}). Nothing was applied.", []
+            _apply_deltas(accounts, net)
+            return f"✅ {applied}", []
+
+        _apply_deltas(accounts, net)
+        written = []
+
+        def append_rows():
+            write_ledger(rows)
+            written.append(True)
+
+        to_save = dirty_clients(accounts.values())
+        for attempt in range(SAVE_ATTEMPTS):
+            snapshot = snapshot_clients(to_save)
+            try:
+                new_versions = save_snapshot(snapshot, append_rows)
+            except userstore.ConflictError as conflict:
+                print(f"Save conflict (attempt {attempt + 1}): {conflict}") # Debug print
+                invalid = merge_conflict(to_save, conflict)
+                if invalid is None:
+                    continue
+                # Those accounts now hold what the other process saved; take the batch back out of the others
+                _apply_deltas(accounts, net, sign=-1, skip=invalid.reasons)
+                failures = []
+                for index, sender, receiver, _amount in items:
+                    reasons = [f"'{uname}' was changed by another process: {invalid.reasons[uname]}"
+                               for uname in (sender.uname, receiver.uname) if uname in invalid.reasons]
+                    if reasons:
+                        failures.append((index, "; ".join(reasons)))
+                return (f"❌ Bulk transfer rejected: {len(failures)} of {len(transfers)} item(s) failed. Nothing was applied.",
+                        failures)
+            except Exception as e:
+                print(f"Error saving bulk transfer: {e}") # Debug print
+                if written:
+                    # The rows are in the ledger, so the balances stay changed and are saved with the next save
+                    return f"⚠️ {applied} The accounts could not be saved yet ({e}); they are saved with the next change.", []
+                _apply_deltas(accounts, net, sign=-1)
+                return f"❌ Bulk transfer failed: could not save it ({e}). Nothing was applied.", []
+            finish_save(snapshot, new_versions)
+            return f"✅ {applied}", []
+        _apply_deltas(accounts, net, sign=-1)
+        return f"❌ Bulk transfer failed: the accounts were still being changed elsewhere after {SAVE_ATTEMPTS} attempts. Nothing was applied.", []
+
+
+def _apply_deltas(accounts, net, sign=1, skip=()):
+    """Adds (or with sign -1 takes back) a bulk transfer's net change to each account, one update per account."""
+    for uname, delta in net.items():
+        if delta and uname not in skip:
+            accounts[uname].amount += sign * delta
+
+
+# --- Ledger cache ---
+# A user's rows are read once and kept until rows are appended (detected by the manifest's generation), so
+# views can page, sort and filter a user's history without re-reading any file. With Polars or pyarrow
+# (engine.py) only that user's rows are scanned; with pandas the whole ledger is parsed once and cached.
+LEDGER_DIR = ledger.LEDGER_DIR
+LEDGER_TIMESTAMP_FORMAT = ledger.TIMESTAMP_FORMAT
+_ledger_cache = {"key": None, "frame": None, "users_key": None, "users": {}, "arrays_key": None, "arrays": {}}
+_ledger_lock = threading.RLock() # The cache is also filled from the analytics prefetch worker
+LEDGER_ENGINE = engine.default_engine() # Reads the per-user rows and the cross-user aggregates (engine.py)
+
+
+def ensure_ledger(path=LEDGER_DIR):
+    """Creates the ledger (importing a legacy transactions.csv on first run) and closes finished months."""
+    try:
+        ledger.ensure(path)
+    except Exception as e:
+        print(f"Error preparing the ledger in {path}: {e}") # Debug print
+
+
+def ledger_signature(path=LEDGER_DIR):
+    """A cheap value that changes whenever the ledger changes (None if it does not exist)."""
+    return ledger.signature(path)
+
+
+def read_ledger(path=LEDGER_DIR, start=None, end=None):
+    """
+    Returns the ledger as a DataFrame with parsed timestamps (NaT if invalid), int64 paisa amounts and string
+    categories. The whole ledger is re-read only if it changed since the last call.
+    With start/end (local datetimes, end exclusive) only the monthly segments overlapping that range are read,
+    and only rows inside it are returned. Raises FileNotFoundError if there is no ledger.
+    """
+    with _ledger_lock:
+        if start is not None or end is not None:
+            return ledger.read(path, start, end) # Closed segments are cached by ledger.py
+        key = ledger.signature(path)
+        if key is None:
+            raise FileNotFoundError(f"No ledger found in {path}/")
+        if _ledger_cache["key"] != key:
+            df = ledger.read(path)
+            _ledger_cache.update(key=key, frame=df, users={})
+        return _ledger_cache["frame"]
+
+
+def ledger_rows(path=LEDGER_DIR, start=None, end=None, types=None):
+    """
+    Every user's ledger rows, optionally only start <= timestamp < end and the given transaction types, for
+    the aggregates kept across users. Polars or pyarrow scan just those rows; with pandas they are picked from
+    the cached ledger. Raises FileNotFoundError if there is no ledger.
+    """
+    if LEDGER_ENGINE != "pandas":
+        return engine.rows_frame(start, end, types, path, LEDGER_ENGINE)
+    df = read_ledger(path, start, end)
+    return df if types is None else df[df["type"].isin(types)].reset_index(drop=True)
+
+
+def user_transactions(username, path=LEDGER_DIR, start=None, end=None):
+    """
+    Returns one user's ledger rows in file order (optionally only start <= timestamp < end), cached until the
+    ledger changes. With Polars or pyarrow only this user's rows are scanned, with the date range pushed down.
+    """
+    uname = username.lower()
+    with _ledger_lock:
+        if LEDGER_ENGINE != "pandas":
+            if start is not None or end is not None:
+                return engine.user_frame(uname, start, end, path, LEDGER_ENGINE)
+            key = ledger.signature(path)
+            if _ledger_cache["users_key"] != key:
+                _ledger_cache.update(users_key=key, users={})
+            users = _ledger_cache["users"]
+            if uname not in users:
+                users[uname] = engine.user_frame(uname, directory=path, engine=LEDGER_ENGINE)
+            return users[uname]
+        if start is not None or end is not None:
+            df = read_ledger(path, start, end)
+            return df[df["username"] == uname].reset_index(drop=True)
+        df = read_ledger(path)
+        users = _ledger_cache["users"]
+        if uname not in users:
+            users[uname] = df[df["username"] == uname].reset_index(drop=True)
+        return users[uname]
+
+
+def user_arrays(username, path=LEDGER_DIR):
+    """
+    Returns one user's ledger rows as typed NumPy arrays (kernels.LedgerArrays) for the aggregations, cached
+    until the ledger changes. Converted from user_transactions(), so the history view and the charts share
+    one read of the user's rows; with Polars or pyarrow the whole ledger is never loaded.
+    """
+    uname = username.lower()
+    with _ledger_lock:
+        key = ledger.signature(path)
+        if _ledger_cache["arrays_key"] != key:
+            _ledger_cache.update(arrays_key=key, arrays={})
+        arrays = _ledger_cache["arrays"]
+        if uname not in arrays:
+            arrays[uname] = engine.frame_to_arrays(user_transactions(uname, path))
+        return arrays[uname]
+
+
+# --- Chart buckets ---
+# Each user's BucketPyramid (buckets.py) is built from the ledger on first use and then updated with the rows
+# append_to_ledger writes. A pyramid is tagged with the ledger signature it matches: rows written any other way
+# (statement imports, the server's batched appends, another process) change the signature without updating
+# it, and it is rebuilt on next use.
+_bucket_pyramids = {} # username -> (ledger signature, BucketPyramid)
+
+
+def user_buckets(username, path=LEDGER_DIR):
+    """Returns the user's BucketPyramid, rebuilding it if the ledger changed since it was last updated."""
+    uname = username.lower()
+    with _ledger_lock:
+        key = ledger.signature(path)
+        entry = _bucket_pyramids.get(uname)
+        if entry is None or entry[0] != key:
+            entry = (key, buckets.BucketPyramid.from_arrays(user_arrays(uname, path)))
+            _bucket_pyramids[uname] = entry
+        return entry[1]
+
+
+def _update_buckets(rows, before, after):
+    """
+    Adds rows that were just appended to the ledger to the pyramids they belong to. Only pyramids at signature
+    before (read under the ledger's file lock, with after) are updated; others are rebuilt on next use.
+    """
+    by_user = {}
+    for row in rows:
+        by_user.setdefault(row[0], []).append(row)
+    for uname, (key, pyramid) in list(_bucket_pyramids.items()):
+        if key != before:
+            continue # Already out of date; rebuilt on next use
+        if uname in by_user:
+            pyramid.add_rows(by_user[uname])
+        _bucket_pyramids[uname] = (after, pyramid)
+
+
+# --- Rolling spend ---
+# Spend over the last 7/30/90 days (rolling.py) for every user. The buffers are filled from one bounded read
+# of the last 90 days of the ledger on first use, then updated with the expense rows append_to_ledger writes
+# (withdraw, process_recurring). Like the chart buckets they are tagged with the ledger signature, and are
+# rebuilt if the ledger was changed some other way.
+_rolling_spend = {"key": None, "users": {}} # users: username -> rolling.RollingSpend
+
+
+def _today():
+    return int(rolling.day_number(np.datetime64(datetime.now(), "s").astype(np.int64)))
+
+
+def _load_rolling_spend(path=LEDGER_DIR):
+    """Rebuilds every user's rolling spend from the last rolling.HORIZON days of the ledger. Needs _ledger_lock."""
+    key = ledger.signature(path)
+    users = {}
+    if key is not None:
+        today = _today()
+        start = datetime.combine(datetime.now().date() - timedelta(days=rolling.HORIZON - 1), datetime.min.time())
+        df = ledger_rows(path, start=start, types=kernels.EXPENSE_TYPES) # Only the segments of the last few months are opened
+        users = rolling.build(df["username"].to_numpy(), df["timestamp"].to_numpy().astype("datetime64[s]").astype(np.int64),
+                              df["amount"].to_numpy().astype(np.int64), today)
+    _rolling_spend.update(key=key, users=users)
+
+
+def rolling_spend(username, path=LEDGER_DIR):
+    """
+    Returns the user's spend (paisa) over each of rolling.WINDOWS days up to today as {days: paisa}, plus the
+    daily average over the last rolling.AVERAGE_WINDOW days under "daily_average". Constant cost once loaded.
+    """
+    with _ledger_lock:
+        if _rolling_spend["key"] is None or _rolling_spend["key"] != ledger.signature(path):
+            _load_rolling_spend(path)
+        spend = _rolling_spend["users"].get(username.lower())
+        totals = spend.totals(_today()) if spend is not None else dict.fromkeys(rolling.WINDOWS, 0)
+    totals["daily_average"] = round(totals[rolling.AVERAGE_WINDOW] / rolling.AVERAGE_WINDOW)
+    return totals
+
+
+def _update_rolling_spend(rows, before, after):
+    """Adds the expense rows that were just appended to the ledger (from signature before to after) to the buffers."""
+    if _rolling_spend["key"] is None or _rolling_spend["key"] != before:
+        return # Not loaded or already out of date; rebuilt on next use
+    users = _rolling_spend["users"]
+    for uname, when, amount, t_type, _category in rows:
+        if t_type in kernels.EXPENSE_TYPES:
+            day = int(rolling.day_number(np.datetime64(when, "s").astype(np.int64)))
+            users.setdefault(uname, rolling.RollingSpend()).add(day, int(amount))
+    _rolling_spend["key"] = after
+
+
+# --- Expense statistics ---
+# Per (user, category) running mean and variance of expense amounts (anomaly.py), to flag unusual expenses. They
+# are initialised from the whole ledger in one vectorised pass on first use, then updated with Welford's method
+# for every expense append_to_ledger writes, which is scored against the statistics from before it. Loading
+# also flags the last anomaly.RECENT_DAYS days of expenses, scored against the loaded statistics. Tagged with the
+# ledger signature like the rolling spend. They are loaded off the UI and event-loop threads (the "anomalies"
+# prefetch task, the server's startup), never by withdraw.
+_expense_stats = {"key": None, "stats": {}, "flags": {}} # stats: (username, category) -> anomaly.RunningStats
+                                                          # flags: username -> [(datetime, category, paisa, z)]
+
+
+def _load_expense_stats(path=LEDGER_DIR):
+    """Rebuilds all expense statistics and recent flags from the ledger. Needs _ledger_lock."""
+    key = ledger.signature(path)
+    stats, flags = {}, {}
+    if key is not None:
+        df = ledger_rows(path, types=kernels.EXPENSE_TYPES)
+        # (user, category) groups from the two columns' codes; much faster than factorizing the pairs
+        user_codes, usernames = pd.factorize(df["username"])
+        category_codes, categories = pd.factorize(df["category"])
+        pairs, groups = np.unique(user_codes.astype(np.int64) * len(categories) + category_codes, return_inverse=True)
+        groups = groups.reshape(-1)
+        keys = zip(usernames[pairs // max(len(categories), 1)], categories[pairs % max(len(categories), 1)])
+        amounts = df["amount"].to_numpy().astype(np.float64)
+        count, mean, m2 = anomaly.group_stats(groups, amounts, len(pairs))
+        stats = {key: anomaly.RunningStats(c, m, q) for key, c, m, q in zip(keys, count.tolist(), mean.tolist(), m2.tolist())}
+        z = anomaly.prefix_zscores(groups, amounts) # Each expense against the ones before it, as when logged
+        recent = (df["timestamp"] >= datetime.now() - timedelta(days=anomaly.RECENT_DAYS)).to_numpy()
+        flagged = df[recent & (z >= anomaly.Z_THRESHOLD)].assign(z=z[recent & (z >= anomaly.Z_THRESHOLD)])
+        for row in flagged.sort_values("timestamp", kind="stable").itertuples(index=False):
+            flags.setdefault(row.username, []).append((row.timestamp.to_pydatetime(), row.category, int(row.amount), float(row.z)))
+        flags = {uname: user_flags[-anomaly.RECENT_FLAGS:] for uname, user_flags in flags.items()}
+    _expense_stats.update(key=key, stats=stats, flags=flags)
+
+
+def _current_expense_stats(path=LEDGER_DIR):
+    """The expense statistics, reloaded if the ledger changed without them. Needs _ledger_lock."""
+    if _expense_stats["key"] is None or _expense_stats["key"] != ledger.signature(path):
+        _load_expense_stats(path)
+    return _expense_stats
+
+
+def warm_expense_stats(path=LEDGER_DIR):
+    """Loads the expense statistics if they are missing or out of date, so score_expense can use them."""
+    with _ledger_lock:
+        _current_expense_stats(path)
+
+
+def score_expense(username, category, amount):
+    """
+    Scores an expense (paisa) against the user's statistics for its category, without recording it.
+    Returns (z-score, category mean in paisa), or None if the category has too little history to score.
+    Never waits for the ledger: it reads the statistics loaded so far without _ledger_lock (updates replace
+    a RunningStats instead of changing it) and scores nothing until warm_expense_stats has loaded them.
+    """
+    stats = _expense_stats["stats"].get((username.lower(), category))
+    z = stats.zscore(amount) if stats is not None else None
+    return None if z is None else (z, stats.mean)
+
+
+def expense_anomalies(username, path=LEDGER_DIR):
+    """The user's most recent flagged expenses as a tuple of (datetime, category, paisa, z-score), newest first."""
+    with _ledger_lock:
+        return tuple(reversed(_current_expense_stats(path)["flags"].get(username.lower(), ())))
+
+
+def _update_expense_stats(rows, before, after):
+    """Scores and adds the expense rows that were just appended to the ledger (from signature before to after)."""
+    if _expense_stats["key"] is None or _expense_stats["key"] != before:
+        return # Not loaded or already out of date; rebuilt on next use
+    stats, flags = _expense_stats["stats"], _expense_stats["flags"]
+    for uname, when, amount, t_type, category in rows:
+        if t_type in kernels.EXPENSE_TYPES:
+            running = stats.get((uname, category)) or anomaly.RunningStats()
+            z = running.zscore(amount)
+            if z is not None and z >= anomaly.Z_THRESHOLD:
+                user_flags = flags.setdefault(uname, [])
+                user_flags.append((when, category, int(amount), z))
+                del user_flags[:-anomaly.RECENT_FLAGS]
+            # Updated on a copy and swapped in, so score_expense never sees a half-applied update
+            updated = anomaly.RunningStats(running.count, running.mean, running.m2)
+            updated.add(amount)
+            stats[(uname, category)] = updated
+    _expense_stats["key"] = after
+
+
+class TransactionPager:
+    """
+    Filtered and sorted view over one user's cached ledger rows.
+    Keeps only an array of row positions; page() materialises just the rows that are on screen.
+    """
+    SORT_COLUMNS = ("timestamp", "type", "category", "amount")
+
+    def __init__(self, username):
+        self.username = username.lower()
+        self.filters = {"type": None, "category": None, "start": None, "end": None}
+        self.sort_by = "timestamp"
+        self.descending = True
+        self._frame = None
+        self._order = np.empty(0, dtype=np.intp)
+        self.refresh()
+
+    def refresh(self):
+        """Picks up new ledger rows. Cheap when the file has not changed. Returns True if the data changed."""
+        try:
+            frame = user_transactions(self.username)
+        except (FileNotFoundError, pd.errors.EmptyDataError):
+            frame = pd.DataFrame(columns=["username", "timestamp", "amount", "type", "category"])
+        if frame is self._frame:
+            return False
+        self._frame = frame
+        self._apply()
+        return True
+
+    def set_filters(self, **filters):
+        """Sets any of type, category, start, end (None clears a filter). start/end are datetimes; end is exclusive."""
+        self.filters.update(filters)
+        self._apply()
+
+    def set_sort(self, column, descending=None):
+        """Sorts by column; re-selecting the current column flips the direction unless descending is given."""
+        if column not in self.SORT_COLUMNS:
+            raise ValueError(f"Cannot sort by '{column}'.")
+        if descending is None:
+            descending = not self.descending if column == self.sort_by else column in ("timestamp", "amount")
+        self.sort_by = column
+        self.descending = descending
+        self._apply()
+
+    def available_values(self, column):
+        """Sorted distinct values of a column for this user, e.g. to fill a filter drop-down."""
+        return sorted(self._frame[column].dropna().astype(str).unique().tolist())
+
+    def _apply(self):
+        frame = self._frame
+        mask = np.ones(len(frame), dtype=bool)
+        if self.filters["type"]:
+            mask &= frame["type"].to_numpy() == self.filters["type"]
+        if self.filters["category"]:
+            mask &= frame["category"].to_numpy() == self.filters["category"]
+        timestamps = frame["timestamp"]
+        if self.filters["start"] is not None:
+            mask &= (timestamps >= pd.Timestamp(self.filters["start"])).to_numpy()
+        if self.filters["end"] is not None:
+            mask &= (timestamps < pd.Timestamp(self.filters["end"])).to_numpy()
+
+        positions = np.flatnonzero(mask)
+        keys = frame[self.sort_by].to_numpy()[positions]
+        if self.sort_by in ("type", "category"):
+            keys = keys.astype(str)
+        order = np.argsort(keys, kind="stable")
+        if self.descending:
+            order = order[::-1]
+        if self.sort_by == "timestamp":
+            # Rows with unreadable dates always go last, whichever the direction
+            invalid = np.isnat(keys[order])
+            order = np.concatenate((order[~invalid], order[invalid]))
+        self._order = positions[order]
+
+    @property
+    def row_count(self):
+        """Number of the user's transactions before filtering."""
+        return len(self._frame)
+
+    def __len__(self):
+        return len(self._order)
+
+    def page(self, offset, count):
+        """Returns up to count rows starting at offset as (date_str, type, category, amount) tuples."""
+        rows = self._frame.iloc[self._order[offset:offset + count]]
+        dates = rows["timestamp"].dt.strftime('%Y-%m-%d %H:%M').fillna("Invalid Date")
+        return list(zip(dates.tolist(), rows["type"].astype(str).tolist(),
+                        rows["category"].tolist(), rows["amount"].tolist()))
+
+
 def generate_report(username):
     """Generates a basic financial report for a user from transaction data."""
     try:
-        df = pd.read_csv("transactions.csv")
-        user_data = df[df["username"] == username.lower()].copy() # Use .copy()
+        # Cached typed arrays of the user's ledger rows (amounts are int64 paisa, so the sums below are exact)
+        rows = user_arrays(username)
 
-        if user_data.empty:
+        if len(rows) == 0:
             return "No transaction data available for this user."
 
-        # Ensure amount is numeric
-        user_data['amount'] = pd.to_numeric(user_data['amount'], errors='coerce').fillna(0)
-
-        # Define inflow and outflow types more explicitly
-        inflow_types = ["Income", "Loan Received", "Transfer In"]
-        outflow_types = ["Expense", "Loan Repayment", "Transfer Out", "Recurring Expense", "Recurring Expense Failed"]
-
-        income = user_data[user_data["type"].isin(inflow_types)]["amount"].sum()
-        expense = user_data[user_data["type"].isin(outflow_types)]["amount"].sum()
+        # Inflow and outflow types are defined in kernels.INFLOW_TYPES / OUTFLOW_TYPES
+        income = kernels.masked_sum(rows.amounts, kernels.type_mask(rows.types, kernels.INFLOW_TYPES))
+        expense = kernels.masked_sum(rows.amounts, kernels.type_mask(rows.types, kernels.OUTFLOW_TYPES))
 
         net_flow = income - expense
 
         report = f"--- Financial Activity Summary for {username.title()} ---\n"
-        report += f"Total Inflow (Income, Loans, Transfers In): {income:.2f}\n"
-        report += f"Total Outflow (Expenses, Loan Repayments, Transfers Out, Recurring): {expense:.2f}\n"
-        report += f"Net Cash Flow: {net_flow:.2f}\n"
+        report += f"Total Inflow (Income, Loans, Transfers In): {format_amount(income)}\n"
+        report += f"Total Outflow (Expenses, Loan Repayments, Transfers Out, Recurring): {format_amount(expense)}\n"
+        report += f"Net Cash Flow: {format_amount(net_flow)}\n"
 
         # Add expense breakdown by category
-        expense_data = user_data[user_data["type"].isin(['Expense', 'Recurring Expense'])].copy()
-        if not expense_data.empty:
-            category_breakdown = expense_data.groupby('category')['amount'].sum().sort_values(ascending=False)
-            if not category_breakdown.empty:
-                report += "\nExpense Breakdown by Category:\n"
-                for category, total in category_breakdown.items():
-                    report += f"- {category}: {total:.2f}\n"
+        categories, totals = kernels.category_totals(rows, kernels.type_mask(rows.types, kernels.EXPENSE_TYPES))
+        if categories:
+            report += "\nExpense Breakdown by Category:\n"
+            for category, total in zip(categories, totals):
+                report += f"- {category}: {format_amount(total)}\n"
         else:
             report += "\nNo detailed expense breakdown available."
 
@@ -420,19 +1667,36 @@ def generate_report(username):
         return f"Error generating report: {e}"
 
 
-def plot_charts(username):
-    """Generates and saves monthly trend and expense pie charts for a user."""
-    monthly_path = f"{username.lower()}_monthly_trend.png"
-    pie_path = f"{username.lower()}_expense_pie.png"
+CHART_POINTS = 500 # Most points drawn per line chart; longer series are downsampled with kernels.lttb
+
+
+def _downsample(x, y, max_points=None):
+    """The points of a line chart to draw: at most max_points (CHART_POINTS if None) chosen by LTTB."""
+    keep = kernels.lttb(np.asarray(x).astype(np.int64), y, max_points or CHART_POINTS) # datetime64 x -> int64
+    return x[keep], y[keep]
+
+
+def chart_paths(username, days=None):
+    """The (net cash flow trend, expense pie) image paths plot_charts writes for a range."""
+    suffix = "" if days is None else f"_{days}d"
+    return f"{username.lower()}_monthly_trend{suffix}.png", f"{username.lower()}_expense_pie{suffix}.png"
+
+
+def plot_charts(username, days=None, max_points=None):
+    """
+    Generates and saves the net cash flow trend and expense pie charts for a user, over the last `days` days
+    (the whole history if None). The trend uses the coarsest bucket resolution that still gives enough points,
+    and is downsampled to at most max_points points (CHART_POINTS if None).
+    """
+    monthly_path, pie_path = chart_paths(username, days)
 
     # Ensure matplotlib does not try to open a GUI window
     plt.switch_backend('Agg')
 
     try:
-        df = pd.read_csv("transactions.csv")
-        df_user = df[df['username'] == username.lower()].copy() # Use .copy() to avoid SettingWithCopyWarning
+        rows = user_arrays(username) # Typed arrays of the cached rows (kernels.py)
 
-        if df_user.empty:
+        if len(rows) == 0:
             # Remove old chart files if no data exists or error occurs
             if os.path.exists(monthly_path): os.remove(monthly_path)
             if os.path.exists(pie_path): os.remove(pie_path)
@@ -441,33 +1705,32 @@ def plot_charts(username):
             # For now, rely on GUI checking for file existence
             return
 
-        # Ensure necessary columns exist and have correct data types
-        if 'timestamp' not in df_user.columns or 'amount' not in df_user.columns or 'type' not in df_user.columns or 'category' not in df_user.columns:
-            print(f"Missing required columns in transactions.csv for user {username}.")
+        # Timestamps and amounts are already parsed by the ledger reader; rows with invalid timestamps are left out
+        pyramid = user_buckets(username) # Pre-aggregated day/week/month/year buckets (buckets.py)
+        if days is not None:
+            # The last `days` calendar days, today included; buckets are whole days, weeks, months or years
+            last_second = int(np.datetime64(datetime.now(), "s").astype(np.int64))
+            first_second = (last_second // kernels.SECONDS_PER_DAY - (days - 1)) * kernels.SECONDS_PER_DAY
+        elif pyramid.first_second is not None:
+            first_second, last_second = pyramid.first_second, pyramid.last_second
+        else:
             if os.path.exists(monthly_path): os.remove(monthly_path)
             if os.path.exists(pie_path): os.remove(pie_path)
-            # Return or raise error
+            print(f"No transaction with a readable timestamp to plot for {username}. Removed old chart files.")
             return
-
-        df_user["timestamp"] = pd.to_datetime(df_user["timestamp"], errors='coerce')
-        df_user.dropna(subset=['timestamp'], inplace=True) # Remove rows with invalid timestamps
-        df_user["amount"] = pd.to_numeric(df_user["amount"], errors='coerce').fillna(0) # Convert amount to numeric, fill errors with 0
+        valid = rows.valid_time & (rows.seconds >= first_second) & (rows.seconds <= last_second)
 
 
-        # --- Monthly Trend ---
-        # Calculate net monthly flow
-        monthly_flow = df_user.copy()
-        # Convert outflow amounts to negative for net flow calculation
-        outflow_types = ["Expense", "Loan Repayment", "Transfer Out", "Recurring Expense", "Recurring Expense Failed"]
-        monthly_flow.loc[monthly_flow['type'].isin(outflow_types), 'amount'] *= -1
-
-        # Resample monthly and sum the amounts
-        monthly = monthly_flow.resample("M", on="timestamp")["amount"].sum().sort_index()
+        # --- Net Cash Flow Trend ---
+        # Net flow per bucket: outflow amounts count as negative (empty buckets are 0)
+        resolution = buckets.choose_resolution(first_second, last_second)
+        starts, net, _expense = pyramid.series(resolution, first_second, last_second)
+        starts, net = _downsample(starts, net, max_points)
 
         plt.figure(figsize=(10, 6))
-        plt.plot(monthly.index, monthly.values, marker='o', linestyle='-')
-        plt.title(f"{username.title()}'s Monthly Net Cash Flow")
-        plt.xlabel("Month")
+        plt.plot(starts, to_rupees(net), marker='o', linestyle='-') # Paisa sums -> rupees for display
+        plt.title(f"{username.title()}'s {buckets.RESOLUTION_LABELS[resolution]} Net Cash Flow")
+        plt.xlabel(resolution.title())
         plt.ylabel("Amount (PKR)")
         plt.grid(True)
         plt.xticks(rotation=45, ha='right') # Rotate labels and align them to the right
@@ -478,26 +1741,27 @@ def plot_charts(username):
 
         # --- Expense Pie Chart ---
         # Only include actual expenses and recurring expenses for pie chart
-        expense_data = df_user[df_user["type"].isin(['Expense', 'Recurring Expense'])].copy()
+        expense_mask = kernels.type_mask(rows.types, kernels.EXPENSE_TYPES) & valid
 
-        if expense_data.empty:
+        if not expense_mask.any():
              if os.path.exists(pie_path): os.remove(pie_path)
              print(f"No actual expense data to plot pie chart for {username}. Removed old pie chart file.")
              return # Exit if no expense data
 
-        # Group by category and sum amounts
-        pie_data = expense_data.groupby("category")["amount"].sum().sort_values(ascending=False)
+        # Sum amounts per category, largest first
+        categories, totals = kernels.category_totals(rows, expense_mask)
 
         # Filter out categories with zero total expense
-        pie_data = pie_data[pie_data > 0]
+        positive = totals > 0
+        categories, totals = [c for c, keep in zip(categories, positive) if keep], totals[positive]
 
-        if pie_data.empty:
+        if not categories:
              if os.path.exists(pie_path): os.remove(pie_path)
              print(f"Expense data exists but all categories have zero total for {username}. Removed old pie chart file.")
              return
 
         plt.figure(figsize=(8, 8))
-        pie_data.plot.pie(autopct='%1.1f%%', startangle=90)
+        plt.pie(to_rupees(totals), labels=categories, autopct='%1.1f%%', startangle=90)
         plt.title(f"{username.title()}'s Expense Breakdown")
         plt.ylabel("") # Hide default 'amount' label on pie chart
         plt.axis('equal') # Equal aspect ratio ensures that pie is drawn as a circle.
@@ -526,66 +1790,58 @@ def plot_charts(username):
         raise # Re-raise to be caught by GUI for user feedback
 
 
-def predict_future_expense_data(username, days_to_predict=30):
+def predict_future_expense_data(username, days_to_predict=30, model=None, max_points=None):
     """
-    Predicts future cumulative expense data points using linear regression.
-    Returns a dictionary with historical and predicted data for plotting.
-    Also saves the combined plot.
+    Predicts future cumulative expense data points with a forecasting model (forecasting.MODELS; linear
+    regression by default). Returns a dictionary with historical and predicted data for plotting.
+    The historical series is downsampled to at most max_points points (CHART_POINTS if None) for the plot.
+    Also saves the combined plot. Raises ValueError for an unknown model name.
     """
-    plot_path = f"{username.lower()}_historical_predicted_expense.png"
+    forecast_model = forecasting.get_model(model)
+    if forecast_model.name == forecasting.DEFAULT_MODEL:
+        plot_path = f"{username.lower()}_historical_predicted_expense.png"
+    else:
+        plot_path = f"{username.lower()}_{forecast_model.name}_predicted_expense.png"
     plt.switch_backend('Agg') # Use Agg backend for non-GUI plotting
 
     try:
-        df = pd.read_csv("transactions.csv")
-        df_user = df[df["username"] == username.lower()].copy()
+        rows = user_arrays(username)
         # Only use actual expenses and recurring expenses for prediction
-        df_expenses = df_user[df_user["type"].isin(['Expense', 'Recurring Expense'])].copy()
+        is_expense = kernels.type_mask(rows.types, kernels.EXPENSE_TYPES)
 
-        if df_expenses.shape[0] < 2: # Need at least 2 data points for meaningful linear regression
+        if is_expense.sum() < 2: # Need at least 2 data points for meaningful linear regression
             # Remove old plot file if not enough data
             if os.path.exists(plot_path): os.remove(plot_path)
             return {"message": "Not enough expense data to make a prediction (need at least 2 expense records)."}
 
-        # Ensure timestamp and amount are in correct formats
-        df_expenses["timestamp"] = pd.to_datetime(df_expenses["timestamp"], errors='coerce')
-        df_expenses.dropna(subset=['timestamp'], inplace=True) # Remove rows with invalid timestamps
-        df_expenses["amount"] = pd.to_numeric(df_expenses["amount"], errors='coerce').fillna(0) # Convert amount to numeric, fill errors with 0
+        # Valid-time expenses in time order: days since the *first* expense and the exact int64 paisa running total
+        series = kernels.expense_series(rows)
+        _seconds, days, cumulative_expense = series
 
-        if df_expenses.empty: # Check again after dropping invalid timestamps/amounts
+        if len(days) == 0: # Check again after dropping invalid timestamps
             if os.path.exists(plot_path): os.remove(plot_path)
             return {"message": "Not enough valid expense data to make a prediction."}
 
-
-        df_expenses.sort_values("timestamp", inplace=True)
-
-        # Calculate days from the *first* expense timestamp
-        first_expense_time = df_expenses["timestamp"].iloc[0]
-        df_expenses["days"] = (df_expenses["timestamp"] - first_expense_time).dt.days
-
-        # Use cumulative expense over time for a trend prediction
-        df_expenses['cumulative_expense'] = df_expenses['amount'].cumsum()
-
         # Prepare data for the model
         # X should be the number of days since the first transaction
-        X_hist = df_expenses["days"].values.reshape(-1, 1)
+        X_hist = days.reshape(-1, 1)
         # y should be the cumulative expense up to that day
-        y_hist = df_expenses["cumulative_expense"].values
+        y_hist = cumulative_expense
 
         # If all expenses are on the same day, prediction is not meaningful with this model
         if len(np.unique(X_hist)) < 2:
             if os.path.exists(plot_path): os.remove(plot_path)
             return {"message": "Not enough variation in expense timing to make a prediction."}
 
-        # Train the linear regression model
-        model = LinearRegression()
-        model.fit(X_hist, y_hist)
+        # Fit the model (reused until the user's expenses change)
+        params = forecasting.cached_fit(username, forecast_model, series)
 
         # Generate future days for prediction
         last_day_recorded = X_hist[-1][0]
         future_days = np.arange(last_day_recorded + 1, last_day_recorded + days_to_predict + 1).reshape(-1, 1)
 
         # Predict cumulative expense for future days
-        y_pred = model.predict(future_days)
+        y_pred = forecast_model.predict_cumulative(params, future_days.flatten())
 
         # Prepare data for plotting
         # Combine historical and predicted days and values
@@ -594,8 +1850,10 @@ def predict_future_expense_data(username, days_to_predict=30):
 
         # Create the plot
         plt.figure(figsize=(10, 6))
-        plt.plot(X_hist.flatten(), y_hist, marker='o', linestyle='-', label='Historical Cumulative Expense')
-        plt.plot(future_days.flatten(), y_pred, marker='x', linestyle='--', color='red', label=f'Predicted Cumulative Expense ({days_to_predict} days)')
+        # The model works in paisa; the axis shows rupees
+        plot_days, plot_cumulative = _downsample(X_hist.flatten(), y_hist, max_points)
+        plt.plot(plot_days, to_rupees(plot_cumulative), marker='o', linestyle='-', label='Historical Cumulative Expense')
+        plt.plot(future_days.flatten(), to_rupees(y_pred), marker='x', linestyle='--', color='red', label=f'Predicted Cumulative Expense ({days_to_predict} days, {forecast_model.label})')
 
         plt.title(f"{username.title()}'s Historical and Predicted Cumulative Expense")
         plt.xlabel("Days Since First Expense")
@@ -622,42 +1880,34 @@ def predict_future_expense_data(username, days_to_predict=30):
         return {"message": f"Error during prediction data generation and plotting: {e}"}
 
 
-def predict_next_month_expense(username):
+def predict_next_month_expense(username, model=None):
     """
-    Predicts the total expense for the next calendar month using linear regression.
-    Returns a message string with the predicted amount or an error.
+    Predicts the total expense for the next calendar month with a forecasting model (forecasting.MODELS;
+    linear regression by default). Returns a message string with the predicted amount or an error.
     """
     try:
-        df = pd.read_csv("transactions.csv")
-        df_user = df[df["username"] == username.lower()].copy()
-        df_expenses = df_user[df_user["type"].isin(['Expense', 'Recurring Expense'])].copy()
+        forecast_model = forecasting.get_model(model)
+        rows = user_arrays(username)
 
-        if df_expenses.shape[0] < 2:
+        if kernels.type_mask(rows.types, kernels.EXPENSE_TYPES).sum() < 2:
             return "❌ Not enough expense data to predict next month's expense (need at least 2 expense records)."
 
-        df_expenses["timestamp"] = pd.to_datetime(df_expenses["timestamp"], errors='coerce')
-        df_expenses.dropna(subset=['timestamp'], inplace=True)
-        df_expenses["amount"] = pd.to_numeric(df_expenses["amount"], errors='coerce').fillna(0)
+        # Valid-time expenses in time order: days since the *first* expense and the running total
+        series = kernels.expense_series(rows)
+        seconds, days, _cumulative = series
 
-        if df_expenses.empty:
+        if len(days) == 0:
             return "❌ Not enough valid expense data to predict next month's expense."
 
-        df_expenses.sort_values("timestamp", inplace=True)
-
-        # Calculate days from the *first* expense timestamp
-        first_expense_time = df_expenses["timestamp"].iloc[0]
-        df_expenses["days"] = (df_expenses["timestamp"] - first_expense_time).dt.days
+        first_expense_time = seconds[0].astype("datetime64[s]").item()
 
-        df_expenses['cumulative_expense'] = df_expenses['amount'].cumsum()
-
-        X_hist = df_expenses["days"].values.reshape(-1, 1)
-        y_hist = df_expenses["cumulative_expense"].values
+        X_hist = days.reshape(-1, 1)
 
         if len(np.unique(X_hist)) < 2:
              return "❌ Not enough variation in expense timing to predict next month's expense."
 
-        model = LinearRegression()
-        model.fit(X_hist, y_hist)
+        # Fitted once per change of the user's expenses
+        params = forecasting.cached_fit(username, forecast_model, series)
 
         # Determine the number of days until the end of the current month and the number of days in the next month
         today = datetime.now()
@@ -685,19 +1935,22 @@ def predict_next_month_expense(username):
 
 
         # Predict cumulative expense at the start and end of the next month
-        predicted_cumulative_start = model.predict(np.array([[days_to_start_of_next_month]]))
-        predicted_cumulative_end = model.predict(np.array([[days_to_end_of_next_month]]))
+        predicted_cumulative_start, predicted_cumulative_end = forecast_model.predict_cumulative(
+            params, np.array([days_to_start_of_next_month, days_to_end_of_next_month]))
 
         # The predicted expense for the next month is the difference
-        predicted_expense_next_month = predicted_cumulative_end[0] - predicted_cumulative_start[0]
+        predicted_expense_next_month = predicted_cumulative_end - predicted_cumulative_start
 
         # Ensure the prediction is not negative
         predicted_expense_next_month = max(0, predicted_expense_next_month)
 
-        # Format the month name for the output message
+        # Format the month name for the output message (naming the model unless it is the default)
         next_month_name = first_day_of_next_month.strftime("%B")
+        if forecast_model.name != forecasting.DEFAULT_MODEL:
+            next_month_name += f" ({forecast_model.label})"
 
-        return f"📈 Predicted expense for {next_month_name}: PKR {predicted_expense_next_month:.2f}"
+        # The model predicts paisa; round to a whole paisa for display
+        return f"📈 Predicted expense for {next_month_name}: PKR {format_amount(round(predicted_expense_next_month))}"
 
     except FileNotFoundError:
         return "❌ Transaction data file not found for prediction."
@@ -708,15 +1961,26 @@ def predict_next_month_expense(username):
         return f"❌ Error during next month prediction: {e}"
 
 
+def predict_next_month_expense_all(path=LEDGER_DIR):
+    """
+    predict_next_month_expense for every user with expenses in the ledger at once (forecasting.py): one pass
+    over the expense rows and one vectorised least-squares solve. Returns a DataFrame indexed by username with
+    expenses, slope, intercept, predicted (paisa) and status. Raises FileNotFoundError if there is no ledger.
+    """
+    return forecasting.forecast_next_month(ledger_rows(path, types=kernels.EXPENSE_TYPES))
+
+
 def export_user_data(username):
     """Exports a user's transaction data to a CSV file."""
     try:
-        df = pd.read_csv("transactions.csv")
-        df_user = df[df["username"] == username.lower()].copy()
+        df_user = user_transactions(username).copy()
 
         if df_user.empty:
              return "No transaction data found to export for this user."
 
+        # Exports are for people: rupee amounts and readable timestamps
+        df_user["amount"] = df_user["amount"].map(format_amount)
+        df_user["timestamp"] = df_user["timestamp"].dt.strftime(LEDGER_TIMESTAMP_FORMAT)
         export_filename = f"{username.lower()}_transactions_export.csv"
         df_user.to_csv(export_filename, index=False)
         return f"✅ Data exported to {export_filename}"
@@ -727,4 +1991,88 @@ def export_user_data(username):
          return "Transaction data file is empty for export."
     except Exception as e:
          print(f"Error exporting data for {username}: {e}") # Debug print text
-         return f"Error exporting data: {e}"
\ No newline at end of file
+         return f"Error exporting data: {e}"
+
+
+# --- Analytics prefetch ---
+# The charts and predictions read the whole ledger, fit a model and render PNGs, which is slow for the first
+# visit to the Graphs / AI Overview views. AnalyticsPrefetcher runs that work on a single background worker
+# right after login. Results are keyed by (task, username, arguments, ledger_signature()), so a view that asks
+# while the prefetch is still running polls the in-flight task (submit) instead of starting a duplicate, and a
+# changed ledger makes the next request recompute. Views that need other arguments (a chart range, a
+# forecasting model) ask the same worker, so Matplotlib is only ever used from the worker thread.
+
+def _prefetch_ledger(username):
+    return user_transactions(username)
+
+
+def _prefetch_charts(username, days=None):
+    plot_charts(username, days)
+
+
+def _prefetch_forecast(username, model=None):
+    return predict_next_month_expense(username, model), predict_future_expense_data(username, model=model)
+
+
+ANALYTICS_TASKS = {
+    "rolling": rolling_spend,       # Spend over the last 7/30/90 days (reads only the last 90 days)
+    "ledger": _prefetch_ledger,     # Parsed ledger and the user's cached rows
+    "anomalies": expense_anomalies, # Recent flagged expenses; loads the statistics withdraw scores against
+    "charts": _prefetch_charts,     # Net cash flow trend and expense pie PNGs (optional range in days)
+    "forecast": _prefetch_forecast, # (next month message, predict_future_expense_data result) (optional model)
+}
+
+
+class AnalyticsPrefetcher:
+    """Computes ANALYTICS_TASKS for the logged-in user on a background worker thread."""
+
+    def __init__(self):
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="analytics")
+        self._lock = threading.Lock()
+        self._futures = {} # (task, username, args) -> (ledger signature, Future)
+
+    def _submit(self, task, username, args=()):
+        """Returns the current future for task, submitting it if missing, cancelled or outdated. Needs _lock."""
+        signature = ledger_signature()
+        entry = self._futures.get((task, username, args))
+        if entry is None or entry[0] != signature or entry[1].cancelled():
+            entry = (signature, self._executor.submit(ANALYTICS_TASKS[task], username, *args))
+            self._futures[(task, username, args)] = entry
+        return entry[1]
+
+    def start(self, username):
+        """Queues every task for username (in ANALYTICS_TASKS order). Work already queued for others is cancelled."""
+        username = username.lower()
+        with self._lock:
+            self._cancel_locked(keep=username)
+            for task in ANALYTICS_TASKS:
+                self._submit(task, username)
+
+    def get(self, task, username, *args):
+        """
+        Returns the task's result for username (and extra task arguments), waiting for the prefetched run if one
+        is queued or running. Computes it (on the worker) if it was never prefetched or the ledger changed since.
+        Re-raises task errors.
+        """
+        return self.submit(task, username, *args).result()
+
+    def submit(self, task, username, *args):
+        """Like get(), but returns the Future instead of waiting for it, e.g. for the UI thread to poll."""
+        with self._lock:
+            return self._submit(task, username.lower(), args)
+
+    def _cancel_locked(self, keep=None):
+        for key, (_signature, future) in list(self._futures.items()):
+            if key[1] != keep:
+                future.cancel() # Queued work is dropped; a task that is already running finishes on its own
+                del self._futures[key]
+
+    def cancel(self):
+        """Drops all queued and cached work, e.g. on logout."""
+        with self._lock:
+            self._cancel_locked()
+
+    def shutdown(self):
+        """Cancels queued work and stops the worker without waiting for a running task."""
+        self.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,48 @@
+"""
+Fixed-point money helpers.
+
+All amounts (balances, budgets, loans, recurring items and ledger rows) are integers in paisa, the minor unit
+of PKR. Sums and comparisons are therefore exact. Rupee values only appear at the edges: parsing user input
+and legacy files (to_paisa, rupees_to_paisa) and formatting for display (format_amount).
+"""
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+import numpy as np
+
+PAISA_PER_RUPEE = 100
+
+
+def to_paisa(value):
+    """
+    Converts a rupee amount (str, int, float or Decimal) to integer paisa, rounding half up.
+    Raises ValueError for text that is not a finite number.
+    """
+    try:
+        # str() first so floats convert from their shortest repr (0.1 -> "0.1"), not their binary value
+        rupees = Decimal(str(value).strip().replace(",", ""))
+    except InvalidOperation:
+        raise ValueError(f"Invalid amount: {value!r}") from None
+    if not rupees.is_finite():
+        raise ValueError(f"Invalid amount: {value!r}")
+    return int((rupees * PAISA_PER_RUPEE).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def rupees_to_paisa(values):
+    """
+    Vectorised to_paisa for float arrays read from legacy files (NaN must be removed first).
+    Values with at most two decimals convert exactly: round() absorbs the float error of the multiplication.
+    """
+    return np.round(np.asarray(values, dtype=np.float64) * PAISA_PER_RUPEE).astype(np.int64)
+
+
+def to_rupees(paisa):
+    """Paisa -> float rupees. Only for plotting and model fitting, never for stored values."""
+    return paisa / PAISA_PER_RUPEE
+
+
+def format_amount(paisa, grouping=False):
+    """Formats paisa as a rupee string with two decimals, e.g. 123450 -> '1234.50' ('1,234.50' with grouping)."""
+    paisa = int(paisa)
+    sign = "-" if paisa < 0 else ""
+    rupees, cents = divmod(abs(paisa), PAISA_PER_RUPEE)
+    return f"{sign}{rupees:,}.{cents:02d}" if grouping else f"{sign}{rupees}.{cents:02d}"
@@ -0,0 +1,86 @@
+"""
+Rolling-window spend: how much a user spent in the last 7, 30 and 90 days.
+
+RollingSpend keeps the spend of the last HORIZON days in a ring buffer of daily totals, plus a running sum
+per window. Logging an expense adds to one slot and to the window sums. Moving to a new day clears the slots
+that fell out of the horizon and subtracts, from each window, the day that just left it. Both updates and
+reads therefore cost the same however long the history is. build() fills the buffers for every user from one
+set of ledger rows (the last HORIZON days) with a single bincount.
+
+Days are local calendar days since 1970 (local seconds // SECONDS_PER_DAY, as in kernels.py).
+"""
+import numpy as np
+
+import kernels
+
+WINDOWS = (7, 30, 90) # Days per window, shortest first
+HORIZON = max(WINDOWS) # Days kept in the ring buffer
+AVERAGE_WINDOW = 30 # Window the daily average is taken over
+
+SECONDS_PER_DAY = kernels.SECONDS_PER_DAY
+
+
+def day_number(seconds):
+    """Local seconds since 1970 -> local day number (works on arrays too)."""
+    return seconds // SECONDS_PER_DAY
+
+
+class RollingSpend:
+    """One user's daily spend over the last HORIZON days, with running sums for each of WINDOWS."""
+    __slots__ = ("daily", "today", "sums")
+
+    def __init__(self):
+        self.daily = [0] * HORIZON # Paisa spent on day d is in daily[d % HORIZON], for today - HORIZON < d <= today
+        self.today = None # Latest day the buffer covers (None while empty)
+        self.sums = dict.fromkeys(WINDOWS, 0) # window -> paisa spent from today - window + 1 to today
+
+    @classmethod
+    def from_daily(cls, totals, today):
+        """Builds the buffer from HORIZON daily totals, oldest first, ending on day today."""
+        spend = cls()
+        spend.today = today
+        for offset, total in enumerate(totals.tolist()):
+            spend.daily[(today - HORIZON + 1 + offset) % HORIZON] = total
+        spend.sums = {window: int(totals[-window:].sum()) for window in WINDOWS}
+        return spend
+
+    def advance(self, day):
+        """Moves the buffer forward to day, dropping spend that left each window."""
+        if self.today is None or day - self.today >= HORIZON:
+            self.daily = [0] * HORIZON
+            self.sums = dict.fromkeys(WINDOWS, 0)
+            self.today = day
+            return
+        while self.today < day:
+            self.today += 1
+            for window in WINDOWS:
+                self.sums[window] -= self.daily[(self.today - window) % HORIZON]
+            self.daily[self.today % HORIZON] = 0 # Now the slot of the new day
+
+    def add(self, day, amount):
+        """Adds amount (paisa) spent on day. Spend older than the horizon is ignored."""
+        self.advance(day)
+        if day <= self.today - HORIZON:
+            return
+        self.daily[day % HORIZON] += amount
+        for window in WINDOWS:
+            if day > self.today - window:
+                self.sums[window] += amount
+
+    def totals(self, day):
+        """{window: paisa spent in the window ending on day}."""
+        self.advance(day)
+        return dict(self.sums)
+
+
+def build(usernames, seconds, amounts, today):
+    """
+    RollingSpend for every user from expense rows (usernames, local seconds, paisa, as arrays) with one bincount
+    over (user, day). Returns {username: RollingSpend}; rows outside the HORIZON days ending on today are ignored.
+    """
+    days = day_number(seconds) - (today - HORIZON + 1)
+    keep = (days >= 0) & (days < HORIZON)
+    names, codes = np.unique(np.asarray(usernames)[keep].astype(str), return_inverse=True)
+    grid = np.bincount(codes.reshape(-1) * HORIZON + days[keep], weights=amounts[keep], minlength=len(names) * HORIZON)
+    grid = np.rint(grid).astype(np.int64).reshape(len(names), HORIZON)
+    return {name: RollingSpend.from_daily(row, today) for name, row in zip(names.tolist(), grid)}
@@ -0,0 +1,412 @@
+"""
+Local HTTP/JSON API over the logic layer.
+
+Lets several lightweight front-ends and scripts share one data directory through one process:
+  POST /register      {"username", "password", "amount", "account_type"}
+  POST /login         {"username", "password"}  -> {"token"}; also processes due recurring expenses
+  GET  /balance
+  POST /income        {"amount"}
+  POST /expense       {"amount", "category"}
+  POST /transfer      {"to", "amount"}
+  POST /loan          {"amount"}
+  POST /loan/repay    {"amount"}
+  POST /budget        {"amount"}
+  GET  /report
+  GET  /forecast
+  GET  /stats         request and write-batch counters (no login needed)
+Amounts are sent as rupees (string or number, as typed in the GUI). Endpoints other than /register, /login and
+/stats need the header "Authorization: Bearer <token>".
+
+Requests run on one asyncio event loop, and account operations (registration included) only change memory
+there. Their ledger rows go into a queue for a single writer. The writer takes everything that queued up
+during its previous write and, on a worker thread, saves the changed accounts and appends the rows
+(logic.write_ledger) in one users.db write transaction (group commit). A request is answered once its changes
+are on disk. Accounts another process saved meanwhile are merged first; operations on accounts whose merge is
+rejected (logic.InvalidMergeError) fail before anything is written. If the ledger append fails, the save is
+rolled back with it and the operations of the batch are rolled back in memory, so users.db and the ledger
+never disagree. Only if the commit itself fails after the rows were written do the requests fail with their
+changes kept; they are saved with the next batch.
+Report and forecast run on worker threads, and connections are HTTP/1.1 keep-alive.
+
+Usage: python server.py [--host 127.0.0.1] [--port 8765]
+"""
+import argparse
+import asyncio
+import json
+import secrets
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import urlsplit
+
+import logic
+import userstore
+from money import format_amount, to_paisa
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+MAX_BODY_BYTES = 1 << 20
+
+
+class ApiError(Exception):
+    """An error answered with the given HTTP status and message."""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _amount(body, field="amount"):
+    """Rupee amount from the request body -> paisa."""
+    if field not in body:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Missing field '{field}'.")
+    try:
+        return to_paisa(body[field])
+    except ValueError as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, str(e)) from None
+
+
+class SaveError(Exception):
+    """
+    The operation's accounts were not saved. Either they were rejected because they conflict with another
+    process's changes (logic.InvalidMergeError; rejected holds those usernames, which were reset to the stored
+    state, and nothing of the operation was written), or the commit failed after the ledger rows were written
+    (rejected is empty; the changes stand and are saved with a later batch).
+    """
+
+    def __init__(self, message, rejected=()):
+        super().__init__(message)
+        self.rejected = frozenset(rejected)
+
+
+def _account_state(clients):
+    """The values an operation may change, for each client: (client, amount, total_spent, loans, budget, recurring)."""
+    return [(client, client.amount, client.total_spent, client.loans, client.budget, client.recurring) for client in clients]
+
+
+def _roll_back(before, after, skip=()):
+    """
+    Undoes an operation, given _account_state() from before and after it, without losing operations that ran
+    since: amounts are reverted by the operation's delta, the budget and recurring items only if still unchanged.
+    Accounts in skip (usernames already reset to their stored state) are left alone.
+    """
+    for (client, amount, spent, loans, budget, recurring), (_client, new_amount, new_spent, new_loans, new_budget, new_recurring) in zip(before, after):
+        if client.uname in skip:
+            continue
+        client.amount -= new_amount - amount
+        client.total_spent -= new_spent - spent
+        client.loans -= new_loans - loans
+        if client.budget == new_budget:
+            client.budget = budget
+        if client.recurring == new_recurring:
+            client.recurring = recurring
+
+
+class FinanceServer:
+    def __init__(self):
+        self.clients = []
+        self.sessions = {} # token -> username
+        self.queue = None
+        self.writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ledger-writer")
+        self.stats = {"requests": 0, "batches": 0, "batched_requests": 0, "ledger_rows": 0}
+        self.routes = {
+            ("POST", "/register"): (self.register, False),
+            ("POST", "/login"): (self.login, False),
+            ("GET", "/stats"): (self.get_stats, False),
+            ("GET", "/balance"): (self.balance, True),
+            ("POST", "/income"): (self.income, True),
+            ("POST", "/expense"): (self.expense, True),
+            ("POST", "/transfer"): (self.transfer, True),
+            ("POST", "/loan"): (self.loan, True),
+            ("POST", "/loan/repay"): (self.repay_loan, True),
+            ("POST", "/budget"): (self.budget, True),
+            ("GET", "/report"): (self.report, True),
+            ("GET", "/forecast"): (self.forecast, True),
+        }
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT):
+        logic.ensure_ledger()
+        self.clients = logic.load_all_clients()
+        # Expenses are scored once the statistics are loaded; the first batches wait for this on the writer thread
+        self.writer.submit(logic.warm_expense_stats)
+        self.queue = asyncio.Queue()
+        self.writer_task = asyncio.create_task(self._write_loop())
+        return await asyncio.start_server(self._serve_connection, host, port)
+
+    # --- Persistence ---
+    async def _commit(self, rows, unames):
+        """
+        Queues an operation's ledger rows (possibly none), with the usernames of the accounts it changed, and waits
+        until they and the account changes are saved.
+        """
+        done = asyncio.get_running_loop().create_future()
+        await self.queue.put((rows, frozenset(unames), done))
+        await done
+
+    def _drain(self, batch):
+        """
+        Moves everything queued into the batch. Operations change memory before they queue, so afterwards the
+        batch holds every operation whose changes are not saved yet.
+        """
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self.queue.get()]
+            await self._write_batch(batch)
+
+    async def _write_batch(self, batch):
+        """Saves and appends a batch (see the module docstring), answering each of its operations."""
+        loop = asyncio.get_running_loop()
+        for attempt in range(logic.SAVE_ATTEMPTS):
+            self._drain(batch)
+            rows = [row for batch_rows, _unames, _done in batch for row in batch_rows]
+            # Taken on the loop thread, so the saved state is exactly that of the operations in the batch
+            snapshot = logic.snapshot_clients(self.clients)
+            written = []
+
+            def append_rows():
+                if rows:
+                    logic.write_ledger(rows)
+                written.append(True)
+
+            try:
+                # The fsync'ed append and save run on the writer thread; the snapshot and rows are plain values
+                new_versions = await loop.run_in_executor(self.writer, logic.save_snapshot, snapshot, append_rows)
+            except userstore.ConflictError as conflict:
+                print(f"Save conflict (attempt {attempt + 1}): {conflict}") # Debug print
+                self._drain(batch) # Operations queued while we waited change the same accounts
+                invalid = logic.merge_conflict(self.clients, conflict)
+                if invalid is not None:
+                    # Those accounts now hold what the other process saved; their operations fail unrecorded
+                    error = SaveError(f"Rejected, conflicting with changes saved by another process: {invalid}",
+                                      invalid.reasons)
+                    failed = [item for item in batch if item[1] & error.rejected]
+                    batch = [item for item in batch if not item[1] & error.rejected]
+                    self._fail(failed, error)
+                    await asyncio.sleep(0) # Let them roll back before the rest is saved
+                    if not batch:
+                        return
+                continue
+            except Exception as e:
+                if written:
+                    e = SaveError(f"Could not save the changed accounts ({e}); they are retried with the next batch.")
+                self._fail(batch, e)
+                await asyncio.sleep(0) # Let the failed operations roll back before the next batch saves
+                return
+            logic.finish_save(snapshot, new_versions)
+            self.stats["batches"] += 1
+            self.stats["batched_requests"] += len(batch)
+            self.stats["ledger_rows"] += len(rows)
+            for _rows, _unames, done in batch:
+                done.set_result(None)
+            return
+        self._fail(batch, RuntimeError(f"Accounts still conflicting after {logic.SAVE_ATTEMPTS} attempts."))
+        await asyncio.sleep(0)
+
+    def _fail(self, batch, error):
+        if batch:
+            print(f"Error writing batch of {len(batch)} requests: {error}") # Debug print
+        for _rows, _unames, done in batch:
+            done.set_exception(error)
+
+    async def _commit_or_roll_back(self, rows, before, after):
+        """Commits an operation's rows. If they cannot be written, rolls the operation back and re-raises."""
+        try:
+            await self._commit(rows, (client.uname for client, *_state in after))
+        except SaveError as e:
+            if e.rejected:
+                _roll_back(before, after, skip=e.rejected) # Nothing was recorded; the rejected accounts are reset
+            raise # Otherwise the rows are in the ledger, so the changes stand and are saved with a later batch
+        except Exception:
+            _roll_back(before, after) # Nothing was recorded, so nothing may change
+            raise
+
+    async def _operation(self, client, func, *args, others=()):
+        """Runs a Client operation (which may also change the others), and commits it if it succeeded."""
+        rows = []
+        before = _account_state((client, *others))
+        token = logic.ledger_sink.set(rows)
+        try:
+            message = func(*args)
+        finally:
+            logic.ledger_sink.reset(token)
+        ok = message.startswith(("✅", "⚠️"))
+        if ok:
+            await self._commit_or_roll_back(rows, before, _account_state((client, *others)))
+        return (HTTPStatus.OK if ok else HTTPStatus.UNPROCESSABLE_ENTITY), {
+            "ok": ok, "message": message,
+            "balance": format_amount(client.amount), "balance_paisa": int(client.amount)}
+
+    # --- Endpoints ---
+    async def register(self, client, body):
+        username, password = str(body.get("username", "")), str(body.get("password", ""))
+        # Saved by the writer like any other change, not here on the loop thread
+        message = logic.create_client(self.clients, username, password, _amount(body),
+                                      str(body.get("account_type", "standard")), save=False)
+        if message.startswith("✅"):
+            new_client = self.clients[-1]
+            try:
+                await self._commit([], (new_client.uname,))
+            except SaveError as e:
+                if new_client.uname in e.rejected:
+                    # Another process created the username first; our copy now is that account
+                    return HTTPStatus.CONFLICT, {"ok": False, "message": "❌ Username already exists."}
+                self.clients.remove(new_client)
+                raise
+            except Exception:
+                self.clients.remove(new_client) # Not saved, so not created
+                raise
+        ok = message.startswith("✅")
+        return (HTTPStatus.CREATED if ok else HTTPStatus.CONFLICT), {"ok": ok, "message": message}
+
+    async def login(self, client, body):
+        index = logic.validate(self.clients, str(body.get("username", "")), str(body.get("password", "")))
+        if index is None:
+            raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid username or password.")
+        client = self.clients[index]
+        token = secrets.token_hex(16)
+        self.sessions[token] = client.uname
+        rows = []
+        before = _account_state((client,))
+        sink = logic.ledger_sink.set(rows)
+        try:
+            client.process_recurring() # As on GUI login
+        finally:
+            logic.ledger_sink.reset(sink)
+        await self._commit_or_roll_back(rows, before, _account_state((client,)))
+        return HTTPStatus.OK, {"ok": True, "token": token, "username": client.uname,
+                               "balance": format_amount(client.amount), "balance_paisa": int(client.amount)}
+
+    async def get_stats(self, client, body):
+        return HTTPStatus.OK, dict(self.stats, pending=self.queue.qsize())
+
+    async def balance(self, client, body):
+        return HTTPStatus.OK, {"ok": True, "balance": format_amount(client.amount), "balance_paisa": int(client.amount),
+                               "budget": format_amount(client.budget), "total_spent": format_amount(client.total_spent),
+                               "loans": format_amount(client.loans)}
+
+    async def income(self, client, body):
+        return await self._operation(client, client.add_income, _amount(body))
+
+    async def expense(self, client, body):
+        return await self._operation(client, client.withdraw, _amount(body), str(body.get("category", "General")))
+
+    async def transfer(self, client, body):
+        receiver = logic.find_client_by_username(self.clients, str(body.get("to", "")))
+        if receiver is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Recipient '{body.get('to')}' not found.")
+        if receiver.uname == client.uname:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Cannot transfer to yourself.")
+        return await self._operation(client, client.transfer, receiver, _amount(body), others=(receiver,))
+
+    async def loan(self, client, body):
+        return await self._operation(client, client.request_loan, _amount(body))
+
+    async def repay_loan(self, client, body):
+        return await self._operation(client, client.repay_loan, _amount(body))
+
+    async def budget(self, client, body):
+        return await self._operation(client, client.set_budget, _amount(body))
+
+    async def report(self, client, body):
+        text = await asyncio.get_running_loop().run_in_executor(None, logic.generate_report, client.uname)
+        return HTTPStatus.OK, {"ok": True, "report": text}
+
+    async def forecast(self, client, body):
+        text = await asyncio.get_running_loop().run_in_executor(None, logic.predict_next_month_expense, client.uname)
+        return HTTPStatus.OK, {"ok": not text.startswith("❌"), "message": text}
+
+    # --- HTTP ---
+    async def _dispatch(self, method, target, headers, body):
+        path = urlsplit(target).path.rstrip("/") or "/"
+        route = self.routes.get((method, path))
+        if route is None:
+            if any(route_path == path for _method, route_path in self.routes):
+                raise ApiError(HTTPStatus.METHOD_NOT_ALLOWED, f"{method} not allowed on {path}.")
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No endpoint {path}.")
+        handler, needs_login = route
+        client = None
+        if needs_login:
+            scheme, _, token = headers.get("authorization", "").partition(" ")
+            username = self.sessions.get(token.strip()) if scheme.lower() == "bearer" else None
+            client = logic.find_client_by_username(self.clients, username) if username else None
+            if client is None:
+                raise ApiError(HTTPStatus.UNAUTHORIZED, "Log in first (Authorization: Bearer <token>).")
+        try:
+            data = json.loads(body) if body else {}
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON.") from None
+        if not isinstance(data, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object.")
+        return await handler(client, data)
+
+    async def _serve_connection(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break # Not HTTP; drop the connection
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+                length = int(headers.get("content-length", "0") or 0)
+                if length > MAX_BODY_BYTES:
+                    status, payload, keep_alive = HTTPStatus.REQUEST_ENTITY_TOO_LARGE, {"ok": False, "message": "Body too large."}, False
+                else:
+                    body = await reader.readexactly(length) if length else b""
+                    self.stats["requests"] += 1
+                    try:
+                        status, payload = await self._dispatch(method.upper(), target, headers, body)
+                    except ApiError as e:
+                        status, payload = e.status, {"ok": False, "message": str(e)}
+                    except Exception as e:
+                        print(f"Error handling {method} {target}: {e}") # Debug print
+                        status, payload = HTTPStatus.INTERNAL_SERVER_ERROR, {"ok": False, "message": f"Internal error: {e}"}
+
+                data = json.dumps(payload).encode("utf-8")
+                writer.write(f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+                             f"Content-Type: application/json; charset=utf-8\r\n"
+                             f"Content-Length: {len(data)}\r\n"
+                             f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + data)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass # Client went away or sent a malformed request
+        finally:
+            writer.close()
+
+
+async def main(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    app = FinanceServer()
+    server = await app.start(host, port)
+    print(f"Finance Manager API listening on http://{host}:{port}") # Debug print
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        logic.save_all_clients(app.clients)
+        app.writer.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local HTTP/JSON API for the Finance Manager.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(main(args.host, args.port))
+    except KeyboardInterrupt:
+        print("Server stopped.")
@@ -0,0 +1,76 @@
+"""Online expense statistics (anomaly.RunningStats, anomaly.group_stats) against NumPy."""
+import numpy as np
+import pytest
+
+import anomaly
+
+
+@pytest.mark.parametrize("values", [
+    [5.0, 7.0],
+    [100.0, 250.0, 175.0, 90.0, 1_000.0],
+    np.random.default_rng(1).lognormal(12, 0.8, 5_000).tolist(),
+    (1e9 + np.arange(1_000)).tolist(), # Large mean, small spread
+])
+def test_running_stats_match_numpy(values):
+    stats = anomaly.RunningStats()
+    for value in values:
+        stats.add(value)
+
+    assert stats.count == len(values)
+    assert stats.mean == pytest.approx(np.mean(values), rel=1e-12)
+    assert stats.m2 / (stats.count - 1) == pytest.approx(np.var(values, ddof=1), rel=1e-9)
+    assert stats.std == pytest.approx(np.std(values, ddof=1), rel=1e-9)
+
+
+def test_std_is_zero_below_two_values():
+    stats = anomaly.RunningStats()
+    assert stats.std == 0.0
+    stats.add(42.0)
+    assert stats.std == 0.0
+
+
+def test_group_stats_match_numpy_per_group():
+    rng = np.random.default_rng(2)
+    groups = rng.integers(0, 7, 10_000)
+    values = rng.lognormal(10, 0.5, 10_000)
+
+    count, mean, m2 = anomaly.group_stats(groups, values, 8) # Group 7 has no values
+
+    for group in range(7):
+        selected = values[groups == group]
+        assert count[group] == len(selected)
+        assert mean[group] == pytest.approx(selected.mean(), rel=1e-12)
+        assert m2[group] / (count[group] - 1) == pytest.approx(np.var(selected, ddof=1), rel=1e-9)
+    assert (count[7], mean[7], m2[7]) == (0, 0.0, 0.0)
+
+
+def test_zscore_needs_history_and_spread():
+    stats = anomaly.RunningStats()
+    for value in [10.0, 12.0, 14.0, 16.0]:
+        stats.add(value)
+    assert stats.zscore(100.0) is None # Fewer than MIN_HISTORY values
+    stats.add(18.0)
+    assert stats.zscore(14.0 + 3 * stats.std) == pytest.approx(3.0)
+
+    flat = anomaly.RunningStats()
+    for _ in range(anomaly.MIN_HISTORY):
+        flat.add(10.0)
+    assert flat.zscore(1_000.0) is None # No spread
+
+
+def test_prefix_zscores_match_scoring_each_value_before_adding_it():
+    rng = np.random.default_rng(3)
+    groups = rng.integers(0, 5, 2_000)
+    values = rng.lognormal(10, 0.5, 2_000).round()
+    values[groups == 4] = 700.0 # No spread
+
+    z = anomaly.prefix_zscores(groups, values)
+
+    stats = [anomaly.RunningStats() for _ in range(5)]
+    for group, value, score in zip(groups, values, z):
+        expected = stats[group].zscore(value)
+        if expected is None:
+            assert np.isnan(score)
+        else:
+            assert score == pytest.approx(expected, rel=1e-9, abs=1e-9)
+        stats[group].add(value)
@@ -0,0 +1,58 @@
+"""The all-users forecast (logic.predict_next_month_expense_all) against one fit per user; see benchmarks/bench_batch_forecast.py."""
+import re
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from sklearn.linear_model import LinearRegression
+
+import forecasting
+import kernels
+import logic
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # ledger/ is relative to the working directory
+    logic.ensure_ledger()
+    now = datetime.now().replace(microsecond=0)
+    rng = np.random.default_rng(4)
+    rows = []
+    for day in sorted(rng.integers(1, 120, 60).tolist()): # Four months of expenses
+        rows.append(("steady", now - timedelta(days=day), int(rng.integers(100, 50_000)), "Expense", "Food"))
+    rows.append(("steady", now - timedelta(days=3), 120_000, "Recurring Expense", "Rent"))
+    rows.append(("steady", now - timedelta(days=2), 900_000, "Income", "Salary")) # Not an expense
+    for day in (12, 9, 5, 1): # Less than two months of data
+        rows.append(("recent", now - timedelta(days=day), 10_000 + day, "Expense", "Fuel"))
+    rows.append(("single", now - timedelta(days=4), 5_000, "Expense", "Food"))
+    rows.append(("sameday", now - timedelta(days=6), 5_000, "Expense", "Food"))
+    rows.append(("sameday", now - timedelta(days=6), 7_000, "Expense", "Food"))
+    rows.append(("incomeonly", now - timedelta(days=6), 7_000, "Income", "Salary"))
+    logic.append_to_ledger(rows)
+    return tmp_path
+
+
+def predicted_paisa(message):
+    match = re.search(r"PKR (-?[\d,.]+)", message)
+    return None if match is None else round(float(match.group(1).replace(",", "")) * 100)
+
+
+def test_batched_forecast_matches_one_fit_per_user(data_dir):
+    table = logic.predict_next_month_expense_all()
+
+    assert "incomeonly" not in table.index # Only expense rows are read
+    assert table.loc["single", "status"] == forecasting.TOO_FEW_EXPENSES
+    assert table.loc["sameday", "status"] == forecasting.NO_VARIATION
+    for name in ("steady", "recent", "single", "sameday"):
+        row = table.loc[name]
+        message = logic.predict_next_month_expense(name)
+        if row["status"] != forecasting.OK:
+            assert predicted_paisa(message) is None and row["predicted"] == 0
+            continue
+        assert predicted_paisa(message) == row["predicted"]
+        _seconds, days, cumulative = kernels.expense_series(logic.user_arrays(name))
+        model = LinearRegression().fit(days.reshape(-1, 1), cumulative)
+        assert row["expenses"] == len(days)
+        assert row["slope"] == pytest.approx(model.coef_[0], rel=1e-9)
+        assert row["intercept"] == pytest.approx(model.intercept_, rel=1e-9, abs=1e-6)
+    assert (table.loc[["steady", "recent"], "status"] == forecasting.OK).all()
@@ -0,0 +1,80 @@
+"""Aggregates kept alongside the ledger (logic.write_ledger): appends by other processes, rebuilds and imports."""
+from contextlib import contextmanager
+from datetime import datetime
+
+import pytest
+
+import importer
+import ledger
+import logic
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # ledger/ is relative to the working directory
+    logic.ensure_ledger()
+    return tmp_path
+
+
+def expense(amount):
+    return ("user", datetime.now().replace(microsecond=0), amount, "Expense", "Food")
+
+
+def test_append_by_another_process_just_before_ours_is_not_lost(data_dir, monkeypatch):
+    logic.write_ledger([expense(1_000)])
+    assert logic.rolling_spend("user")[7] == 1_000
+    logic.warm_expense_stats()
+
+    original = ledger._locked
+    raced = []
+
+    @contextmanager
+    def racing_lock(directory):
+        # Another process takes the lock first and appends, after write_ledger was called
+        if not raced:
+            raced.append(True)
+            ledger.append([expense(500)], directory)
+        with original(directory):
+            yield
+    monkeypatch.setattr(ledger, "_locked", racing_lock)
+
+    logic.write_ledger([expense(200)])
+
+    assert logic.rolling_spend("user")[7] == 1_700
+    logic.warm_expense_stats()
+    assert logic._expense_stats["stats"][("user", "Food")].count == 3
+    assert logic.user_buckets("user").series("year", 0, 2**40)[2].sum() == 1_700
+
+
+def test_rebuilt_expense_flags_match_the_flags_set_when_logged(data_dir):
+    logic.warm_expense_stats()
+    for amount in [1_000, 1_100, 900, 1_050, 950, 50_000, 1_000, 1_020]:
+        logic.write_ledger([expense(amount)]) # Scored and added one by one
+    logged = logic._expense_stats["flags"]["user"]
+    assert [flag[2] for flag in logged] == [50_000]
+
+    logic._expense_stats["key"] = None # Rebuilt from the ledger on next use
+    logic.warm_expense_stats()
+
+    rebuilt = logic._expense_stats["flags"]["user"]
+    assert [flag[:3] for flag in rebuilt] == [flag[:3] for flag in logged]
+    assert rebuilt[0][3] == pytest.approx(logged[0][3])
+
+
+def test_imported_statement_rows_reach_the_aggregates(data_dir):
+    clients = []
+    logic.create_client(clients, "user", "pw", 100_000)
+    logic.write_ledger([expense(1_000)])
+    assert logic.rolling_spend("user")[7] == 1_000 # Loads the aggregates, so the import must update them
+    logic.warm_expense_stats()
+    logic.user_buckets("user")
+    today = datetime.now().strftime("%Y-%m-%d")
+    (data_dir / "statement.csv").write_text(f"Date,Amount,Description\n{today},-25.00,Food\n{today},-5.00,Food\n")
+
+    assert importer.import_statement(clients, "user", str(data_dir / "statement.csv")).startswith("✅")
+
+    assert logic._rolling_spend["key"] == ledger.signature() # Updated in place, not left for a rebuild
+    assert logic.rolling_spend("user")[7] == 4_000
+    assert logic._expense_stats["key"] == ledger.signature()
+    assert logic._expense_stats["stats"][("user", "Food")].count == 3
+    assert logic.user_buckets("user").series("year", 0, 2**40)[2].sum() == 4_000
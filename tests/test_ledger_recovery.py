@@ -0,0 +1,147 @@
+"""Recovery of open v4 segments after torn or corrupted writes (ledger.recover)."""
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+import engine
+import ledger
+
+
+def make_ledger(directory, n=3):
+    now = datetime.now().replace(microsecond=0)
+    ledger.append([(f"user{i}", now, 100 * (i + 1), "Expense", "Food") for i in range(n)], directory)
+    entry = ledger.load_manifest(directory)["segments"][now.strftime("%Y-%m")]
+    return os.path.join(directory, entry["file"]), entry
+
+
+def quarantined(directory):
+    quarantine_dir = os.path.join(directory, ledger.QUARANTINE_DIR)
+    if not os.path.isdir(quarantine_dir):
+        return b""
+    return b"".join(open(os.path.join(quarantine_dir, name), "rb").read() for name in sorted(os.listdir(quarantine_dir)))
+
+
+def test_torn_tail_is_quarantined(tmp_path):
+    directory = str(tmp_path)
+    path, entry = make_ledger(directory)
+    torn = ledger._frame([("user9", ledger.to_epoch(datetime.now()), 999, "Expense", "Food")])[:-10]
+    with open(path, "ab") as f:
+        f.write(torn)
+
+    ledger.recover(directory)
+
+    assert os.path.getsize(path) == entry["bytes"]
+    assert ledger.load_manifest(directory)["segments"][os.path.basename(path)[:7]]["rows"] == 3
+    assert quarantined(directory) == torn + b"\n"
+    assert ledger.read(directory)["username"].tolist() == ["user0", "user1", "user2"]
+
+
+def test_uncommitted_valid_records_are_kept(tmp_path):
+    directory = str(tmp_path)
+    path, _entry = make_ledger(directory)
+    epoch = ledger.to_epoch(datetime.now())
+    good = ledger._frame([("user7", epoch, 700, "Income", "Salary")])
+    bad = bytearray(ledger._frame([("user8", epoch, 800, "Expense", "Food")]))
+    bad[2] ^= 0x01 # The checksum no longer matches
+    with open(path, "ab") as f:
+        f.write(good + bytes(bad))
+
+    ledger.recover(directory)
+
+    entry = ledger.load_manifest(directory)["segments"][os.path.basename(path)[:7]]
+    assert entry["rows"] == 4
+    assert entry["bytes"] == os.path.getsize(path)
+    assert quarantined(directory) == bytes(bad)
+    df = ledger.read(directory)
+    assert df["username"].tolist() == ["user0", "user1", "user2", "user7"]
+    assert df["amount"].tolist() == [100, 200, 300, 700]
+
+
+def test_truncated_segment_is_rescanned(tmp_path):
+    directory = str(tmp_path)
+    path, entry = make_ledger(directory)
+    with open(path, "r+b") as f:
+        f.truncate(entry["bytes"] - 5) # Cuts into the last committed record
+
+    ledger.recover(directory)
+
+    entry = ledger.load_manifest(directory)["segments"][os.path.basename(path)[:7]]
+    assert entry["rows"] == 2
+    assert entry["bytes"] == os.path.getsize(path)
+    assert quarantined(directory).startswith(b"user2,")
+    assert ledger.read(directory)["username"].tolist() == ["user0", "user1"]
+
+
+def test_full_check_finds_corrupted_committed_record(tmp_path):
+    directory = str(tmp_path)
+    path, _entry = make_ledger(directory)
+    data = bytearray(open(path, "rb").read())
+    data[data.index(b"user1") + 4] = ord("X") # Same length, wrong checksum
+    with open(path, "wb") as f:
+        f.write(data)
+
+    ledger.recover(directory) # Committed bytes are trusted: nothing to do
+    assert ledger.load_manifest(directory)["segments"][os.path.basename(path)[:7]]["rows"] == 3
+
+    manifest = ledger.load_manifest(directory)
+    entry = manifest["segments"][os.path.basename(path)[:7]]
+    assert ledger._recover_segment(directory, entry, full=True)
+    assert entry["rows"] == 2
+    assert entry["bytes"] == os.path.getsize(path)
+    assert quarantined(directory).startswith(b"userX,")
+    ledger._save_manifest(directory, manifest)
+    assert ledger.read(directory)["username"].tolist() == ["user0", "user2"]
+
+
+def flip_committed_amount(path):
+    data = open(path, "rb").read()
+    assert data.count(b",200,") == 1
+    with open(path, "wb") as f:
+        f.write(data.replace(b",200,", b",900,")) # Same length, so only the checksum can tell
+
+
+def test_read_skips_a_damaged_committed_record(tmp_path):
+    directory = str(tmp_path)
+    path, _entry = make_ledger(directory)
+    ledger.read(directory) # Cached before the damage; the cache must not hide it
+    flip_committed_amount(path)
+
+    df = ledger.read(directory)
+
+    assert df["username"].tolist() == ["user0", "user2"]
+    assert 900 not in df["amount"].tolist()
+
+
+@pytest.mark.parametrize("name", engine.available_engines())
+def test_engines_skip_a_damaged_committed_record(tmp_path, name):
+    directory = str(tmp_path)
+    path, _entry = make_ledger(directory)
+    assert engine.rows_frame(directory=directory, engine=name)["amount"].tolist() == [100, 200, 300]
+    flip_committed_amount(path)
+
+    assert engine.rows_frame(directory=directory, engine=name)["amount"].tolist() == [100, 300]
+    assert len(engine.user_frame("user1", directory=directory, engine=name)) == 0
+    assert ledger.damaged_records(path) == 1
+
+
+def test_failed_append_leaves_no_records(tmp_path, monkeypatch):
+    directory = str(tmp_path)
+    now = datetime.now().replace(microsecond=0)
+    last_month = now.replace(day=1) - timedelta(days=1)
+    ledger.append([("user0", last_month, 100, "Expense", "Food"), ("user0", now, 200, "Expense", "Food")], directory)
+    ledger.close_segments(directory)
+    files = {name: open(os.path.join(directory, name), "rb").read() for name in os.listdir(directory)
+             if name.endswith((".csv", ".gz"))}
+    segments = ledger.load_manifest(directory)["segments"]
+
+    def fail(path, rows):
+        raise OSError("disk full")
+    monkeypatch.setattr(ledger, "_write_rows", fail) # The closed month is written first, then this fails
+    with pytest.raises(OSError):
+        ledger.append([("user1", last_month, 300, "Expense", "Food"), ("user1", now, 400, "Expense", "Food")],
+                      directory)
+
+    assert {name: open(os.path.join(directory, name), "rb").read() for name in files} == files
+    assert ledger.load_manifest(directory)["segments"] == segments
+    assert ledger.read(directory)["amount"].tolist() == [100, 200]
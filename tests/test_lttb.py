@@ -0,0 +1,52 @@
+"""Largest-triangle-three-buckets downsampling (kernels.lttb)."""
+import numpy as np
+import pytest
+
+import kernels
+
+
+def reference_lttb(x, y, target):
+    """Plain-Python LTTB with the same bucket edges, point by point."""
+    n = len(x)
+    edges = [int(i * ((n - 2) / (target - 2))) + 1 for i in range(target - 1)]
+    edges[-1] = n - 1
+    kept, a = [0], 0
+    for i in range(target - 2):
+        start, end = edges[i], edges[i + 1]
+        if i + 1 < target - 2:
+            next_start, next_end = edges[i + 1], edges[i + 2]
+            mean_x = sum(x[next_start:next_end]) / (next_end - next_start)
+            mean_y = sum(y[next_start:next_end]) / (next_end - next_start)
+        else:
+            mean_x, mean_y = x[-1], y[-1]
+        areas = [abs((x[a] - mean_x) * (y[j] - y[a]) - (x[a] - x[j]) * (mean_y - y[a])) for j in range(start, end)]
+        a = start + areas.index(max(areas))
+        kept.append(a)
+    return kept + [n - 1]
+
+
+@pytest.mark.parametrize("n, target", [(1_000, 100), (10_001, 500), (503, 500), (50, 3)])
+def test_keeps_endpoints_and_returns_target_points(n, target):
+    rng = np.random.default_rng(n)
+    x = np.sort(rng.uniform(0, 1_000, n))
+    y = np.cumsum(rng.normal(0, 1, n))
+
+    kept = kernels.lttb(x, y, target)
+
+    assert len(kept) == target
+    assert kept[0] == 0 and kept[-1] == n - 1
+    assert np.all(np.diff(kept) > 0)
+    assert kept.tolist() == reference_lttb(x.tolist(), y.tolist(), target)
+
+
+def test_keeps_a_spike():
+    x = np.arange(10_000, dtype=np.float64)
+    y = np.zeros(10_000)
+    y[4_321] = 100.0
+    assert 4_321 in kernels.lttb(x, y, 50)
+
+
+@pytest.mark.parametrize("target", [0, 2, 20, 21])
+def test_short_series_or_tiny_target_is_returned_whole(target):
+    x = np.arange(20)
+    assert kernels.lttb(x, x * 2, target).tolist() == list(range(20))
@@ -0,0 +1,138 @@
+"""Merging concurrent saves of the same account (logic.save_all_clients, logic._merge_stored)."""
+import pytest
+
+import ledger
+import logic
+import userstore
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # users.db and ledger/ are relative to the working directory
+    clients = []
+    logic.create_client(clients, "alice", "pw", 100_000)
+    logic.create_client(clients, "bob", "pw", 50_000)
+    return tmp_path
+
+
+def stored(uname):
+    conn = userstore.connect()
+    try:
+        return userstore.load_one(conn, uname)
+    finally:
+        conn.close()
+
+
+def test_concurrent_withdrawals_are_both_applied(data_dir):
+    first, second = logic.load_client("alice"), logic.load_client("alice")
+    first.withdraw(30_000, "Food")
+    second.withdraw(20_000, "Rent")
+
+    assert logic.save_all_clients([first])
+    assert logic.save_all_clients([second]) # Conflicts, merges and retries
+
+    assert (second.amount, second.total_spent) == (50_000, 50_000)
+    reloaded = logic.load_client("alice")
+    assert (reloaded.amount, reloaded.total_spent) == (50_000, 50_000)
+    assert reloaded.stored_version == second.stored_version == 3
+
+
+def test_merge_that_would_overdraw_is_rejected(data_dir):
+    first, second = logic.load_client("alice"), logic.load_client("alice")
+    first.withdraw(80_000, "Rent")
+    second.withdraw(70_000, "Fuel")
+    assert logic.save_all_clients([first])
+
+    with pytest.raises(logic.InvalidMergeError) as raised:
+        logic._merge_stored(second, *stored("alice"))
+    assert "balance" in raised.value.reasons["alice"]
+    # The client is left as it was
+    assert (second.amount, second.total_spent, second.stored_version) == (30_000, 70_000, 1)
+    assert second.is_dirty
+
+
+def test_rejected_account_is_reset_and_others_are_saved(data_dir):
+    first, second = logic.load_client("alice"), logic.load_client("alice")
+    bob = logic.load_client("bob")
+    first.withdraw(80_000, "Rent")
+    second.withdraw(70_000, "Fuel")
+    bob.add_income(5_000)
+    assert logic.save_all_clients([first])
+
+    with pytest.raises(logic.InvalidMergeError) as raised:
+        logic.save_all_clients([second, bob])
+
+    assert set(raised.value.reasons) == {"alice"}
+    assert isinstance(raised.value, userstore.ConflictError)
+    # Our withdrawal is dropped in favour of the stored account
+    assert (second.amount, second.total_spent) == (20_000, 80_000)
+    assert not second.is_dirty
+    assert stored("alice")[0][3] == 20_000
+    # The other account's change still reached the snapshot
+    assert not bob.is_dirty
+    assert stored("bob")[0][3] == 55_000
+
+
+def test_username_created_by_another_process(data_dir):
+    ours, theirs = [], []
+    assert logic.create_client(theirs, "carol", "theirs", 10_000).startswith("✅")
+
+    assert logic.create_client(ours, "carol", "ours", 99_000) == "❌ Username already exists."
+
+    # Our copy now is the account the other process created
+    carol = ours[0]
+    assert (carol.password, carol.amount, carol.stored_version) == ("theirs", 10_000, 1)
+    assert not carol.is_dirty
+    carol.add_income(1_000)
+    assert logic.save_all_clients(ours)
+    assert stored("carol")[0][1:4] == ("theirs", "standard", 11_000)
+
+
+def test_username_collision_does_not_block_other_saves(data_dir):
+    theirs = []
+    logic.create_client(theirs, "carol", "theirs", 10_000)
+    ours = [logic.StandardAccount("carol", "ours", 99_000), logic.load_client("bob")]
+    ours[1].add_income(5_000)
+
+    with pytest.raises(logic.InvalidMergeError) as raised:
+        logic.save_all_clients(ours)
+
+    assert raised.value.reasons == {"carol": "the username was created by another process"}
+    assert stored("bob")[0][3] == 55_000
+    assert stored("carol")[0][1:4] == ("theirs", "standard", 10_000)
+    bob = ours[1]
+    bob.add_income(1_000)
+    assert logic.save_all_clients(ours) # Nothing is left conflicting
+    assert stored("bob")[0][3] == 56_000
+
+
+def transfer_rows():
+    return int(ledger.read()["type"].isin(["Transfer In", "Transfer Out"]).sum())
+
+
+def test_bulk_transfer_is_saved_with_its_ledger_rows(data_dir):
+    clients = [logic.load_client("alice"), logic.load_client("bob")]
+
+    message, failures = logic.bulk_transfer(clients, [("alice", "bob", 30_000), ("bob", "alice", 5_000)])
+
+    assert message.startswith("✅") and failures == []
+    assert not logic.dirty_clients(clients)
+    assert (stored("alice")[0][3], stored("bob")[0][3]) == (75_000, 75_000)
+    assert transfer_rows() == 4
+
+
+def test_bulk_transfer_rejected_by_merge_applies_nothing(data_dir):
+    clients = [logic.load_client("alice"), logic.load_client("bob")]
+    other = logic.load_client("alice")
+    other.withdraw(90_000, "Rent")
+    assert logic.save_all_clients([other])
+
+    # Our copy of alice can afford it, but not on top of the other process's withdrawal
+    message, failures = logic.bulk_transfer(clients, [("alice", "bob", 50_000)])
+
+    assert message.startswith("❌") and [index for index, _reason in failures] == [0]
+    assert "another process" in failures[0][1]
+    assert (clients[0].amount, clients[1].amount) == (10_000, 50_000)
+    assert (stored("alice")[0][3], stored("bob")[0][3]) == (10_000, 50_000)
+    assert stored("bob")[0][-1] == 1 # Not saved
+    assert transfer_rows() == 0
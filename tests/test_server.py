@@ -0,0 +1,100 @@
+"""The server's single writer: users.db and the ledger stay in agreement when a batch fails (server.py)."""
+import asyncio
+
+import pytest
+
+import ledger
+import logic
+import server
+import userstore
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # users.db and ledger/ are relative to the working directory
+    clients = []
+    logic.create_client(clients, "alice", "pw", 100_000)
+    logic.create_client(clients, "bob", "pw", 50_000)
+    return tmp_path
+
+
+def run(test):
+    """Runs test(app) against a started server, then stops it."""
+    async def main():
+        app = server.FinanceServer()
+        listener = await app.start(port=0)
+        try:
+            return await test(app)
+        finally:
+            app.writer_task.cancel()
+            listener.close()
+            app.writer.shutdown()
+    return asyncio.run(main())
+
+
+def stored_amount(uname):
+    conn = userstore.connect()
+    try:
+        return userstore.load_one(conn, uname)[0][3]
+    finally:
+        conn.close()
+
+
+def ledger_amounts(uname):
+    df = ledger.read()
+    return df.loc[df["username"] == uname, "amount"].tolist()
+
+
+def test_rejected_merge_writes_nothing_for_its_operations(data_dir):
+    async def test(app):
+        # Another process spends most of alice's balance after the server loaded it
+        other = logic.load_client("alice")
+        other.withdraw(80_000, "Rent")
+        logic.save_all_clients([other])
+        alice = logic.find_client_by_username(app.clients, "alice")
+        bob = logic.find_client_by_username(app.clients, "bob")
+        return await asyncio.gather(app.expense(alice, {"amount": "700"}), app.income(bob, {"amount": "50"}),
+                                    return_exceptions=True)
+
+    expense, income = run(test)
+
+    assert isinstance(expense, server.SaveError) and expense.rejected == {"alice"}
+    assert income[0] == 200
+    assert stored_amount("alice") == 20_000
+    assert ledger_amounts("alice") == [80_000] # Only the other process's expense
+    assert stored_amount("bob") == 55_000
+    assert ledger_amounts("bob") == [5_000]
+
+
+def test_failed_ledger_append_saves_nothing(data_dir, monkeypatch):
+    def fail(rows):
+        raise OSError("disk full")
+    monkeypatch.setattr(logic, "write_ledger", fail)
+
+    async def test(app):
+        alice = logic.find_client_by_username(app.clients, "alice")
+        with pytest.raises(OSError):
+            await app.expense(alice, {"amount": "300"})
+        return alice.amount, alice.is_dirty
+
+    assert run(test) == (100_000, True) # Rolled back in memory; dirty only from the undone change
+    assert stored_amount("alice") == 100_000
+    assert ledger_amounts("alice") == []
+
+
+def test_register_is_saved_by_the_writer(data_dir):
+    logic.create_client([], "carol", "theirs", 10_000) # Another process took this username
+
+    async def test(app):
+        app.clients = [client for client in app.clients if client.uname != "carol"] # Loaded before carol existed
+        taken = await app.register(None, {"username": "carol", "password": "ours", "amount": "990"})
+        created = await app.register(None, {"username": "dave", "password": "pw", "amount": "10"})
+        return taken, created, sorted(client.uname for client in app.clients)
+
+    taken, created, unames = run(test)
+
+    assert taken[0] == 409 and taken[1]["message"] == "❌ Username already exists."
+    assert created[0] == 201
+    assert unames == ["alice", "bob", "carol", "dave"]
+    assert stored_amount("carol") == 10_000
+    assert stored_amount("dave") == 1_000
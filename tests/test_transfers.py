@@ -0,0 +1,46 @@
+"""Concurrent transfers between the same accounts (Client.transfer with account_locks); see benchmarks/stress_transfers.py."""
+import random
+import threading
+
+import pytest
+
+import logic
+
+OPENING_BALANCE = 10_000
+THREADS = 6
+TRANSFERS_PER_THREAD = 100
+JOIN_TIMEOUT = 60 # seconds; a thread still running after this is taken as a deadlock
+
+
+@pytest.fixture
+def clients(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # ledger/ is relative to the working directory
+    logic.ensure_ledger()
+    return [logic.StandardAccount(f"user{i}", "pw", OPENING_BALANCE) for i in range(4)]
+
+
+def test_concurrent_opposite_transfers_conserve_money_and_match_the_ledger(clients):
+    succeeded = [0] * THREADS
+
+    def worker(seed):
+        rng = random.Random(seed)
+        for _ in range(TRANSFERS_PER_THREAD):
+            sender, receiver = rng.sample(clients, 2) # Both directions between the same pairs run at once
+            if sender.transfer(receiver, rng.randint(1, OPENING_BALANCE // 2)).startswith("✅"):
+                succeeded[seed] += 1
+
+    threads = [threading.Thread(target=worker, args=(seed,), daemon=True) for seed in range(THREADS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(JOIN_TIMEOUT)
+    assert not any(thread.is_alive() for thread in threads), "transfers did not finish (deadlock?)"
+
+    assert sum(client.amount for client in clients) == OPENING_BALANCE * len(clients)
+    assert all(client.amount >= 0 for client in clients)
+    df = logic.read_ledger()
+    outs, ins = df[df["type"] == "Transfer Out"], df[df["type"] == "Transfer In"]
+    assert len(outs) == len(ins) == sum(succeeded) > 0
+    net = (df["amount"] * df["type"].map({"Transfer In": 1, "Transfer Out": -1})).groupby(df["username"]).sum()
+    for client in clients:
+        assert OPENING_BALANCE + int(net.get(client.uname, 0)) == client.amount
@@ -0,0 +1,143 @@
+"""
+Tk main-loop stall detector.
+
+A heartbeat is scheduled with app.after every interval_ms. Tk can only run it once the previous callback has
+returned, so the heartbeat's lateness is the event-loop latency. Every Tk callback (button commands, event
+bindings, after callbacks) is timed by wrapping tkinter.CallWrapper, and code can add nested spans with
+span(name), e.g. for view updates. When a heartbeat is late by more than threshold_ms, the stall is recorded
+and attributed to the span that covered most of the late window.
+
+export_trace() writes the spans, stalls and latency samples as Chrome trace-event JSON (open it in
+chrome://tracing or https://ui.perfetto.dev).
+"""
+import json
+import os
+import tkinter
+from collections import deque
+from contextlib import contextmanager
+from time import perf_counter
+
+TRACE_FILE = "ui_trace.json"
+
+
+def callback_name(func):
+    """A readable name for a Tk callback; CustomTkinter widgets are named after the command they run."""
+    widget = getattr(func, "__self__", None)
+    command = getattr(widget, "_command", None)
+    if callable(command):
+        return f"{type(widget).__name__}: {callback_name(command)}"
+    name = getattr(func, "__name__", None) or type(func).__name__
+    code = getattr(func, "__code__", None)
+    if name == "<lambda>" and code is not None:
+        name = f"<lambda {os.path.basename(code.co_filename)}:{code.co_firstlineno}>"
+    return name
+
+
+class StallWatchdog:
+    """Measures Tk event-loop latency and records which handler caused each stall."""
+
+    def __init__(self, interval_ms=50, threshold_ms=100, min_span_ms=1.0, max_records=5000):
+        self.interval_ms = interval_ms
+        self.threshold = threshold_ms / 1000
+        self.min_span = min_span_ms / 1000
+        self.origin = perf_counter()
+        self.spans = deque(maxlen=max_records)   # (start, end, depth, path)
+        self.stalls = deque(maxlen=max_records)  # dicts: start, duration_ms, handler
+        self.latency = deque(maxlen=max_records) # (time, lateness in ms) per heartbeat
+        self._stack = []
+        self._app = None
+        self._expected = None
+        self._original_call_wrapper = None
+
+    # --- Spans ---
+    @contextmanager
+    def span(self, name):
+        """Times the enclosed code as a span nested under the currently running handler."""
+        self._stack.append(name)
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            end = perf_counter()
+            if end - start >= self.min_span:
+                self.spans.append((start, end, len(self._stack) - 1, " > ".join(self._stack)))
+            self._stack.pop()
+
+    def instrument_tk(self):
+        """Times every Tk callback registered from now on. Call before the widgets are created."""
+        if self._original_call_wrapper is not None:
+            return
+        watchdog = self
+        original = self._original_call_wrapper = tkinter.CallWrapper
+
+        class TimedCallWrapper(original):
+            def __call__(self, *args):
+                with watchdog.span(callback_name(self.func)):
+                    return super().__call__(*args)
+
+        tkinter.CallWrapper = TimedCallWrapper
+
+    # --- Heartbeat ---
+    def start(self, app):
+        """Starts the heartbeat on app's event loop."""
+        self._app = app
+        self._expected = perf_counter() + self.interval_ms / 1000
+        app.after(self.interval_ms, self._beat)
+
+    def _beat(self):
+        now = perf_counter()
+        lateness = max(0.0, now - self._expected)
+        self.latency.append((now, lateness * 1000))
+        if lateness >= self.threshold:
+            handler = self.attribute(self._expected, now)
+            self.stalls.append({"start": self._expected, "duration_ms": lateness * 1000, "handler": handler})
+            print(f"UI stall: event loop blocked for {lateness * 1000:.0f} ms in {handler}") # Debug print
+        self._expected = perf_counter() + self.interval_ms / 1000
+        self._app.after(self.interval_ms, self._beat)
+
+    def attribute(self, start, end):
+        """
+        Returns the path of the span that covered most of [start, end]. A nested span (e.g. a view update inside
+        switch_view) is preferred if it covers at least half as much as the best span.
+        """
+        overlaps = []
+        for span_start, span_end, depth, path in reversed(self.spans):
+            if span_end < start:
+                break # Spans are appended as they finish, so older ones cannot overlap
+            overlap = min(span_end, end) - max(span_start, start)
+            if overlap > 0:
+                overlaps.append((overlap, depth, path))
+        if not overlaps:
+            return "(Tk internals / no instrumented handler)"
+        best = max(overlap for overlap, _depth, _path in overlaps)
+        return max((depth, overlap, path) for overlap, depth, path in overlaps if overlap >= best / 2)[2]
+
+    # --- Export ---
+    def trace_events(self):
+        """Returns the recorded data as a list of Chrome trace events (timestamps in microseconds)."""
+        def us(t):
+            return round((t - self.origin) * 1e6)
+
+        events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "Finance Manager UI"}},
+                  {"name": "thread_name", "ph": "M", "pid": 1, "tid": 1, "args": {"name": "Tk handlers"}},
+                  {"name": "thread_name", "ph": "M", "pid": 1, "tid": 2, "args": {"name": "Stalls"}}]
+        for start, end, depth, path in self.spans:
+            events.append({"name": path.rsplit(" > ", 1)[-1], "cat": "handler", "ph": "X", "pid": 1, "tid": 1,
+                           "ts": us(start), "dur": us(end) - us(start), "args": {"path": path, "depth": depth}})
+        for stall in self.stalls:
+            events.append({"name": f"stall: {stall['handler']}", "cat": "stall", "ph": "X", "pid": 1, "tid": 2,
+                           "ts": us(stall["start"]), "dur": round(stall["duration_ms"] * 1000),
+                           "args": {"handler": stall["handler"], "duration_ms": round(stall["duration_ms"], 1)}})
+        for t, lateness_ms in self.latency:
+            events.append({"name": "event loop latency", "ph": "C", "pid": 1, "ts": us(t),
+                           "args": {"ms": round(lateness_ms, 2)}})
+        return events
+
+    def export_trace(self, path=TRACE_FILE):
+        """Writes the trace-event JSON file. Returns a status message."""
+        try:
+            with open(path, "w") as f:
+                json.dump({"traceEvents": self.trace_events(), "displayTimeUnit": "ms"}, f)
+            return f"✅ UI trace with {len(self.stalls)} stall(s) saved to {path}"
+        except OSError as e:
+            return f"❌ Could not write UI trace: {e}"
@@ -0,0 +1,178 @@
+"""
+Typed, versioned snapshot of user state (users.db).
+
+Accounts are stored in SQLite with integer paisa amounts (see money.py) and their account type; recurring
+expenses are typed rows keyed by (username, position). Rows are addressed by username, so single accounts can be loaded
+or rewritten without touching the rest. This module works on plain records; logic.py maps them to Clients.
+
+Every account row carries a version stamp that is incremented on each save. Several processes may share the
+store: save() checks, inside one write transaction (SQLite's own cross-process lock), that each account is still
+at the version the caller loaded, and raises ConflictError with the current rows instead of overwriting changes
+it has not seen. logic.save_all_clients merges those and retries.
+"""
+import os
+import sqlite3
+
+USER_STORE = "users.db"
+SCHEMA_VERSION = 3
+BUSY_TIMEOUT = 10.0 # Seconds to wait for another process's write transaction
+
+_USERS_TABLE = """
+CREATE TABLE IF NOT EXISTS users (
+    uname        TEXT PRIMARY KEY,
+    password     TEXT NOT NULL,
+    account_type TEXT NOT NULL,
+    amount       INTEGER NOT NULL,  -- paisa
+    budget       INTEGER NOT NULL,
+    total_spent  INTEGER NOT NULL,
+    loans        INTEGER NOT NULL,
+    version      INTEGER NOT NULL DEFAULT 1  -- incremented on every save of the row
+) WITHOUT ROWID;
+"""
+_RECURRING_TABLE = """
+CREATE TABLE IF NOT EXISTS recurring (
+    uname          TEXT NOT NULL,
+    position       INTEGER NOT NULL,
+    amount         INTEGER NOT NULL,  -- paisa
+    category       TEXT NOT NULL,
+    frequency_days INTEGER NOT NULL,
+    last_processed REAL NOT NULL,  -- epoch seconds
+    PRIMARY KEY (uname, position)
+) WITHOUT ROWID;
+"""
+_SCHEMA = _USERS_TABLE + _RECURRING_TABLE
+
+# Version 1 stored amounts as REAL rupees. SQLite cannot change column types in place, so the tables are
+# rebuilt with the version 2 schema and the amounts converted to paisa.
+_MIGRATE_1_TO_2 = """
+ALTER TABLE users RENAME TO users_v1;
+ALTER TABLE recurring RENAME TO recurring_v1;
+CREATE TABLE users (
+    uname        TEXT PRIMARY KEY,
+    password     TEXT NOT NULL,
+    account_type TEXT NOT NULL,
+    amount       INTEGER NOT NULL,
+    budget       INTEGER NOT NULL,
+    total_spent  INTEGER NOT NULL,
+    loans        INTEGER NOT NULL
+) WITHOUT ROWID;
+""" + _RECURRING_TABLE + """
+INSERT INTO users SELECT uname, password, account_type,
+    CAST(ROUND(amount * 100) AS INTEGER), CAST(ROUND(budget * 100) AS INTEGER),
+    CAST(ROUND(total_spent * 100) AS INTEGER), CAST(ROUND(loans * 100) AS INTEGER) FROM users_v1;
+INSERT INTO recurring SELECT uname, position, CAST(ROUND(amount * 100) AS INTEGER), category, frequency_days,
+    last_processed FROM recurring_v1;
+DROP TABLE users_v1;
+DROP TABLE recurring_v1;
+"""
+# Version 3 adds the per-row version stamp; existing rows start at version 1.
+_MIGRATE_2_TO_3 = """
+ALTER TABLE users ADD COLUMN version INTEGER NOT NULL DEFAULT 1;
+"""
+_MIGRATIONS = {1: _MIGRATE_1_TO_2, 2: _MIGRATE_2_TO_3} # from version -> script upgrading it by one version
+
+USER_FIELDS = ("uname", "password", "account_type", "amount", "budget", "total_spent", "loans")
+RECURRING_FIELDS = ("amount", "category", "frequency_days", "last_processed")
+
+
+class ConflictError(Exception):
+    """Raised by save() when accounts were saved by someone else since the caller loaded them."""
+
+    def __init__(self, current):
+        super().__init__(f"Changed by another process: {', '.join(sorted(current))}")
+        self.current = current # uname -> (user_row, recurring_items) as stored now, like load_one()
+
+
+def exists(path=USER_STORE):
+    """True if a snapshot file is present."""
+    return os.path.exists(path)
+
+
+def connect(path=USER_STORE):
+    """
+    Opens the snapshot, creating the schema on first use, upgrading older versions and refusing newer, unknown
+    versions.
+    """
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version == 0:
+        conn.executescript(f"BEGIN; {_SCHEMA} PRAGMA user_version = {SCHEMA_VERSION}; COMMIT;")
+        version = SCHEMA_VERSION
+    elif version > SCHEMA_VERSION:
+        conn.close()
+        raise RuntimeError(f"{path} has schema version {version}; this version of the app supports up to {SCHEMA_VERSION}.")
+    while version < SCHEMA_VERSION:
+        # Each step runs in its own transaction, so an interrupted upgrade leaves a consistent older version
+        conn.executescript(f"BEGIN; {_MIGRATIONS[version]} PRAGMA user_version = {version + 1}; COMMIT;")
+        print(f"Upgraded {path} to schema version {version + 1}.") # Debug print
+        version += 1
+    return conn
+
+
+def load_all(conn):
+    """
+    Returns (user_rows, recurring_by_user).
+    user_rows are tuples in USER_FIELDS order followed by the row version; recurring_by_user maps
+    uname -> list of RECURRING_FIELDS tuples.
+    """
+    user_rows = conn.execute(f"SELECT {', '.join(USER_FIELDS)}, version FROM users").fetchall()
+    recurring_by_user = {}
+    for uname, *item in conn.execute(
+            f"SELECT uname, {', '.join(RECURRING_FIELDS)} FROM recurring ORDER BY uname, position"):
+        recurring_by_user.setdefault(uname, []).append(tuple(item))
+    return user_rows, recurring_by_user
+
+
+def load_one(conn, uname):
+    """Primary-key lookup of a single account. Returns (user_row with version, recurring_items) or None."""
+    row = conn.execute(f"SELECT {', '.join(USER_FIELDS)}, version FROM users WHERE uname = ?", (uname,)).fetchone()
+    if row is None:
+        return None
+    items = conn.execute(f"SELECT {', '.join(RECURRING_FIELDS)} FROM recurring WHERE uname = ? ORDER BY position",
+                         (uname,)).fetchall()
+    return row, items
+
+
+def _stored_versions(conn, unames):
+    """uname -> stored version, for the given accounts that exist."""
+    stored = {}
+    for start in range(0, len(unames), 500): # SQLite limits the number of bound parameters
+        chunk = unames[start:start + 500]
+        stored.update(conn.execute(
+            f"SELECT uname, version FROM users WHERE uname IN ({', '.join('?' * len(chunk))})", chunk))
+    return stored
+
+
+def save(conn, user_rows, recurring_by_user, versions=None, before_commit=None):
+    """
+    Upserts the given accounts in one write transaction and returns {uname: new version}. Only the passed
+    accounts are written. recurring_by_user maps uname -> list of RECURRING_FIELDS tuples and replaces that
+    user's recurring rows.
+    versions maps uname -> the version the caller's copy is based on (0 for an account it created). If any of
+    those accounts is stored at a different version, nothing is written and ConflictError is raised.
+    Accounts not in versions are written unconditionally.
+    before_commit, if given, is called inside the transaction once the accounts are written (so never on a
+    conflict); if it raises, nothing is saved.
+    """
+    versions = versions or {}
+    placeholders = ", ".join("?" * (len(USER_FIELDS) + 1))
+    with conn:
+        # Take the write lock before reading the versions, so no other process can save in between
+        conn.execute("BEGIN IMMEDIATE")
+        stored = _stored_versions(conn, [row[0] for row in user_rows])
+        conflicts = [uname for uname, version in versions.items() if uname in stored and stored[uname] != version]
+        if conflicts:
+            raise ConflictError({uname: load_one(conn, uname) for uname in conflicts})
+        new_versions = {row[0]: stored.get(row[0], 0) + 1 for row in user_rows}
+        conn.executemany(f"INSERT OR REPLACE INTO users ({', '.join(USER_FIELDS)}, version) VALUES ({placeholders})",
+                         [(*row, new_versions[row[0]]) for row in user_rows])
+        unames = [(row[0],) for row in user_rows]
+        conn.executemany("DELETE FROM recurring WHERE uname = ?", unames)
+        conn.executemany(
+            f"INSERT INTO recurring (uname, position, {', '.join(RECURRING_FIELDS)}) VALUES (?, ?, ?, ?, ?, ?)",
+            [(uname, position, *item)
+             for uname, items in recurring_by_user.items()
+             for position, item in enumerate(items)])
+        if before_commit is not None:
+            before_commit()
+    return new_versions